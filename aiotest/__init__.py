@@ -1,3 +1,4 @@
 from aiotest.case import TestCase
+from aiotest.clock import Timeout, sleep, wait_for
 
-__all__ = ['TestCase']
+__all__ = ['TestCase', 'Timeout', 'sleep', 'wait_for']
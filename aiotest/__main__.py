@@ -0,0 +1,5 @@
+import sys
+
+from aiotest.runner import main
+
+sys.exit(main())
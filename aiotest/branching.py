@@ -0,0 +1,104 @@
+import asyncio
+import os
+import pickle
+import sys
+import traceback
+
+#: Whether this platform can fork() branches off a loop.
+CAN_FORK = hasattr(os, 'fork')
+
+
+class BranchFailed(Exception):
+    """
+    Raised in the parent when a branch raised an exception, or never
+    finished.  ``details`` is the branch's traceback, as text, since the
+    exception itself stayed behind in the branch's process.
+    """
+    def __init__(self, name, details):
+        super().__init__("branch {name!r} failed:\n{details}".format(name=name, details=details))
+        self.name = name
+        self.details = details
+
+
+def _run_branch(loop, branch, max_time):
+    """
+    Run a single branch on the loop, as it was left by the shared prefix.
+    Returns (succeeded, result or traceback text).
+    """
+    try:
+        result = branch()
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            future = asyncio.ensure_future(result, loop=loop)
+            loop.run_until_done(future, max_time)
+            if not future.done():
+                if loop.is_idle():
+                    return False, "is waiting on something that will never happen"
+                return False, "did not complete within {max_time} virtual seconds".format(max_time=max_time)
+            result = future.result()
+        return True, pickle.dumps(result)
+    except BaseException:
+        return False, traceback.format_exc()
+
+
+def fork_branches(loop, branches, max_time=None):
+    """
+    Carry on from the loop's current state down several different paths at
+    once, without running whatever got it there again.
+
+    ``branches`` maps names to callables.  Each one is called in a child
+    process forked from this one, where the loop (its clock, everything
+    scheduled on it, every Task part way through its coroutine) is exactly
+    as it is now.  If it returns a coroutine or Future, the child drives the
+    loop through virtual time until that's done, or until ``max_time``
+    virtual seconds have passed.  Nothing a branch does is seen by the
+    others, or by the parent.
+
+    Returns a dict of the branches' names to their results, which have to be
+    picklable to make it back.
+
+    Raises BranchFailed for the first branch that fails, NotImplementedError
+    where os.fork() isn't available, and RuntimeError if the loop is running.
+    """
+    if not CAN_FORK:
+        raise NotImplementedError("fork_branches() needs os.fork(), which this platform doesn't have")
+    if loop.is_running():
+        raise RuntimeError("Cannot fork branches off a running event loop")
+
+    # Anything waiting to be written would be written again by every child.
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    children = []
+    for name, branch in branches.items():
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                os.close(read_fd)
+                with os.fdopen(write_fd, 'wb') as pipe:
+                    pickle.dump(_run_branch(loop, branch, max_time), pipe)
+                status = 0
+            finally:
+                # Never fall back into the parent's code: no cleanups, no atexit.
+                os._exit(status)
+
+        os.close(write_fd)
+        children.append((name, pid, read_fd))
+
+    outcomes = []
+    for name, pid, read_fd in children:
+        with os.fdopen(read_fd, 'rb') as pipe:
+            data = pipe.read()
+        os.waitpid(pid, 0)
+        outcomes.append((name, data))
+
+    results = {}
+    for name, data in outcomes:
+        if not data:
+            raise BranchFailed(name, "its process died without reporting back")
+        succeeded, payload = pickle.loads(data)
+        if not succeeded:
+            raise BranchFailed(name, payload)
+        results[name] = pickle.loads(payload)
+    return results
@@ -1,26 +1,438 @@
 import asyncio
+import atexit
+import functools
+import os
+import sys
+import time
+from collections import namedtuple
 from unittest import TestCase as _TestCase
 
+from aiotest.branching import CAN_FORK, BranchFailed, fork_branches
+from aiotest.clock import patch_clock
+from aiotest.explore import explore
+from aiotest.load import simulate_load
 from aiotest.loop import TimeTravelingTestLoop
+from aiotest.policy import TimeTravelingEventLoopPolicy
+from aiotest.profiling import CallbackProfiler, CriticalPathProfiler
+
+#: The valid values for TestCase.loop_scope.
+LOOP_SCOPES = ('test', 'class', 'module')
+
+#: Event loops shared by every test in a module, keyed on module name.
+_module_loops = {}
+
+#: How closely assertCoroWithin() holds a coroutine to its time limits, in
+#: virtual seconds: the clock only counts in steps of about a microsecond
+#: this far from its epoch.
+TIME_TOLERANCE = 1e-6
+
+#: What running a coroutine took: virtual seconds, real seconds of CPU time,
+#: and how many loop iterations and callbacks it went through.
+CoroUsage = namedtuple('CoroUsage', ['elapsed', 'cpu_time', 'iterations', 'callbacks'])
+
+#: What a whole test took of its loop: the virtual seconds it advanced, how
+#: many callbacks it ran, and the most Handles it had scheduled at once.
+LoopUsage = namedtuple('LoopUsage', ['virtual_time', 'callbacks', 'peak_scheduled'])
 
 
 def format_call(coro, args):
     return "{func_name}({args})".format(func_name=coro.__name__, args=', '.join(repr(arg) for arg in args))
 
 
+def _close_module_loops(keep=None):
+    """
+    Close the event loops shared by every module other than ``keep``.
+
+    Modules' loops are normally closed as the modules are torn down, but not
+    every runner tears them down.  Test suites run one module at a time, so
+    once a module's tests have started, nobody is coming back for the
+    others' loops.
+    """
+    for module in list(_module_loops):
+        if module != keep:
+            _module_loops.pop(module).close()
+
+
+atexit.register(_close_module_loops)
+
+
+def _close_at_module_teardown(module_name):
+    """
+    Close a module's shared event loop when unittest tears the module down,
+    by wrapping the module's tearDownModule(), or standing in for it.  The
+    module is left the way it was once that has happened.
+    """
+    module = sys.modules.get(module_name)
+    if module is None:
+        return
+    original = module.__dict__.get('tearDownModule')
+    if getattr(original, '_closes_module_loop', False):
+        return
+
+    def tearDownModule():
+        try:
+            if original is not None:
+                original()
+        finally:
+            if original is None:
+                del module.tearDownModule
+            else:
+                module.tearDownModule = original
+            loop = _module_loops.pop(module_name, None)
+            if loop is not None:
+                loop.close()
+
+    tearDownModule._closes_module_loop = True
+    module.tearDownModule = tearDownModule
+
+
 class TestCase(_TestCase):
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    #: How long an event loop lives: a fresh one for every 'test', or one
+    #: shared by every test in the 'class' or 'module'.  Shared loops are
+    #: reset between tests.
+    loop_scope = 'test'
+    #: Makes the event loops handed to tests.
+    loop_factory = TimeTravelingTestLoop
+    #: Profile every callback the loop runs during each test.  See profileReport().
+    profile_callbacks = False
+    #: Record what every Task waits on during each test.  See criticalPath().
+    profile_critical_path = False
+    #: How many virtual seconds a coroutine test method (or setUp/tearDown)
+    #: may take before it fails, or None for no limit.
+    async_timeout = None
+    #: Fail any test that leaves pending Tasks, uncancelled Handles or
+    #: unretrieved exceptions behind on its loop.
+    check_leaks = False
+    #: Make time.monotonic() and time.time() tell the loop's virtual time
+    #: during each test.  See aiotest.clock.patch_clock().
+    patch_clock = False
+    #: Record a trace of every callback each test's loop schedules and runs
+    #: to ``<trace_dir>/<test id>.trace``.  Defaults to the AIOTEST_TRACE_DIR
+    #: environment variable; see aiotest.trace.
+    trace_dir = None
+
+    #: The CallbackProfiler watching this test's loop, if profile_callbacks is on.
+    profiler = None
+    #: The CriticalPathProfiler watching this test's loop, if profile_critical_path is on.
+    path_profiler = None
+    #: The Task the latest runCoroutine() or assertCoro...() call ran.
+    last_task = None
+    #: A LoopUsage of what the test took of its loop, once it's finished with it.
+    loop_usage = None
+    #: Whether the loop will be released when the test is over.
+    _loop_cleanup_registered = False
+
+    def __init__(self, methodName='runTest'):
+        super().__init__(methodName)
+
+        # Coroutine test methods (async def, or @asyncio.coroutine), and
+        # setUp/tearDown, are driven on our loop in virtual time.
+        for name in (methodName, 'setUp', 'tearDown'):
+            method = getattr(self, name, None)
+            if asyncio.iscoroutinefunction(method):
+                setattr(self, name, self._drive_coroutine_function(method))
+
+    def _drive_coroutine_function(self, method):
+        @functools.wraps(method)
+        def driver():
+            return self.runCoroutine(method())
+        return driver
+
+    @classmethod
+    def tearDownClass(cls):
+        loop = cls.__dict__.get('_class_loop')
+        if loop is not None:
+            del cls._class_loop
+            loop.close()
+
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+
+        # Make sure our loop is the current one before the test gets going.
+        self.event_loop
+
+    @property
+    def event_loop(self):
+        """
+        The event loop this test runs on.  It isn't made until it is first
+        needed, so collecting thousands of tests doesn't build thousands of
+        loops up front.
+        """
+        loop = self.__dict__.get('_event_loop')
+        if loop is None:
+            loop = self._install_loop(self._acquire_loop())
+        return loop
+
+    @event_loop.setter
+    def event_loop(self, loop):
+        """
+        Run this test on ``loop`` instead, and share it with the rest of the
+        class or module if loop_scope says to.  The loop it replaces is given
+        up as if the test were over, and closed.
+        """
+        if self.__dict__.get('_event_loop') is loop:
+            return
+        self._release_loop()
+        self._share_loop(loop)
+        self._install_loop(loop)
+
+    def _install_loop(self, loop):
+        """
+        Make ``loop`` this test's loop, and the current one, with everything
+        the TestCase's settings ask to have watching it.
+        """
+        # Whatever the test runs gets our loop from asyncio.get_event_loop(),
+        # and a time traveling one from asyncio.new_event_loop().
+        self._previous_policy = asyncio.get_event_loop_policy()
+        self._event_loop = loop
+        asyncio.set_event_loop_policy(TimeTravelingEventLoopPolicy(self.loop_factory))
+        asyncio.set_event_loop(loop)
+        if not self._loop_cleanup_registered:
+            self._loop_cleanup_registered = True
+            self.addCleanup(self._release_loop)
+        # Whatever is set up on the loop is undone, last first, as it's released.
+        self._loop_cleanups = []
+        self._loop_start = (loop.time(), loop.callbacks_run)
+        loop.peak_scheduled = len(loop._scheduled)
+
+        if self.patch_clock:
+            clock = patch_clock(loop)
+            clock.__enter__()
+            self._loop_cleanups.append(functools.partial(clock.__exit__, None, None, None))
+
+        trace_dir = self.trace_dir or os.environ.get('AIOTEST_TRACE_DIR')
+        if trace_dir:
+            self._start_trace(loop, trace_dir)
+
+        if self.profile_callbacks:
+            self.profiler = CallbackProfiler()
+            loop.add_instrument(self.profiler)
+
+        if self.profile_critical_path:
+            self.path_profiler = CriticalPathProfiler()
+            loop.add_instrument(self.path_profiler)
+        return loop
+
+    def _start_trace(self, loop, trace_dir):
+        # Imported here so that `python -m aiotest.trace` isn't already
+        # imported by the time it runs.
+        from aiotest.trace import TraceRecorder, TraceWriter
+
+        os.makedirs(trace_dir, exist_ok=True)
+        recorder = TraceRecorder(TraceWriter(open(os.path.join(trace_dir, self.id() + '.trace'), 'wb')))
+        loop.add_instrument(recorder)
+
+        def stop_trace():
+            loop.remove_instrument(recorder)
+            recorder.close()
+        self._loop_cleanups.append(stop_trace)
+
+    def _acquire_loop(self):
+        """
+        Find, or make, the event loop for this test according to loop_scope.
+        """
+        scope = self._check_scope()
+        if scope == 'test':
+            return self.loop_factory()
+
+        if scope == 'class':
+            loop = type(self).__dict__.get('_class_loop')
+        else:
+            _close_module_loops(keep=type(self).__module__)
+            loop = _module_loops.get(type(self).__module__)
+
+        if loop is None:
+            loop = self.loop_factory()
+            self._share_loop(loop)
+        return loop
+
+    def _share_loop(self, loop):
+        """
+        Make ``loop`` the one shared by the rest of this test's class or
+        module, according to loop_scope, closing whichever it replaces.
+        """
+        scope = self._check_scope()
+        if scope == 'test':
+            return
+
+        if scope == 'class':
+            cls = type(self)
+            previous = cls.__dict__.get('_class_loop')
+            cls._class_loop = loop
+        else:
+            module = type(self).__module__
+            previous = _module_loops.get(module)
+            _module_loops[module] = loop
+            _close_at_module_teardown(module)
+
+        if previous is not None and previous is not loop:
+            previous.close()
+
+    def _check_scope(self):
+        scope = self.loop_scope
+        if scope not in LOOP_SCOPES:
+            raise ValueError("loop_scope must be one of {scopes}, not {scope!r}".format(scopes=LOOP_SCOPES, scope=scope))
+        return scope
+
+    def _release_loop(self):
+        """
+        Done with this test: close our loop if it was ours alone, otherwise
+        reset it for the next test to use.
+        """
+        loop = self.__dict__.pop('_event_loop', None)
+        if loop is None:
+            # It never got one, or has already given it up.
+            return
 
-        self.event_loop = TimeTravelingTestLoop()
-        asyncio.set_event_loop(self.event_loop)
+        for cleanup in reversed(self.__dict__.pop('_loop_cleanups')):
+            cleanup()
+        # The previous policy still has whatever loop was current before.
+        asyncio.set_event_loop_policy(self.__dict__.pop('_previous_policy'))
+
+        if self.profiler is not None:
+            loop.remove_instrument(self.profiler)
+        if self.path_profiler is not None:
+            loop.remove_instrument(self.path_profiler)
+
+        started, callbacks = self.__dict__.pop('_loop_start')
+        self.loop_usage = LoopUsage(loop.time() - started, loop.callbacks_run - callbacks, loop.peak_scheduled)
+
+        leaks = None
+        if not loop.is_closed():
+            if self.check_leaks:
+                leaks = loop.leaks()
+            # Nothing this test started gets to run on into the next one.
+            loop.cancel_pending_tasks()
+
+        if self.loop_scope == 'test':
+            loop.close()
+        else:
+            loop.reset()
+
+        if leaks:
+            raise self.failureException(leaks.describe())
+
+    def runCoroutine(self, coro):
+        """
+        Run a coroutine to completion on our loop and return its result.
+        Virtual time is advanced whenever the loop has nothing ready to run,
+        straight to the next thing it has scheduled.
+
+        Fails if the coroutine is still waiting when the loop runs out of
+        things to do, or when async_timeout virtual seconds have passed.
+        """
+        future = self.last_task = asyncio.ensure_future(coro, loop=self.event_loop)
+        self.event_loop.run_until_done(future, self.async_timeout)
+
+        if not future.done():
+            if self.event_loop.is_idle():
+                problem = "is waiting on something that will never happen"
+            else:
+                problem = "did not complete within {timeout} virtual seconds".format(timeout=self.async_timeout)
+
+            # Let it clean up after itself.
+            future.cancel()
+            self.event_loop.advance(0)
+
+            raise self.failureException("{coro} {problem}.".format(coro=getattr(coro, '__qualname__', coro), problem=problem))
+
+        return future.result()
+
+    def forkBranches(self, branches, max_time=None):
+        """
+        Run several scenarios on from wherever our loop has got to, each in
+        a forked copy of this process, so that an expensive warm-up they all
+        share only has to run once.  See aiotest.branching.fork_branches().
+
+        Returns a dict of each branch's name to its (picklable) result.
+        Fails if any branch fails, and skips the test where os.fork() isn't
+        available.
+        """
+        if not CAN_FORK:
+            self.skipTest("forkBranches() needs os.fork()")
+
+        try:
+            return fork_branches(self.event_loop, branches, max_time)
+        except BranchFailed as exc:
+            raise self.failureException(str(exc)) from None
+
+    def simulateLoad(self, client, count, arrivals=None, seed=0, max_time=None):
+        """
+        Start ``count`` clients on our loop, arriving as ``arrivals`` (such
+        as aiotest.load.poisson(rate)) says, and run them all to completion
+        in virtual time.  ``client`` is called with each client's number and
+        returns the coroutine it runs.  See aiotest.load.simulate_load().
+
+        Returns a LoadReport of their latencies, with percentiles and a
+        histogram.
+        """
+        return simulate_load(self.event_loop, client, count, arrivals, seed, max_time)
+
+    def exploreInterleavings(self, scenario, runs=100, seed=0, exhaustive=False, max_decisions=None, max_time=None):
+        """
+        Run ``scenario()``'s coroutine over and over on our loop, resetting
+        its schedule each time, with Handles that are ready to run at the
+        same moment run in a different order each time: ``runs`` random
+        orders, or with
+        ``exhaustive``, every order there is (up to ``runs`` of them).  See
+        aiotest.explore.explore().
+
+        Returns an ExplorationReport of every distinct order tried and how
+        it turned out.  Fails if the scenario raised, or never finished, in
+        any of them.
+        """
+        report = explore(self.event_loop, scenario, runs, seed, exhaustive, max_decisions, max_time)
+        failures = report.failures
+        if failures:
+            raise self.failureException(
+                "{failed} of {unique} interleavings failed, the first of them (choices {choices}) having {outcome}\n"
+                "{summary}".format(failed=len(failures), unique=len(report.interleavings), choices=failures[0].choices,
+                                   outcome=failures[0].outcome, summary=report.summary()))
+        return report
+
+    def profileReport(self, top=10, sort='cpu_time'):
+        """
+        A table of the ``top`` callbacks and coroutines that have been the
+        most expensive so far in this test, for when it's slow in real time.
+        Needs profile_callbacks to be turned on.
+        """
+        if self.profiler is None:
+            raise RuntimeError("profileReport() needs profile_callbacks = True on the TestCase")
+
+        return self.profiler.report(top, sort)
+
+    def criticalPath(self, task=None):
+        """
+        What ``task`` (by default, the one the latest runCoroutine() or
+        assertCoro...() call ran) spent its virtual time waiting on: every
+        sleep, timeout, callback and child Task along its critical path, and
+        which of them held it up the most.  Needs profile_critical_path to
+        be turned on.
+        """
+        if self.path_profiler is None:
+            raise RuntimeError("criticalPath() needs profile_critical_path = True on the TestCase")
+
+        task = task or self.last_task
+        if task is None:
+            raise RuntimeError("criticalPath() has no Task to look at: no coroutine has been run yet")
+        return self.path_profiler.report(task, self.event_loop.time())
+
+    def _explain(self, future):
+        # Failures about how long a coroutine took say why, when we know.
+        if self.path_profiler is None:
+            return ""
+        return "\n" + self.path_profiler.report(future, self.event_loop.time())
 
     def assertCoroResult(self, expected_value, coro, *args, msg=None, max_time=0):
-        future = asyncio.async(coro(*args), loop=self.event_loop)
+        future = self.last_task = asyncio.ensure_future(coro(*args), loop=self.event_loop)
         self.event_loop.advance(max_time)
         if not future.done():
-            self.failureException("coroutine did not complete within max time allowed.")
+            future.cancel()
+            raise self.failureException("{call} did not complete within max time allowed.".format(
+                call=format_call(coro, args)))
         actual_value = future.result()
 
         if actual_value != expected_value:
@@ -34,10 +446,12 @@ class TestCase(_TestCase):
             raise self.failureException(msg)
 
     def assertCoroNotResult(self, unexpected_value, coro, *args, msg=None, max_time=0):
-        future = asyncio.async(coro(*args), loop=self.event_loop)
+        future = self.last_task = asyncio.ensure_future(coro(*args), loop=self.event_loop)
         self.event_loop.advance(max_time)
         if not future.done():
-            self.failureException("coroutine did not complete within max time allowed.")
+            future.cancel()
+            raise self.failureException("{call} did not complete within max time allowed.".format(
+                call=format_call(coro, args)))
         actual_value = future.result()
 
         if actual_value == unexpected_value:
@@ -51,16 +465,98 @@ class TestCase(_TestCase):
             raise self.failureException(msg)
 
     def assertCoroDuration(self, duration, coro, *args, msg=None):
-        future = asyncio.async(coro(*args), loop=self.event_loop)
+        future = self.last_task = asyncio.ensure_future(coro(*args), loop=self.event_loop)
         self.event_loop.advance(duration, inclusive=False)
 
         if future.done():
-            self.failureException("coroutine completed too soon.")
+            raise self.failureException(msg or "coroutine completed too soon." + self._explain(future))
 
         self.event_loop.advance(0, inclusive=True)
 
         if not future.done():
             if msg is None:
-                raise self.failureException("coroutine did not complete within duration.")
+                msg = "coroutine did not complete within duration." + self._explain(future)
+            future.cancel()
+            raise self.failureException(msg)
+
+    def assertCoroWithin(self, coro, *args, min_time=0, max_time=None, cpu_budget=None, msg=None):
+        """
+        Run ``coro(*args)`` to completion, and check that it took at least
+        ``min_time`` and at most ``max_time`` virtual seconds, and no more
+        than ``cpu_budget`` seconds of real CPU time.  Any left as None
+        aren't checked.
+
+        Returns a CoroUsage of what it took, for closer inspection.  If the
+        coroutine raises, so does this.
+        """
+        loop = self.event_loop
+        future = self.last_task = asyncio.ensure_future(coro(*args), loop=loop)
+        iterations, callbacks = loop.iterations, loop.callbacks_run
+
+        started = time.process_time()
+        elapsed = loop.run_until_done(future, None if max_time is None else max_time + TIME_TOLERANCE).elapsed
+        usage = CoroUsage(elapsed, time.process_time() - started,
+                          loop.iterations - iterations, loop.callbacks_run - callbacks)
+
+        if not future.done():
+            if loop.is_idle():
+                problem = "is waiting on something that will never happen"
+            else:
+                problem = "did not complete within {max_time} virtual seconds".format(max_time=max_time)
+            explanation = self._explain(future)
+            future.cancel()
+            loop.advance(0)
+        else:
+            # Anything it raised goes straight through.
+            future.result()
+
+            if elapsed < min_time - TIME_TOLERANCE:
+                problem = "completed in {elapsed} virtual seconds, sooner than {min_time}".format(
+                    elapsed=elapsed, min_time=min_time)
+            elif cpu_budget is not None and usage.cpu_time > cpu_budget:
+                problem = "used {cpu_time:.6f} seconds of CPU time, over its budget of {cpu_budget}".format(
+                    cpu_time=usage.cpu_time, cpu_budget=cpu_budget)
+            else:
+                return usage
+            explanation = self._explain(future)
+
+        raise self.failureException(msg or (
+            "{call} {problem} ({elapsed} virtual seconds, {cpu_time:.6f} seconds of CPU time, {iterations} loop "
+            "iterations, {callbacks} callbacks){explanation}").format(
+                call=format_call(coro, args), problem=problem, explanation=explanation, **usage._asdict()))
+
+    def assertCoroResults(self, coro, cases, msg=None, max_time=0):
+        """
+        Check the results of many calls to the same coroutine in one go.
+        ``cases`` is a sequence of (args, expected_value) pairs.
+
+        Every call is scheduled on the loop at once, and the loop is advanced
+        just the once, so a table of hundreds of cases costs about as much as
+        a single assertCoroResult().  Every call that doesn't return what was
+        expected is reported together.
+        """
+        calls = []
+        for args, expected_value in cases:
+            args = tuple(args)
+            calls.append((args, expected_value, asyncio.ensure_future(coro(*args), loop=self.event_loop)))
+
+        self.event_loop.advance(max_time)
+
+        problems = []
+        for args, expected_value, future in calls:
+            call = format_call(coro, args)
+            if not future.done():
+                future.cancel()
+                problems.append("{call} did not complete within max time allowed.".format(call=call))
+            elif future.exception() is not None:
+                problems.append("{call} raised {exception!r}".format(call=call, exception=future.exception()))
+            elif future.result() != expected_value:
+                problems.append("{expected} != {actual} for {call}".format(
+                    expected=expected_value, actual=future.result(), call=call))
+
+        if problems:
+            if msg is None:
+                raise self.failureException("{failed} of {total} calls failed:\n{problems}".format(
+                    failed=len(problems), total=len(calls), problems='\n'.join(problems)))
 
             raise self.failureException(msg)
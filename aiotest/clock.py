@@ -0,0 +1,139 @@
+import asyncio
+import contextlib
+import time
+
+
+def _wake(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+@asyncio.coroutine
+def sleep(delay, result=None, loop=None):
+    """
+    Like asyncio.sleep(), but the wake up goes straight onto the loop's
+    schedule with call_at(), and no loop has to be passed in to get the
+    current one.
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+
+    if delay <= 0:
+        yield
+        return result
+
+    future = loop.create_future()
+    handle = loop.call_at(loop.time() + delay, _wake, future, result)
+    try:
+        return (yield from future)
+    finally:
+        handle.cancel()
+
+
+@asyncio.coroutine
+def wait_for(fut, timeout, loop=None):
+    """
+    Like asyncio.wait_for(): wait for a Future or coroutine to finish, and
+    if it hasn't after ``timeout`` seconds, cancel it and raise
+    asyncio.TimeoutError.
+
+    Rather than waiting on a Future of its own that either the timeout or
+    ``fut`` resolves, the timeout cancels ``fut`` directly, which saves a
+    Future and a callback on every call.
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+
+    if timeout is None:
+        return (yield from fut)
+
+    fut = asyncio.ensure_future(fut, loop=loop)
+    expired = []
+
+    def expire():
+        # A ``fut`` that finished just in time keeps its result, as it would
+        # with asyncio.wait_for().
+        if fut.cancel():
+            expired.append(True)
+
+    handle = loop.call_at(loop.time() + timeout, expire)
+    try:
+        result = yield from fut
+    except (Exception, asyncio.CancelledError):
+        if not expired:
+            raise
+    finally:
+        handle.cancel()
+
+    # Once the timeout has cancelled ``fut``, it has timed out, whatever
+    # ``fut`` made of being cancelled: even if it caught that and returned.
+    if expired:
+        raise asyncio.TimeoutError()
+    return result
+
+
+class Timeout:
+    """
+    Cancels the task running the block it guards if the block takes more
+    than ``seconds`` (None for no limit), and raises asyncio.TimeoutError in
+    its place::
+
+        with Timeout(5):
+            yield from fetch_everything()
+
+    ``expired`` says whether it went off.
+    """
+    def __init__(self, seconds, loop=None):
+        self.seconds = seconds
+        self.expired = False
+        self._loop = loop
+        self._task = None
+        self._handle = None
+
+    def __enter__(self):
+        loop = self._loop
+        if loop is None:
+            loop = asyncio.get_event_loop()
+
+        self._task = asyncio.Task.current_task(loop=loop)
+        if self._task is None:
+            raise RuntimeError("Timeout has to be used inside a task")
+
+        if self.seconds is not None:
+            self._handle = loop.call_at(loop.time() + self.seconds, self._expire)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        if exc_type is asyncio.CancelledError and self.expired:
+            raise asyncio.TimeoutError() from None
+
+    def _expire(self):
+        self.expired = True
+        self._task.cancel()
+
+
+@contextlib.contextmanager
+def patch_clock(loop):
+    """
+    Make time.monotonic() and time.time() tell the loop's virtual time, so
+    that code under test that reads the clock for itself sees time pass
+    just as the loop does, rather than needing real sleeps.
+
+    Only looking the functions up on the time module is patched: anything
+    that did ``from time import monotonic`` keeps the real clock.
+
+    NOTE: The time module is patched for the whole process, not just the
+    code under test.  Other threads, and anything timing the tests (such
+    as a test runner that reads time.time()), see virtual time too until
+    the patch is undone.
+    """
+    originals = time.monotonic, time.time
+    time.monotonic = time.time = loop.time
+    try:
+        yield loop
+    finally:
+        time.monotonic, time.time = originals
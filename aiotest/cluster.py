@@ -0,0 +1,319 @@
+import asyncio
+import heapq
+import itertools
+from collections import deque
+
+from aiotest.loop import EPOCH, Advancement, DeadlockError, TimeTravelingTestLoop
+
+
+class Cluster:
+    """
+    Runs any number of TimeTravelingTestLoops, one for each node of a
+    simulated cluster, on a single virtual clock.
+
+    Every member loop tells the time by the cluster's clock, and the cluster
+    moves it forward through everybody's deadlines at once, so that the
+    earliest Handle on any loop always runs next.  Member loops should only
+    be driven through the cluster, never with their own advance() or
+    run_until_complete().
+
+    The cluster never has to look at every loop to find out what's next: it
+    keeps a heap of each loop's earliest deadline, and a FIFO of the loops
+    with something ready to run, which the loops themselves keep it told of.
+    """
+    def __init__(self):
+        #: The shared virtual clock.
+        self._wall = EPOCH
+        #: Every member loop, in the order they joined.
+        self.loops = []
+        #: A heap of (deadline, sequence number, loop).  An entry goes stale,
+        #: and is skipped once it reaches the top, when it no longer matches
+        #: what's in _registered for its loop.
+        self._deadlines = []
+        self._sequence = itertools.count()
+        #: loop -> the earliest deadline the heap knows it to have, or None.
+        self._registered = {}
+        #: The loops with Handles on their ready FIFO, each one at most once.
+        self._runnable = deque()
+        self._queued = set()
+        #: How many passes over the runnable loops the cluster has made...
+        self.iterations = 0
+        #: ...and how many callbacks were run in them, on every loop.
+        self.callbacks_run = 0
+
+    def add(self, loop):
+        """
+        Make a loop a member of the cluster.  From now on its clock is the
+        cluster's.  Returns the loop.
+
+        Raises ValueError if it already belongs to a cluster.
+        """
+        if loop._coordinator is not None:
+            raise ValueError("{loop!r} already belongs to a cluster".format(loop=loop))
+        if loop.is_running():
+            raise RuntimeError("Cannot add a running event loop to a cluster")
+
+        loop._coordinator = self
+        loop._wall = self._wall
+        self.loops.append(loop)
+        self._registered[loop] = None
+
+        if loop._ready:
+            self._made_ready(loop)
+        when = loop._next_deadline()
+        if when is not None:
+            self._timer_scheduled(loop, when)
+        return loop
+
+    def new_loop(self, **kwargs):
+        """
+        Make a new TimeTravelingTestLoop, with the given arguments, and add
+        it to the cluster.
+        """
+        return self.add(TimeTravelingTestLoop(**kwargs))
+
+    def remove(self, loop):
+        """
+        Take a loop out of the cluster.  It keeps its own clock from here,
+        starting at the cluster's time.
+        """
+        self.loops.remove(loop)
+        del self._registered[loop]
+        if loop in self._queued:
+            self._queued.discard(loop)
+            self._runnable = deque(member for member in self._runnable if member is not loop)
+
+        loop._coordinator = None
+        loop._wall = self._wall
+
+    def close(self):
+        """
+        Take every loop out of the cluster, and close them.
+        """
+        for loop in list(self.loops):
+            self.remove(loop)
+            loop.close()
+
+    def time(self):
+        return self._wall
+
+    def _timer_scheduled(self, loop, when):
+        """
+        Called by a member loop whenever it schedules a Handle.
+        """
+        registered = self._registered[loop]
+        if registered is None or when < registered:
+            self._registered[loop] = when
+            heapq.heappush(self._deadlines, (when, next(self._sequence), loop))
+
+    def _made_ready(self, loop):
+        """
+        Called by a member loop whenever it puts a Handle on its ready FIFO.
+        """
+        if loop not in self._queued:
+            self._queued.add(loop)
+            self._runnable.append(loop)
+
+    def _next_deadline(self):
+        """
+        Returns the earliest deadline of any non-cancelled Handle on any
+        loop, or None if there isn't one.  Stale heap entries, and entries
+        for loops whose earliest Handle has since been cancelled, are sorted
+        out along the way.
+        """
+        deadlines = self._deadlines
+        registered = self._registered
+        while deadlines:
+            when, _, loop = deadlines[0]
+            if registered.get(loop) != when:
+                heapq.heappop(deadlines)
+                continue
+
+            actual = loop._next_deadline()
+            if actual == when:
+                return when
+
+            heapq.heappop(deadlines)
+            registered[loop] = None
+            if actual is not None:
+                self._timer_scheduled(loop, actual)
+        return None
+
+    def _collect_due(self, limit):
+        """
+        Move every Handle due up to ``limit``, on every loop, onto its loop's
+        ready FIFO.
+        """
+        deadlines = self._deadlines
+        registered = self._registered
+        while deadlines and deadlines[0][0] <= limit:
+            when, _, loop = heapq.heappop(deadlines)
+            if registered.get(loop) != when:
+                continue
+
+            registered[loop] = None
+            loop._collect_due(limit)
+            if loop._ready:
+                self._made_ready(loop)
+            when = loop._next_deadline()
+            if when is not None:
+                self._timer_scheduled(loop, when)
+
+    def _run_batch(self, loop):
+        """
+        Run the Handles that are on a loop's ready FIFO right now, but not
+        any they add to it, so that no loop can starve the others.
+        """
+        loop._wall = self._wall
+        ready = loop._ready
+        callbacks = 0
+
+        # Coroutines that find their loop with get_event_loop() have to find
+        # this one, not whichever loop the cluster was driven from.
+        previous = asyncio.events._get_running_loop()
+        asyncio.events._set_running_loop(loop)
+        try:
+            for _ in range(len(ready)):
+                handle = ready.popleft()
+                if not handle._cancelled:
+                    if loop._instruments:
+                        loop._run_instrumented(handle)
+                    else:
+                        handle._run()
+                    callbacks += 1
+        finally:
+            asyncio.events._set_running_loop(previous)
+
+        if callbacks:
+            loop.iterations += 1
+            loop.callbacks_run += callbacks
+        if ready:
+            self._made_ready(loop)
+        return callbacks
+
+    def _run_ready(self):
+        """
+        Keep giving each runnable loop its turn, round robin, until none of
+        them has anything ready to run.  The clock is left alone.
+
+        Returns the number of callbacks executed.
+        """
+        runnable = self._runnable
+        queued = self._queued
+        callbacks = 0
+        while runnable:
+            for _ in range(len(runnable)):
+                loop = runnable.popleft()
+                queued.discard(loop)
+                callbacks += self._run_batch(loop)
+            self.iterations += 1
+
+        self.callbacks_run += callbacks
+        return callbacks
+
+    def _step(self, when):
+        """
+        Jump the clock to ``when``, and run everything due by then.
+        """
+        if when > self._wall:
+            self._wall = when
+        self._collect_due(when)
+        return self._run_ready()
+
+    def advance_to_next(self):
+        """
+        Run whatever is ready, then jump the clock straight to the next
+        deadline on any loop, and run everything due at that instant.
+
+        Returns an Advancement of the virtual seconds travelled and the
+        number of callbacks executed.
+        """
+        start = self._wall
+        callbacks = self._run_ready()
+        when = self._next_deadline()
+        if when is not None:
+            callbacks += self._step(when)
+        return Advancement(self._wall - start, callbacks)
+
+    def advance(self, duration=0):
+        """
+        Move the clock forward by ``duration`` virtual seconds, running
+        everything due along the way, on every loop, in order.
+
+        Returns an Advancement of the virtual seconds travelled and the
+        number of callbacks executed.
+
+        Raises ValueError if ``duration`` is negative.
+        """
+        if duration < 0:
+            raise ValueError("advance() must be given a positive duration")
+
+        start = self._wall
+        travel_to = start + duration
+        callbacks = self._run_ready()
+        while True:
+            when = self._next_deadline()
+            if when is None or when > travel_to:
+                break
+            callbacks += self._step(when)
+
+        self._wall = travel_to
+        return Advancement(duration, callbacks)
+
+    def run_until_idle(self, max_time=None):
+        """
+        Keep jumping from deadline to deadline until no loop has anything
+        left to run.  See TimeTravelingTestLoop.run_until_idle().
+        """
+        return self.run_until_done(None, max_time)
+
+    def run_until_done(self, future, max_time=None):
+        """
+        Jump from deadline to deadline until ``future``, a Future or Task on
+        one of the member loops, is done.
+
+        Gives up, leaving ``future`` pending, if no loop has anything left to
+        do, or (if ``max_time`` is given) once running anything else would
+        take the clock past ``max_time`` virtual seconds from now.
+
+        Returns an Advancement of the virtual seconds travelled and the
+        number of callbacks executed.
+
+        Raises ValueError if ``max_time`` is negative.
+        """
+        if max_time is not None and max_time < 0:
+            raise ValueError("run_until_done() must be given a positive max_time")
+
+        start = self._wall
+        limit = None if max_time is None else start + max_time
+        callbacks = self._run_ready()
+
+        while future is None or not future.done():
+            when = self._next_deadline()
+            if when is None:
+                break
+            if limit is not None and when > limit:
+                self._wall = limit
+                break
+            callbacks += self._step(when)
+
+        return Advancement(self._wall - start, callbacks)
+
+    def run_until_complete(self, future):
+        """
+        Run the cluster until ``future``, a Future or Task on one of the
+        member loops, is done, and return its result.
+
+        Raises DeadlockError if every loop runs out of things to do first.
+        """
+        self.run_until_done(future)
+        if not future.done():
+            raise DeadlockError("{future!r} can never complete: no loop in the cluster has anything left to run".format(
+                future=future))
+        return future.result()
+
+    def is_idle(self):
+        """
+        Whether no loop has anything at all left to run, now or in the future.
+        """
+        return not self._runnable and self._next_deadline() is None
@@ -0,0 +1,43 @@
+import concurrent.futures
+
+
+def virtual_cost(seconds):
+    """
+    Declare how many virtual seconds a call to the decorated function takes
+    when it is handed to TimeTravelingTestLoop.run_in_executor().
+    """
+    def decorator(func):
+        func.virtual_cost = seconds
+        return func
+    return decorator
+
+
+class InlineExecutor(concurrent.futures.Executor):
+    """
+    An executor that runs each callable in the calling thread, the moment it
+    is submitted.  There are no threads to start and nothing to race, so
+    callables always run in the order they were submitted.
+
+    Callables without a declared virtual_cost() are charged ``cost`` virtual
+    seconds by TimeTravelingTestLoop.run_in_executor().
+    """
+    def __init__(self, cost=0.0):
+        self.cost = cost
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        if self._shutdown:
+            raise RuntimeError("cannot schedule new futures after shutdown")
+
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+        return future
+
+    def shutdown(self, wait=True):
+        self._shutdown = True
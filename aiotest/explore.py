@@ -0,0 +1,239 @@
+import asyncio
+import random
+from collections import Counter, namedtuple
+
+from aiotest.loop import DeadlockError
+
+#: One way a scenario's simultaneous Handles were ordered: the ``choices``
+#: that ordered them, how the scenario ended (``outcome``, as text), and the
+#: exception it failed with, or None if it didn't.
+Interleaving = namedtuple('Interleaving', ['choices', 'outcome', 'error'])
+
+
+class Chooser:
+    """
+    Decides the order that Handles ready to run at the same moment run in.
+    Installed on a loop as its ``_chooser``, it is handed every batch of
+    ready Handles the loop is about to run (callbacks, Task steps, and
+    timers that fell due), and reorders each run of them that share a
+    deadline, or that aren't timers at all, by picking which runs next, one
+    at a time.
+
+    Subclasses say how each pick is made.  Every pick made is remembered, as
+    (choice, number of options), in ``decisions``.
+    """
+    def __init__(self):
+        self.decisions = []
+
+    def pick(self, options):
+        """
+        Choose which of ``options`` Handles runs next, by index.
+        """
+        raise NotImplementedError()
+
+    def reorder(self, handles):
+        ordered = []
+        start = 0
+        count = len(handles)
+        while start < count:
+            when = getattr(handles[start], '_when', None)
+            end = start + 1
+            while end < count and getattr(handles[end], '_when', None) == when:
+                end += 1
+
+            group = handles[start:end]
+            while len(group) > 1:
+                ordered.append(group.pop(self.pick(len(group))))
+            ordered.extend(group)
+            start = end
+        return ordered
+
+    @property
+    def choices(self):
+        return tuple(choice for choice, _ in self.decisions)
+
+
+class RandomChooser(Chooser):
+    """
+    Makes every pick at random.
+    """
+    def __init__(self, rng):
+        super().__init__()
+        self._rng = rng
+
+    def pick(self, options):
+        choice = self._rng.randrange(options)
+        self.decisions.append((choice, options))
+        return choice
+
+
+class ReplayChooser(Chooser):
+    """
+    Makes the picks in ``prefix``, then always picks the Handle that was
+    scheduled first.  Only the first ``max_decisions`` picks are remembered
+    (and so ever explored); after that, Handles run in the order they were
+    scheduled.
+    """
+    def __init__(self, prefix=(), max_decisions=None):
+        super().__init__()
+        self._prefix = prefix
+        self._max_decisions = max_decisions
+
+    def pick(self, options):
+        index = len(self.decisions)
+        if self._max_decisions is not None and index >= self._max_decisions:
+            return 0
+
+        choice = self._prefix[index] if index < len(self._prefix) else 0
+        if choice >= options:
+            raise RuntimeError("The scenario didn't schedule the same Handles when run again; its interleavings "
+                               "can't be explored unless it's deterministic")
+        self.decisions.append((choice, options))
+        return choice
+
+
+def _next_prefix(decisions):
+    """
+    The picks that lead, depth first, to the next interleaving to explore
+    after the one ``decisions`` were made for, or None once there are none.
+    """
+    for index in range(len(decisions) - 1, -1, -1):
+        choice, options = decisions[index]
+        if choice + 1 < options:
+            return tuple(choice for choice, _ in decisions[:index]) + (choice + 1,)
+    return None
+
+
+class ExplorationReport:
+    """
+    How exploring a scenario's interleavings went: every distinct
+    interleaving that was run, and what came of it.
+    """
+    def __init__(self):
+        #: How many times the scenario was run...
+        self.runs = 0
+        #: ...and the distinct Interleavings those runs turned out to be.
+        self.interleavings = []
+        #: Whether every interleaving there is was run, when exploring exhaustively.
+        self.complete = False
+
+    @property
+    def failures(self):
+        return [interleaving for interleaving in self.interleavings if interleaving.error is not None]
+
+    def outcomes(self):
+        """
+        How many distinct interleavings ended in each outcome.
+        """
+        return Counter(interleaving.outcome for interleaving in self.interleavings)
+
+    def summary(self):
+        """
+        A short, readable account of the exploration.
+        """
+        lines = ["{unique} distinct interleavings in {runs} runs{complete}, {failed} failed:".format(
+            unique=len(self.interleavings), runs=self.runs, failed=len(self.failures),
+            complete=" (all of them)" if self.complete else "")]
+        for outcome, count in self.outcomes().most_common():
+            lines.append("  {count:>6}  {outcome}".format(count=count, outcome=outcome))
+        return "\n".join(lines)
+
+
+def run_interleaving(loop, scenario, chooser, max_time=None):
+    """
+    Run ``scenario`` once, with ``chooser`` ordering its simultaneous
+    Handles, from a loop whose schedule has been reset (see
+    TimeTravelingTestLoop.reset_schedule()).  Returns a Future of what it returned
+    or raised; if it never finished, that's a DeadlockError, or an
+    asyncio.TimeoutError once ``max_time`` ran out.
+
+    Whatever it leaves running is cancelled afterwards.
+    """
+    loop.reset_schedule()
+    loop._chooser = chooser
+    try:
+        future = asyncio.ensure_future(scenario(), loop=loop)
+        loop.run_until_done(future, max_time)
+        idle = loop.is_idle()
+    finally:
+        loop._chooser = None
+
+    if not future.done():
+        future.cancel()
+        future = loop.create_future()
+        if idle:
+            future.set_exception(DeadlockError("never finished: it was waiting on something that would never happen"))
+        else:
+            future.set_exception(asyncio.TimeoutError(
+                "never finished: it was still going {max_time} virtual seconds in".format(max_time=max_time)))
+
+    loop.cancel_pending_tasks()
+    return future
+
+
+def _describe_outcome(future):
+    exc = future.exception()
+    if exc is None:
+        return "returned {result!r}".format(result=future.result()), None
+    return "raised {name}: {exc}".format(name=type(exc).__name__, exc=exc), exc
+
+
+def explore(loop, scenario, runs=100, seed=0, exhaustive=False, max_decisions=None, max_time=None):
+    """
+    Run a scenario over and over, with Handles that are ready to run at the
+    same moment (Task steps, callbacks, and timers that fall due together)
+    run in a different order each time, to shake out race conditions that
+    the usual first-scheduled-first-run order never hits.
+
+    ``scenario`` is called with no arguments at the start of each run, and
+    returns the coroutine to run on the loop, whose schedule is reset
+    before every run.  Servers and fake programs set up on the loop
+    beforehand are kept.  The scenario has to be deterministic: given the same order, it
+    has to do the same thing.  A run fails if its coroutine raises, or
+    never finishes (in ``max_time`` virtual seconds, if given).
+
+    By default, ``runs`` orders are chosen at random, from ``seed``.  With
+    ``exhaustive``, every possible order is run, depth first, up to a total
+    of ``runs``; ``max_decisions`` narrows that down to only those orders
+    that differ in their first so many picks.  Either way, orders that have
+    been seen already are only counted once.
+
+    Returns an ExplorationReport.  An Interleaving's choices run it again
+    with replay().
+    """
+    report = ExplorationReport()
+    seen = set()
+    rng = random.Random(seed)
+    prefix = ()
+
+    while report.runs < runs:
+        if exhaustive:
+            chooser = ReplayChooser(prefix, max_decisions)
+        else:
+            chooser = RandomChooser(rng)
+
+        future = run_interleaving(loop, scenario, chooser, max_time)
+        report.runs += 1
+
+        choices = chooser.choices
+        outcome, error = _describe_outcome(future)
+        if choices not in seen:
+            seen.add(choices)
+            report.interleavings.append(Interleaving(choices, outcome, error))
+
+        if exhaustive:
+            prefix = _next_prefix(chooser.decisions)
+            if prefix is None:
+                report.complete = True
+                break
+
+    return report
+
+
+def replay(loop, scenario, choices, max_time=None):
+    """
+    Run ``scenario`` in the one interleaving that ``choices`` (from an
+    Interleaving) make, and return its result.  Whatever it raised is
+    raised again.
+    """
+    return run_interleaving(loop, scenario, ReplayChooser(choices), max_time).result()
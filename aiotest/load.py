@@ -0,0 +1,196 @@
+import bisect
+import math
+import random
+from array import array
+from collections import Counter
+
+
+def poisson(rate):
+    """
+    Arrivals of a Poisson process: on average ``rate`` a virtual second,
+    with exponentially distributed gaps between them.
+    """
+    def gap(rng):
+        return rng.expovariate(rate)
+    return gap
+
+
+def uniform(rate):
+    """
+    Arrivals exactly 1 / ``rate`` virtual seconds apart.
+    """
+    interval = 1.0 / rate
+
+    def gap(rng):
+        return interval
+    return gap
+
+
+def burst():
+    """
+    Every client arrives at once.
+    """
+    def gap(rng):
+        return 0.0
+    return gap
+
+
+class LoadReport:
+    """
+    How a simulated load went: the latency, in virtual seconds, of every
+    client that finished, the exceptions of those that failed, and how many
+    were still going when the simulation was called off.
+    """
+    def __init__(self, latencies, errors, incomplete, elapsed):
+        #: The latency of every client that finished, in the order they finished.
+        self.latencies = latencies
+        #: Exception type name -> how many clients raised one.
+        self.errors = errors
+        #: How many clients never finished.
+        self.incomplete = incomplete
+        #: How many virtual seconds the whole simulation took.
+        self.elapsed = elapsed
+        self._sorted = None
+
+    @property
+    def completed(self):
+        return len(self.latencies)
+
+    @property
+    def failed(self):
+        return sum(self.errors.values())
+
+    @property
+    def throughput(self):
+        """
+        Clients finished per virtual second.
+        """
+        return self.completed / self.elapsed if self.elapsed else float('inf')
+
+    @property
+    def mean(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    @property
+    def max(self):
+        return max(self.latencies) if self.latencies else 0.0
+
+    def percentile(self, percent):
+        """
+        The latency ``percent`` percent of finished clients came in at or
+        under, by nearest rank.
+        """
+        if not 0 <= percent <= 100:
+            raise ValueError("percent must be between 0 and 100, not {percent!r}".format(percent=percent))
+        if not self.latencies:
+            return 0.0
+
+        if self._sorted is None:
+            self._sorted = sorted(self.latencies)
+        rank = max(1, math.ceil(percent / 100.0 * len(self._sorted)))
+        return self._sorted[rank - 1]
+
+    def histogram(self, bounds=None):
+        """
+        How many latencies fall into each bucket, as (upper bound, count)
+        pairs.  Buckets run up to each of ``bounds`` in turn (ten even ones
+        up to the slowest latency by default), and a last one, with an upper
+        bound of infinity, catches anything slower.
+        """
+        if bounds is None:
+            top = self.max or 1.0
+            bounds = [top * bucket / 10 for bucket in range(1, 11)]
+        bounds = sorted(bounds)
+
+        counts = [0] * (len(bounds) + 1)
+        for latency in self.latencies:
+            counts[bisect.bisect_left(bounds, latency)] += 1
+        return list(zip(bounds + [float('inf')], counts))
+
+    def summary(self):
+        """
+        A short, readable account of the run.
+        """
+        return ("{completed} completed, {failed} failed, {incomplete} incomplete in {elapsed:.3f} virtual seconds "
+                "({throughput:.1f}/s); latency p50={p50:.6f} p90={p90:.6f} p99={p99:.6f} max={max:.6f}").format(
+            completed=self.completed, failed=self.failed, incomplete=self.incomplete, elapsed=self.elapsed,
+            throughput=self.throughput, p50=self.percentile(50), p90=self.percentile(90), p99=self.percentile(99),
+            max=self.max)
+
+
+def simulate_load(loop, client, count, arrivals=None, seed=0, max_time=None):
+    """
+    Start ``count`` clients on the loop, arriving one after another as
+    ``arrivals`` (poisson(), uniform() or burst(), or any function of a
+    random.Random giving the gap before the next arrival) says, and run the
+    loop on virtual time until every one of them has finished.
+
+    ``client`` is called with each client's number, from 0, as it arrives,
+    and returns the coroutine it runs.  The latency of a client is the
+    virtual time from its arrival to its coroutine finishing.  Given the
+    same ``seed``, arrivals always come at the same moments.
+
+    If ``max_time`` is given, any client still going that many virtual
+    seconds in is cancelled and counted as incomplete.
+
+    Returns a LoadReport.
+    """
+    if arrivals is None:
+        arrivals = poisson(100.0)
+    rng = random.Random(seed)
+
+    latencies = array('d')
+    errors = Counter()
+    running = set()
+    finished = loop.create_future()
+    arrived = done = 0
+    next_arrival = None
+    # Arrivals are worked out from the start, rather than from each other,
+    # so that rounding errors don't build up over thousands of them.
+    start = loop.time()
+    offset = 0.0
+
+    def client_done(task, arrived_at):
+        nonlocal done
+        running.discard(task)
+        done += 1
+        if not task.cancelled():
+            exc = task.exception()
+            if exc is None:
+                latencies.append(loop.time() - arrived_at)
+            else:
+                errors[type(exc).__name__] += 1
+        if done == count and not finished.done():
+            finished.set_result(None)
+
+    def arrive():
+        nonlocal arrived, next_arrival, offset
+        index = arrived
+        arrived += 1
+
+        arrived_at = loop.time()
+        task = loop.create_task(client(index))
+        running.add(task)
+        task.add_done_callback(lambda task: client_done(task, arrived_at))
+
+        # Only the next arrival is ever on the schedule, however many clients there are.
+        if arrived < count:
+            offset += arrivals(rng)
+            next_arrival = loop.call_at(start + offset, arrive)
+        else:
+            next_arrival = None
+
+    if count:
+        next_arrival = loop.call_soon(arrive)
+        loop.run_until_done(finished, max_time)
+
+    # Call off whatever hasn't finished, or hasn't even arrived yet.
+    incomplete = count - done
+    if next_arrival is not None:
+        next_arrival.cancel()
+    for task in list(running):
+        task.cancel()
+    if running:
+        loop.advance(0)
+
+    return LoadReport(latencies, errors, incomplete, loop.time() - start)
@@ -1,26 +1,143 @@
 import asyncio
-import heapq
-import operator
+import concurrent.futures
+import itertools
+import shlex
+import subprocess
+import weakref
+from collections import namedtuple
+
+from aiotest.executor import InlineExecutor
+from aiotest.network import VirtualNetwork
+from aiotest.pipes import FIRST_FD, ProcessTable, connect_read_pipe, connect_write_pipe
+from aiotest.scheduler import HeapScheduler
+
+
+#: The outcome of moving the loop through time: how many virtual seconds
+#: passed, and how many callbacks were executed along the way.
+Advancement = namedtuple('Advancement', ['elapsed', 'callbacks'])
+
+
+class Leaks(namedtuple('Leaks', ['tasks', 'handles', 'exceptions'])):
+    """
+    What a test left behind on its loop: Tasks that are still pending,
+    Handles that are still waiting to run, and Futures whose exceptions
+    nobody ever retrieved.  False when there's nothing at all.
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return any(self)
+
+    def describe(self):
+        """
+        A readable account of every leak, one per line.
+        """
+        lines = ["{tasks} pending task(s), {handles} handle(s) and {exceptions} unretrieved exception(s) "
+                 "left on the loop:".format(tasks=len(self.tasks), handles=len(self.handles), exceptions=len(self.exceptions))]
+        lines.extend("  pending {task!r}".format(task=task) for task in self.tasks)
+        lines.extend("  waiting {handle!r}".format(handle=handle) for handle in self.handles)
+        lines.extend("  {exc!r} never retrieved from {future!r}".format(exc=future._exception, future=future)
+                     for future in self.exceptions)
+        return "\n".join(lines)
+
+
+#: The monotonic wall time every test loop starts at, in seconds.
+EPOCH = 591282000.0
+
+
+class DeadlockError(RuntimeError):
+    """
+    Raised when a running loop has nothing left to run, now or in the
+    future, and so would otherwise wait forever.
+    """
 
 
 class TestableHandle:
     """
-    A testable Handle implementation
+    The timer Handle TimeTravelingTestLoop.call_at() and call_later() hand
+    out.  It behaves like asyncio's TimerHandle, but is smaller: it has no
+    weak reference, source traceback or cached repr slots.
+
+    Handles are ordered by when they're due, and then by ``seq``, the order
+    they were scheduled in, so those due at the same moment always run first
+    come, first served.  Comparing two only ever looks at those two slots.
     """
-    def __init__(self, when, callback, args):
-        self.when = when
-        self.callback = callback
-        self.args = args
-        self.cancelled = False
+    __slots__ = ('_when', '_seq', '_callback', '_args', '_cancelled', '_scheduled', '_loop')
+
+    #: Never recorded, but asyncio checks for it.
+    _source_traceback = None
+
+    def __init__(self, when, callback, args, loop=None, seq=0):
+        self._when = when
+        self._seq = seq
+        self._callback = callback
+        self._args = args
+        self._cancelled = False
+        #: Whether the Handle is sitting on a loop's schedule.
+        self._scheduled = False
+        self._loop = loop
+
+    @property
+    def when(self):
+        return self._when
 
-    def __lt__(self, other_task):
-        return self.when < other_task.when
+    @property
+    def callback(self):
+        return self._callback
+
+    @property
+    def args(self):
+        return self._args
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def __lt__(self, other):
+        if self._when == other._when:
+            return self._seq < other._seq
+        return self._when < other._when
+
+    def __repr__(self):
+        return "<{cls} when={when}{cancelled} {callback!r}>".format(
+            cls=type(self).__name__, when=self._when, cancelled=' cancelled' if self._cancelled else '',
+            callback=self._callback)
 
     def cancel(self):
         """
         Cancel this handle, preventing it from being executed later.
         """
-        self.cancelled = True
+        if not self._cancelled:
+            if self._loop is not None:
+                self._loop._timer_handle_cancelled(self)
+            self._cancelled = True
+            self._callback = None
+            self._args = None
+
+    def _run(self):
+        try:
+            self._callback(*self._args)
+        except Exception as exc:
+            self._loop.call_exception_handler({
+                'message': "Exception in callback {callback!r}".format(callback=self._callback),
+                'exception': exc,
+                'handle': self,
+            })
+        self = None  # Breaks the reference cycle through the exception's traceback.
+
+
+class ReadyHandle(asyncio.Handle):
+    """
+    The Handle TimeTravelingTestLoop.call_soon() hands out.  It is asyncio's
+    own, except that the loop's instruments are told when it's cancelled.
+    """
+    __slots__ = ()
+
+    def cancel(self):
+        if not self._cancelled and self._loop._instruments:
+            self._loop._handle_cancelled(self)
+        super().cancel()
+
 
 class TimeTravelingTestLoop(asyncio.base_events.BaseEventLoop):
     """
@@ -28,27 +145,141 @@ class TimeTravelingTestLoop(asyncio.base_events.BaseEventLoop):
     support true network capabilities, but is capable of traveling
     forward in time in a deterministic manner.
     """
-    def __init__(self):
+    def __init__(self, compact_fraction=0.5, compact_minimum=100, scheduler=HeapScheduler):
         super().__init__()
 
-        # self.durations = Counter()
-        #: A heap of all time-scheduled Handles
-        # self._scheduled = []
+        #: Objects watching every Handle the loop schedules and runs.  See add_instrument().
+        self._instruments = []
+        #: All time-scheduled Handles, kept in order by a HeapScheduler or BucketScheduler.
+        self._scheduled = scheduler()
+        #: Numbers TestableHandles in the order they're scheduled in.
+        self._timer_sequence = itertools.count()
         #: A FIFO of ready-to-run Handles
         # self._ready = deque()
         #: The current monotonic wall time, in seconds.
-        self._wall = 591282000.0
+        self._wall = EPOCH
+        #: The Cluster this loop shares its clock with, if any.  See aiotest.cluster.
+        self._coordinator = None
+        #: Decides the order that each batch of ready Handles runs in, if
+        #: anything should; otherwise they run in the order they were
+        #: scheduled.  Only run_until_complete() and run_until_done() ask it.
+        #: See aiotest.explore.
+        self._chooser = None
         #: When specific coroutines last yielded to the event loop.
         self._call_calender = {}
+        #: Every Task and Future made by create_task() and create_future()
+        #: that is still alive, so leaks() never has to go looking for them.
+        self._futures = weakref.WeakSet()
+        #: Futures that were thrown away without their exception being retrieved.
+        self._unretrieved = []
+
+        #: Rebuild the scheduled heap once more than this fraction of it is
+        #: cancelled Handles...
+        self.compact_fraction = compact_fraction
+        #: ...as long as it holds more than this many Handles.
+        self.compact_minimum = compact_minimum
+        #: How many times the scheduled heap has been rebuilt.
+        self.compactions = 0
+        #: How many cancelled Handles those rebuilds have thrown away.
+        self.compacted_handles = 0
+        #: How many batches of ready callbacks the loop has run...
+        self.iterations = 0
+        #: ...and how many callbacks were in them.
+        self.callbacks_run = 0
+        #: The most Handles, cancelled or not, there have been on the scheduled heap at once.
+        self.peak_scheduled = 0
+
+        #: Carries connections between create_server() and create_connection().
+        self.network = VirtualNetwork(self)
+        #: The fake programs subprocess_exec() can run.
+        self.processes = ProcessTable(self)
+        #: Every open VirtualPipe, keyed on both of its file descriptors.
+        self._pipes = {}
+        self._next_fd = FIRST_FD
+        self._default_executor = InlineExecutor()
+
+    def reset(self):
+        """
+        Put the loop back the way it was when it was created, cancelling any
+        pending Tasks and throwing away everything that is scheduled or ready
+        to run, so that it can be reused by another test.
+        """
+        self.reset_schedule()
+        self.network.reset()
+        self.processes.reset()
+
+    def reset_schedule(self):
+        """
+        Like reset(), but only what was set running is thrown away: servers
+        listening on the virtual network, and fake programs registered with
+        ``processes``, stay where they are.  Open VirtualPipes are forgotten,
+        and the clock turned back, so that a scenario can be run again from
+        the start, just as it was the first time.
+        """
+        if self.is_running():
+            raise RuntimeError("Cannot reset a running event loop")
+
+        # Tasks that are thrown away while still pending complain about it
+        # once they're garbage collected, so they're cancelled first.
+        if not self.is_closed():
+            self.cancel_pending_tasks()
+
+        for handle in self._scheduled:
+            handle._scheduled = False
+        self._scheduled.clear()
+        self._ready.clear()
+        self._futures.clear()
+        self._unretrieved.clear()
+        self._timer_cancelled_count = 0
+        self._timer_sequence = itertools.count()
+        self._stopping = False
+        self._wall = EPOCH
+        self._pipes.clear()
+        self._next_fd = FIRST_FD
 
     def _run_once(self):
         """
-        Run a "single iteration" of the event loop.
+        Run a "single iteration" of the event loop, for run_forever() and
+        run_until_complete().
+
+        Like BaseEventLoop, every Handle that is already due joins the ready
+        FIFO first, and then everything on it is run.  If nothing was ready,
+        rather than waiting around for the next deadline, the clock jumps
+        straight to it and everything due then is run instead.  Anything a
+        callback makes ready is left for the next iteration, so stop() takes
+        effect as soon as it should.
+
+        Raises DeadlockError if there's nothing at all left to run and the
+        loop hasn't been asked to stop.
+        """
+        ready = self._ready
+        self._collect_due(self._wall)
+        if not ready:
+            when = self._next_deadline()
+            if when is None:
+                if self._stopping:
+                    return
+                raise DeadlockError("The event loop has nothing left to run, and nothing scheduled to run later")
+
+            if when > self._wall:
+                self._wall = when
+            self._collect_due(when)
+
+        self._run_batch()
+
+    def run_until_complete(self, future):
+        """
+        Run until ``future`` is done, jumping the clock from deadline to
+        deadline along the way, and return its result.
 
-        Really, we're going to just run everything that can be run at this exact
-        moment in time.
+        Raises DeadlockError if the loop runs out of things to do before
+        ``future`` is done.
         """
-        self.advance()
+        try:
+            return super().run_until_complete(future)
+        except DeadlockError:
+            raise DeadlockError("{future!r} can never complete: the event loop has nothing left to run".format(
+                future=future)) from None
 
     def time(self):
         """
@@ -56,7 +287,11 @@ class TimeTravelingTestLoop(asyncio.base_events.BaseEventLoop):
         be time.time() or time.monotonic() or some other system-specific clock,
         but it must return a float expressing the time in units of
         approximately one second since some epoch.
+
+        A loop that belongs to a Cluster tells the Cluster's time instead.
         """
+        if self._coordinator is not None:
+            return self._coordinator._wall
         return self._wall
 
     def advance(self, duration=0, inclusive=True):
@@ -65,24 +300,21 @@ class TimeTravelingTestLoop(asyncio.base_events.BaseEventLoop):
         was scheduled to run during this time are executed
         in chronological order.
 
+        Returns an Advancement of the virtual seconds travelled and the
+        number of callbacks executed.
+
         Raises ValueError if ``duration`` is negative.
         """
         if duration < 0:
             raise ValueError("advance() must be given a positive duration")
 
+        start = self._wall
+        callbacks = 0
+
         # The time on the wall clock we want to be at when
         # we finish advancing.
         travel_to = self._wall + duration
 
-        # Inclusive means we'll accept tasks as ready if they are supposed to run up to or at our travel_to time.
-        # Otherwise, when we're not inclusive, we only mark them as ready if they should run before our travel_to time.
-        if inclusive:
-            # Using >=
-            comparator = operator.ge
-        else:
-            # Use >
-            comparator = operator.gt
-
         # Because we're moving through time, we cant assume that our first check in the scheduled heap
         # will reveal everything that would occur before our travel_to time.  That's because we may, for example,
         # exhaust our scheduled heap, only for tasks to introduce new items to it while they're being run.  Those
@@ -91,20 +323,14 @@ class TimeTravelingTestLoop(asyncio.base_events.BaseEventLoop):
         # Once we reach a point where our _ready queue is empty, we know we won't be adding anything back
         # into the schedule, and we can safely get out.
         while True:
+            # Pull out every scheduled task that happens before our total advance duration
+            # has passed, and place them on the ready FIFO.
+            #
+            # Inclusive means we'll accept tasks as ready if they are supposed to run up to or at our travel_to
+            # time.  Otherwise, when we're not inclusive, we only mark them as ready if they should run before our
+            # travel_to time.
             if self._scheduled:
-                # Pull out all scheduled events corresponding to the
-                # current wall time, and place them on the ready FIFO.
-                t = self._scheduled[0]
-
-                # We move ahead to each scheduled task that happens before our
-                # total advance duration has passed.
-                #
-                while (t is not None) and comparator(travel_to, t._when):
-                    # Don't bother putting canceled tasks on the ready FIFO.
-                    if not t._cancelled:
-                        self._ready.append(t)
-                    heapq.heappop(self._scheduled)
-                    t = self._scheduled[0] if len(self._scheduled) else None
+                self._collect_due(travel_to, inclusive)
 
             if self._ready:
                 # Execute all non-cancelled Handles on the ready FIFO.
@@ -117,7 +343,12 @@ class TimeTravelingTestLoop(asyncio.base_events.BaseEventLoop):
                         pass
 
                     if not handle._cancelled:
-                        handle._run()
+                        if self._instruments:
+                            self._run_instrumented(handle)
+                        else:
+                            handle._run()
+                        callbacks += 1
+                self.iterations += 1
 
             # We now know there's nothing that could be added back into our schedule.
             else:
@@ -127,6 +358,404 @@ class TimeTravelingTestLoop(asyncio.base_events.BaseEventLoop):
         # aka: make sure the wall clock is set right when we've advanced past our latest scheduled
         # task.
         self._wall = travel_to
+        self.callbacks_run += callbacks
+
+        return Advancement(travel_to - start, callbacks)
+
+    def advance_to_next(self):
+        """
+        Jump the clock straight to the next pending deadline, and run
+        everything that is due at that instant in one batch.  Anything
+        already sitting on the ready FIFO is run first.
+
+        Unlike advance(), the clock never has to be told how far to go, and
+        it never moves past the deadline it jumped to.
+
+        Returns an Advancement of the virtual seconds travelled and the
+        number of callbacks executed.
+        """
+        start = self._wall
+        callbacks = self._run_ready()
+
+        when = self._next_deadline()
+        if when is not None:
+            # Timers scheduled in the past run now; they never pull the clock backwards.
+            if when > self._wall:
+                self._wall = when
+
+            self._collect_due(when)
+            callbacks += self._run_ready()
+
+        return Advancement(self._wall - start, callbacks)
+
+    def run_until_idle(self, max_time=None):
+        """
+        Keep jumping from deadline to deadline until both the ready FIFO and
+        the scheduled heap are empty.
+
+        If ``max_time`` is given, stop before running anything scheduled more
+        than ``max_time`` virtual seconds from now, and leave the clock at
+        exactly that point.  Without it, a callback that keeps rescheduling
+        itself will keep this running forever.
+
+        Returns an Advancement of the virtual seconds travelled and the
+        number of callbacks executed.
+
+        Raises ValueError if ``max_time`` is negative.
+        """
+        if max_time is not None and max_time < 0:
+            raise ValueError("run_until_idle() must be given a positive max_time")
+
+        start = self._wall
+        limit = None if max_time is None else start + max_time
+        callbacks = 0
+
+        while True:
+            callbacks += self._run_ready()
+
+            when = self._next_deadline()
+            if when is None:
+                break
+            if limit is not None and when > limit:
+                self._wall = limit
+                break
+
+            callbacks += self.advance_to_next().callbacks
+
+        return Advancement(self._wall - start, callbacks)
+
+    def run_until_done(self, future, max_time=None):
+        """
+        Jump from deadline to deadline until ``future`` is done.
+
+        Gives up, leaving ``future`` pending, if the loop runs out of things
+        to do first, or (if ``max_time`` is given) once running anything else
+        would take the clock past ``max_time`` virtual seconds from now.
+
+        Returns an Advancement of the virtual seconds travelled and the
+        number of callbacks executed.
+
+        Raises ValueError if ``max_time`` is negative.
+        """
+        if max_time is not None and max_time < 0:
+            raise ValueError("run_until_done() must be given a positive max_time")
+
+        start = self._wall
+        limit = None if max_time is None else start + max_time
+        callbacks = 0
+
+        # One batch at a time, so that a callback that keeps rescheduling
+        # itself (like one polling for something) can't keep us from
+        # noticing that the future is done, or starve timers already due.
+        while not future.done():
+            self._collect_due(self._wall)
+            if self._ready:
+                callbacks += self._run_batch()
+                continue
+
+            when = self._next_deadline()
+            if when is None:
+                break
+            if limit is not None and when > limit:
+                self._wall = limit
+                break
+
+            if when > self._wall:
+                self._wall = when
+            self._collect_due(when)
+
+        return Advancement(self._wall - start, callbacks)
+
+    def is_idle(self):
+        """
+        Whether there's nothing at all left to run, now or in the future.
+        """
+        return not self._ready and self._next_deadline() is None
+
+    def _next_deadline(self):
+        """
+        Returns the time of the earliest non-cancelled scheduled Handle, or
+        None if nothing is scheduled.  Cancelled Handles found on top of the
+        heap along the way are thrown away.
+        """
+        scheduled = self._scheduled
+        while scheduled:
+            handle = scheduled.peek()
+            if not handle._cancelled:
+                return handle._when
+            scheduled.pop_first()
+            handle._scheduled = False
+            self._timer_cancelled_count -= 1
+        return None
+
+    def _collect_due(self, limit, inclusive=True):
+        """
+        Move every Handle scheduled up to ``limit`` onto the ready FIFO, in
+        order, throwing away cancelled ones and keeping the cancelled Handle
+        count in step with what's left.
+        """
+        ready = self._ready
+        for handle in self._scheduled.pop_due(limit, inclusive):
+            handle._scheduled = False
+            if handle._cancelled:
+                self._timer_cancelled_count -= 1
+            else:
+                ready.append(handle)
+
+    def _timer_handle_cancelled(self, handle):
+        """
+        Called by a TestableHandle as it is being cancelled.
+
+        Cancelled Handles are normally left where they are on the scheduled
+        heap, and only thrown away once they bubble up to the top.  When they
+        start to make up most of the heap, every push and pop is paying for
+        dead weight, so we rebuild it without them.
+        """
+        if self._instruments:
+            self._handle_cancelled(handle)
+        if not handle._scheduled:
+            return
+
+        self._timer_cancelled_count += 1
+
+        scheduled_count = len(self._scheduled)
+        if (scheduled_count > self.compact_minimum and
+                self._timer_cancelled_count > self.compact_fraction * scheduled_count):
+            self._compact_scheduled(handle)
+
+    def _compact_scheduled(self, cancelling=None):
+        """
+        Rebuild the scheduled heap with only its non-cancelled Handles.
+
+        ``cancelling`` is a Handle that is part way through being cancelled,
+        and so doesn't know it's cancelled yet.
+
+        The heap is rebuilt in place, so anything holding on to it (like an
+        advance() that is in progress) sees the new one.
+        """
+        scheduled = self._scheduled
+        live = []
+        for handle in scheduled:
+            if handle._cancelled or handle is cancelling:
+                handle._scheduled = False
+            else:
+                live.append(handle)
+
+        self.compactions += 1
+        self.compacted_handles += len(scheduled) - len(live)
+
+        scheduled.rebuild(live)
+        self._timer_cancelled_count = 0
+
+    @property
+    def cancelled_count(self):
+        """
+        How many cancelled Handles are still sitting on the scheduled heap.
+        """
+        return self._timer_cancelled_count
+
+    @property
+    def scheduled_count(self):
+        """
+        How many Handles, cancelled or not, are on the scheduled heap.
+        """
+        return len(self._scheduled)
+
+    def _run_ready(self):
+        """
+        Execute every non-cancelled Handle on the ready FIFO, including any
+        that are added while we're running them.  The clock is left alone.
+
+        Returns the number of callbacks executed.
+        """
+        ready = self._ready
+        instruments = self._instruments
+        callbacks = 0
+        while ready:
+            handle = ready.popleft()
+            if not handle._cancelled:
+                if instruments:
+                    self._run_instrumented(handle)
+                else:
+                    handle._run()
+                callbacks += 1
+
+        if callbacks:
+            self.iterations += 1
+            self.callbacks_run += callbacks
+        return callbacks
+
+    def _run_batch(self):
+        """
+        Execute the non-cancelled Handles that are on the ready FIFO right
+        now, but not any that they add to it, like one iteration of
+        BaseEventLoop._run_once().  A chooser gets to reorder them first.
+        The clock is left alone.
+
+        Returns the number of callbacks executed.
+        """
+        ready = self._ready
+        if self._chooser is not None and len(ready) > 1:
+            batch = self._chooser.reorder([handle for handle in ready if not handle._cancelled])
+            ready.clear()
+            ready.extend(batch)
+
+        instruments = self._instruments
+        callbacks = 0
+        for _ in range(len(ready)):
+            handle = ready.popleft()
+            if not handle._cancelled:
+                if instruments:
+                    self._run_instrumented(handle)
+                else:
+                    handle._run()
+                callbacks += 1
+
+        self.iterations += 1
+        self.callbacks_run += callbacks
+        return callbacks
+
+    def _run_instrumented(self, handle):
+        """
+        Run a Handle, letting every instrument know before and after.
+        """
+        instruments = self._instruments
+        for instrument in instruments:
+            instrument.handle_started(handle, self._wall)
+        handle._run()
+        for instrument in reversed(instruments):
+            instrument.handle_finished(handle, self._wall)
+
+    def _handle_cancelled(self, handle):
+        """
+        Let every instrument know that a Handle won't be run after all.
+        """
+        for instrument in self._instruments:
+            instrument.handle_cancelled(handle, self._wall)
+
+    def add_instrument(self, instrument):
+        """
+        Start telling an instrument about every Handle the loop schedules
+        and runs, by calling its methods:
+
+        * handle_scheduled(handle, now) when a callback is scheduled,
+        * handle_started(handle, now) just before it runs,
+        * handle_finished(handle, now) just after, and
+        * handle_cancelled(handle, now) if it's cancelled instead.
+
+        ``now`` is the loop's time.  Without any instruments, the loop
+        doesn't spend anything on them.
+        """
+        self._instruments.append(instrument)
+
+    def remove_instrument(self, instrument):
+        """
+        Stop telling an instrument about Handles.
+        """
+        self._instruments.remove(instrument)
+
+    def call_at(self, when, callback, *args):
+        """
+        Like call_later(), but uses an absolute time.
+
+        Absolute time corresponds to the event loop's time() method.
+        """
+        self._check_closed()
+        if self._debug:
+            self._check_thread()
+            self._check_callback(callback, 'call_at')
+
+        timer = TestableHandle(when, callback, args, self, next(self._timer_sequence))
+        scheduled = self._scheduled
+        scheduled.push(timer)
+        timer._scheduled = True
+        size = len(scheduled)
+        if size > self.peak_scheduled:
+            self.peak_scheduled = size
+        if self._coordinator is not None:
+            self._coordinator._timer_scheduled(self, when)
+
+        if self._instruments:
+            for instrument in self._instruments:
+                instrument.handle_scheduled(timer, self._wall)
+        return timer
+
+    def create_future(self):
+        future = super().create_future()
+        self._futures.add(future)
+        return future
+
+    def create_task(self, coro):
+        task = super().create_task(coro)
+        self._futures.add(task)
+        return task
+
+    def leaks(self):
+        """
+        Everything still hanging around on the loop: pending Tasks, Handles
+        that haven't been cancelled and are yet to run, and Futures whose
+        exception has never been retrieved.  Only Tasks and Futures made by
+        create_task() and create_future() (and so ensure_future() and
+        friends) are found.
+
+        Returns a Leaks, which is false if there aren't any.
+        """
+        tasks = []
+        exceptions = list(self._unretrieved)
+        for future in self._futures:
+            if not future.done():
+                if isinstance(future, asyncio.Task):
+                    tasks.append(future)
+            elif future._log_traceback:
+                exceptions.append(future)
+
+        handles = [handle for handle in self._ready if not handle._cancelled]
+        handles.extend(sorted(handle for handle in self._scheduled if not handle._cancelled))
+
+        return Leaks(tasks, handles, exceptions)
+
+    def call_exception_handler(self, context):
+        # A Future that is garbage collected without anyone retrieving its
+        # exception is gone from _futures by now, so leaks() is told here.
+        future = context.get('future')
+        if future is not None and context.get('message', '').endswith('exception was never retrieved'):
+            self._unretrieved.append(future)
+        super().call_exception_handler(context)
+
+    def cancel_pending_tasks(self):
+        """
+        Cancel every pending Task made by create_task(), and give them the
+        chance to clean up after themselves without moving the clock.
+
+        Returns how many Tasks were cancelled.
+        """
+        pending = [future for future in self._futures if isinstance(future, asyncio.Task) and not future.done()]
+        cancelled = len(pending)
+        for task in pending:
+            task.cancel()
+
+        # A batch at a time, until they've all finished or there's nothing
+        # left to run, so that a callback that keeps rescheduling itself
+        # can't keep this going forever.
+        while pending:
+            self._collect_due(self._wall)
+            if not self._ready:
+                break
+            self._run_batch()
+            pending = [task for task in pending if not task.done()]
+        return cancelled
+
+    def _call_soon(self, callback, args):
+        handle = ReadyHandle(callback, args, self)
+        if handle._source_traceback:
+            del handle._source_traceback[-1]
+        self._ready.append(handle)
+        if self._coordinator is not None:
+            self._coordinator._made_ready(self)
+        if self._instruments:
+            for instrument in self._instruments:
+                instrument.handle_scheduled(handle, self._wall)
+        return handle
 
     def call_soon_threadsafe(self, callback, *args):
         """
@@ -141,23 +770,173 @@ class TimeTravelingTestLoop(asyncio.base_events.BaseEventLoop):
         """
         return self.call_soon(callback, *args)
 
+    def run_in_executor(self, executor, func, *args):
+        """
+        Arrange for func(*args) to be called in the given executor, or the
+        default one if ``executor`` is None.  Unless set_default_executor()
+        says otherwise, that's an InlineExecutor.
+
+        The returned Future completes once the call's virtual cost has passed
+        on our clock: the cost given to it by virtual_cost(), or else the
+        executor's ``cost`` attribute, or else nothing at all.  A real executor
+        gets to run the call in the background in the meantime, but once its
+        time is up the loop blocks until it has finished, so results always
+        arrive in the same order.
+        """
+        self._check_closed()
+
+        if executor is None:
+            executor = self._default_executor
+
+        cost = getattr(func, 'virtual_cost', None)
+        if cost is None:
+            cost = getattr(executor, 'cost', 0.0)
+
+        future = self.create_future()
+        concurrent_future = executor.submit(func, *args)
+
+        if cost:
+            self.call_later(cost, self._finish_executor_call, future, concurrent_future)
+        else:
+            self.call_soon(self._finish_executor_call, future, concurrent_future)
+
+        return future
+
+    def _finish_executor_call(self, future, concurrent_future):
+        """
+        Copy the outcome of a call made by run_in_executor() over to the
+        Future we gave back for it, waiting for it to finish if need be.
+        """
+        if future.cancelled():
+            concurrent_future.cancel()
+            return
+
+        try:
+            exc = concurrent_future.exception()
+        except concurrent.futures.CancelledError:
+            future.cancel()
+            return
+
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(concurrent_future.result())
+
+    @asyncio.coroutine
+    def create_connection(self, protocol_factory, host=None, port=None, **kwargs):
+        """
+        Connect to a server made with create_server() on this loop's
+        virtual network.
+
+        NOTE: Socket options like ``ssl``, ``family`` or ``sock`` are accepted
+        so that real code can call this, but they have no effect.
+        """
+        return (yield from self.network.create_connection(protocol_factory, host, port))
+
+    @asyncio.coroutine
+    def create_server(self, protocol_factory, host=None, port=None, **kwargs):
+        """
+        Listen for connections on this loop's virtual network.
+
+        NOTE: Socket options like ``ssl``, ``family`` or ``backlog`` are
+        accepted so that real code can call this, but they have no effect.
+        """
+        return (yield from self.network.create_server(protocol_factory, host, port))
+
+    def _register_pipe(self, pipe):
+        """
+        Give a new VirtualPipe a pair of file descriptor numbers.
+        """
+        read_fd, write_fd = self._next_fd, self._next_fd + 1
+        self._next_fd += 2
+        self._pipes[read_fd] = self._pipes[write_fd] = pipe
+        return read_fd, write_fd
+
+    def _forget_pipe(self, pipe):
+        self._pipes.pop(pipe.read_fd, None)
+        self._pipes.pop(pipe.write_fd, None)
+
+    def _pipe_end(self, fd, end):
+        pipe = self._pipes.get(fd)
+        if pipe is None or getattr(pipe, end) != fd:
+            raise ValueError("{fd!r} is not the {end} of an open VirtualPipe".format(fd=fd, end=end.replace('_', ' ')))
+        return pipe
+
+    def add_reader(self, fd, callback, *args):
+        """
+        Call ``callback(*args)`` whenever the read end of a VirtualPipe has
+        something to read, or has reached EOF.
+
+        NOTE: Only VirtualPipes can be watched, not real file descriptors.
+        """
+        self._check_closed()
+        self._pipe_end(fd, 'read_fd')._watch_reader(asyncio.Handle(callback, args, self))
+
+    def remove_reader(self, fd):
+        pipe = self._pipes.get(fd)
+        return pipe is not None and pipe._unwatch_reader()
+
+    def add_writer(self, fd, callback, *args):
+        """
+        Call ``callback(*args)`` whenever the write end of a VirtualPipe can
+        be written to without piling up too much in flight.
+
+        NOTE: Only VirtualPipes can be watched, not real file descriptors.
+        """
+        self._check_closed()
+        self._pipe_end(fd, 'write_fd')._watch_writer(asyncio.Handle(callback, args, self))
+
+    def remove_writer(self, fd):
+        pipe = self._pipes.get(fd)
+        return pipe is not None and pipe._unwatch_writer()
+
+    @asyncio.coroutine
+    def connect_read_pipe(self, protocol_factory, pipe):
+        """
+        Connect a protocol to the read end of a VirtualPipe.
+        """
+        self._check_closed()
+        return connect_read_pipe(self, protocol_factory, pipe)
+
+    @asyncio.coroutine
+    def connect_write_pipe(self, protocol_factory, pipe):
+        """
+        Connect a protocol to the write end of a VirtualPipe.
+        """
+        self._check_closed()
+        return connect_write_pipe(self, protocol_factory, pipe)
+
+    @asyncio.coroutine
+    def subprocess_exec(self, protocol_factory, program, *args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE, **kwargs):
+        """
+        Run a fake program registered with ``loop.processes.register()``, as
+        if it were a child process.  See aiotest.pipes.
+
+        NOTE: Options like ``cwd`` or ``env`` are accepted so that real code
+        can call this, but they have no effect.
+        """
+        self._check_closed()
+        return self.processes.spawn(protocol_factory, (program,) + args, stdin, stdout, stderr)
+
+    @asyncio.coroutine
+    def subprocess_shell(self, protocol_factory, cmd, *, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE, **kwargs):
+        """
+        Like subprocess_exec(), with the program and its arguments split out
+        of a command line the way a shell would.
+        """
+        self._check_closed()
+        if isinstance(cmd, bytes):
+            cmd = cmd.decode()
+        return self.processes.spawn(protocol_factory, shlex.split(cmd), stdin, stdout, stderr)
 
     # Missing mandatory APIs from PEP 3156:
     # -----
     #
-    # run_forever()
-    # run_until_complete()
-    # stop()
-    # is_running()
-    # close()
-    #
-    # run_in_executor()
-    # set_default_executor()
     # getaddrinfo()
     # getnameinfo()
     #
-    # create_connection()
-    # create_server()
     # create_datagram_endpoint()
     #
     # sock_recv()
@@ -0,0 +1,361 @@
+import asyncio
+import errno
+from collections import deque
+
+#: Sent down a Link to say the sender won't be writing anything else.
+_EOF = object()
+#: Sent down a Link to say the sender went away without closing cleanly.
+_RESET = object()
+
+#: The first port handed out when a server or client doesn't ask for one.
+EPHEMERAL_PORT = 49152
+#: Hosts a server can listen on to accept connections for any host.
+ANY_HOST = (None, '', '0.0.0.0', '::')
+
+
+class Link:
+    """
+    One direction of a virtual connection.  Everything sent down a Link
+    arrives at the other end in order, ``latency`` virtual seconds after it
+    has finished going out at ``bandwidth`` bytes per virtual second.
+
+    Data is passed along as-is, never copied or re-chunked, so writing a
+    bytes object hands that very object to the receiver.
+    """
+    def __init__(self, loop, receiver, latency=0.0, bandwidth=None, drained=None):
+        self._loop = loop
+        #: Called with each piece of data once it arrives.
+        self._receiver = receiver
+        #: Called once some data has arrived, and so is no longer in flight.
+        self._drained = drained
+        self.latency = latency
+        #: Bytes per virtual second, or None for no limit.
+        self.bandwidth = bandwidth
+        #: (arrival time, data) for everything sent but not yet received.
+        self._in_flight = deque()
+        #: How many bytes have been sent but haven't arrived yet.
+        self.size = 0
+        #: When the sender finishes putting what it has sent so far on the wire.
+        self._free_at = 0.0
+        self._timer = None
+        self._paused = False
+
+    def send(self, data):
+        """
+        Put some data, or one of the _EOF or _RESET markers, on the wire.
+        """
+        departure = max(self._loop.time(), self._free_at)
+        if data is not _EOF and data is not _RESET:
+            if self.bandwidth:
+                departure += len(data) / self.bandwidth
+            self.size += len(data)
+        self._free_at = departure
+
+        self._in_flight.append((departure + self.latency, data))
+        if self._timer is None and not self._paused:
+            self._schedule()
+
+    def pause(self):
+        """
+        Hold on to anything that arrives rather than passing it on.
+        """
+        self._paused = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def resume(self):
+        """
+        Pass on everything that has arrived while we were paused, and carry on.
+        """
+        if self._paused:
+            self._paused = False
+            if self._in_flight:
+                self._schedule()
+
+    def close(self):
+        """
+        Drop everything still in flight.
+        """
+        self._in_flight.clear()
+        self.size = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule(self):
+        self._timer = self._loop.call_at(self._in_flight[0][0], self._deliver)
+
+    def _deliver(self):
+        self._timer = None
+        in_flight = self._in_flight
+        now = self._loop.time()
+        size = self.size
+
+        while in_flight and in_flight[0][0] <= now and not self._paused:
+            arrival, data = in_flight.popleft()
+            if data is not _EOF and data is not _RESET:
+                self.size -= len(data)
+            self._receiver(data)
+
+        if in_flight and self._timer is None and not self._paused:
+            self._schedule()
+
+        if self.size < size and self._drained is not None:
+            self._drained()
+
+
+class VirtualSocket:
+    """
+    Stands in for the listening socket of a VirtualServer, so that tests can
+    find out which port they were given.
+    """
+    def __init__(self, address):
+        self._address = address
+
+    def getsockname(self):
+        return self._address
+
+    def fileno(self):
+        return -1
+
+
+class VirtualTransport(asyncio.Transport):
+    """
+    One end of a virtual connection.
+    """
+    def __init__(self, loop, protocol, sockname, peername):
+        super().__init__(extra={'sockname': sockname, 'peername': peername, 'socket': None})
+        self._loop = loop
+        self._protocol = protocol
+        #: Carries our writes to the other end.  Set up by connect().
+        self._outgoing = None
+        #: Carries the other end's writes to us.
+        self._incoming = None
+        self._closing = False
+        self._eof_written = False
+        self._connection_lost = False
+        self._protocol_paused = False
+        self._high_water = 64 * 1024
+        self._low_water = 16 * 1024
+
+    def connect(self, peer, latency=0.0, bandwidth=None):
+        """
+        Join this transport to another with a pair of Links.
+        """
+        self._outgoing = Link(self._loop, peer._data_arrived, latency, bandwidth, self._maybe_resume_protocol)
+        peer._incoming = self._outgoing
+        peer._outgoing = Link(self._loop, self._data_arrived, latency, bandwidth, peer._maybe_resume_protocol)
+        self._incoming = peer._outgoing
+
+    def get_protocol(self):
+        return self._protocol
+
+    def set_protocol(self, protocol):
+        self._protocol = protocol
+
+    def is_closing(self):
+        return self._closing
+
+    def is_reading(self):
+        return not self._incoming._paused
+
+    def pause_reading(self):
+        self._incoming.pause()
+
+    def resume_reading(self):
+        self._incoming.resume()
+
+    def can_write_eof(self):
+        return True
+
+    def get_write_buffer_size(self):
+        return self._outgoing.size
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        if high is None:
+            high = 64 * 1024 if low is None else 4 * low
+        if low is None:
+            low = high // 4
+        if not high >= low >= 0:
+            raise ValueError("high ({high!r}) must be >= low ({low!r}) must be >= 0".format(high=high, low=low))
+
+        self._high_water = high
+        self._low_water = low
+        self._maybe_pause_protocol()
+
+    def get_write_buffer_limits(self):
+        return (self._low_water, self._high_water)
+
+    def write(self, data):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError("data argument must be a bytes-like object, not {!r}".format(type(data).__name__))
+        if self._closing:
+            return
+        if self._eof_written:
+            raise RuntimeError("Cannot call write() after write_eof()")
+        if not data:
+            return
+
+        # Our caller is free to reuse a mutable buffer as soon as we return,
+        # so only bytes can be sent without taking a copy.
+        if not isinstance(data, bytes):
+            data = bytes(data)
+
+        self._outgoing.send(data)
+        self._maybe_pause_protocol()
+
+    def write_eof(self):
+        if self._eof_written or self._closing:
+            return
+        self._eof_written = True
+        self._outgoing.send(_EOF)
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self._incoming.close()
+        if not self._eof_written:
+            self._eof_written = True
+            self._outgoing.send(_EOF)
+        self._loop.call_soon(self._lose_connection, None)
+
+    def abort(self):
+        if self._connection_lost:
+            return
+        self._closing = True
+        self._incoming.close()
+        self._outgoing.close()
+        self._outgoing.send(_RESET)
+        self._loop.call_soon(self._lose_connection, None)
+
+    def _data_arrived(self, data):
+        if self._closing:
+            return
+
+        if data is _EOF:
+            if not self._protocol.eof_received():
+                self.close()
+        elif data is _RESET:
+            self._closing = True
+            self._incoming.close()
+            self._lose_connection(ConnectionResetError("Connection reset by peer"))
+        else:
+            self._protocol.data_received(data)
+
+    def _maybe_pause_protocol(self):
+        if not self._protocol_paused and self._outgoing.size > self._high_water:
+            self._protocol_paused = True
+            self._protocol.pause_writing()
+
+    def _maybe_resume_protocol(self):
+        if self._protocol_paused and not self._connection_lost and self._outgoing.size <= self._low_water:
+            self._protocol_paused = False
+            self._protocol.resume_writing()
+
+    def _lose_connection(self, exc):
+        if not self._connection_lost:
+            self._connection_lost = True
+            self._protocol.connection_lost(exc)
+
+
+class VirtualServer(asyncio.AbstractServer):
+    """
+    Accepts connections made over a VirtualNetwork.
+    """
+    def __init__(self, network, protocol_factory, host, port):
+        self._network = network
+        self._protocol_factory = protocol_factory
+        self.host = host
+        self.port = port
+        self.sockets = [VirtualSocket((host or '0.0.0.0', port))]
+
+    def close(self):
+        """
+        Stop accepting connections.  Those already made are left open.
+        """
+        if self.sockets is not None:
+            self.sockets = None
+            if self._network._servers.get(self.port) is self:
+                del self._network._servers[self.port]
+
+    @asyncio.coroutine
+    def wait_closed(self):
+        pass
+
+    def _accept(self, client):
+        """
+        Make the server end of a connection to the given client transport.
+        """
+        protocol = self._protocol_factory()
+        transport = VirtualTransport(
+            self._network._loop, protocol, client.get_extra_info('peername'), client.get_extra_info('sockname'))
+        client.connect(transport, self._network.latency, self._network.bandwidth)
+        protocol.connection_made(transport)
+        return transport
+
+
+class VirtualNetwork:
+    """
+    An in-memory network joining up the servers and clients of one event
+    loop.  Nothing touches a real socket, and everything sent over it takes
+    ``latency`` virtual seconds (plus its size over ``bandwidth``, in bytes
+    per virtual second) to get where it's going.
+    """
+    def __init__(self, loop, latency=0.0, bandwidth=None):
+        self._loop = loop
+        self.latency = latency
+        self.bandwidth = bandwidth
+        #: Listening VirtualServers, keyed on port.
+        self._servers = {}
+        self._next_port = EPHEMERAL_PORT
+
+    def reset(self):
+        """
+        Forget every server listening on the network.
+        """
+        self._servers.clear()
+        self._next_port = EPHEMERAL_PORT
+
+    def _allocate_port(self):
+        while self._next_port in self._servers:
+            self._next_port += 1
+        port = self._next_port
+        self._next_port += 1
+        return port
+
+    @asyncio.coroutine
+    def create_server(self, protocol_factory, host=None, port=None):
+        """
+        Start listening for connections on the given port, or on a free one
+        if no port is given.
+        """
+        if not port:
+            port = self._allocate_port()
+        elif port in self._servers:
+            raise OSError(errno.EADDRINUSE, "[Errno {errno}] address already in use: {address!r}".format(
+                errno=errno.EADDRINUSE, address=(host, port)))
+
+        server = self._servers[port] = VirtualServer(self, protocol_factory, host, port)
+        return server
+
+    @asyncio.coroutine
+    def create_connection(self, protocol_factory, host=None, port=None):
+        """
+        Connect to a server listening on the network.  Like a TCP handshake,
+        this takes a round trip before either end sees the connection.
+        """
+        if self.latency:
+            yield from asyncio.sleep(2 * self.latency, loop=self._loop)
+
+        server = self._servers.get(port)
+        if server is None or (server.host not in ANY_HOST and server.host != host):
+            raise ConnectionRefusedError(errno.ECONNREFUSED, "[Errno {errno}] Connect call failed {address!r}".format(
+                errno=errno.ECONNREFUSED, address=(host, port)))
+
+        protocol = protocol_factory()
+        transport = VirtualTransport(self._loop, protocol, ('127.0.0.1', self._allocate_port()), (host, port))
+        server._accept(transport)
+        protocol.connection_made(transport)
+        return transport, protocol
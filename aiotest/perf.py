@@ -0,0 +1,106 @@
+from collections import namedtuple
+
+#: The first line of every performance report.
+HEADER = "# aiotest perf 1: test id, real seconds, virtual seconds, callbacks, peak scheduled\n"
+
+#: What running one test cost: the real seconds it took, and the virtual
+#: seconds, callbacks and most scheduled Handles it took of its loop.
+PerfRecord = namedtuple('PerfRecord', ['test_id', 'real_time', 'virtual_time', 'callbacks', 'peak_scheduled'])
+
+#: A test that costs more than it did in the baseline: its record from each,
+#: and why it counts as a regression.
+Regression = namedtuple('Regression', ['test_id', 'baseline', 'current', 'reason'])
+
+
+def record_outcome(outcome):
+    """
+    The PerfRecord of a test that ran, from its TestOutcome, or None if it
+    didn't run (it was skipped or cached, or it's a fixture that failed).
+    Tests that aren't aiotest TestCases have no virtual time to speak of.
+    """
+    if outcome.status in ('skip', 'cached') or not outcome.duration:
+        return None
+
+    usage = outcome.usage
+    if usage is None:
+        return PerfRecord(outcome.test_id, outcome.duration, 0.0, 0, 0)
+    return PerfRecord(outcome.test_id, outcome.duration, usage.virtual_time, usage.callbacks, usage.peak_scheduled)
+
+
+class PerfWriter:
+    """
+    Streams PerfRecords into a text file, one tab separated line each, as
+    tests finish.
+    """
+    def __init__(self, file):
+        self._file = file
+        file.write(HEADER)
+
+    def write(self, record):
+        self._file.write("{test_id}\t{real_time:.6f}\t{virtual_time:.6f}\t{callbacks}\t{peak_scheduled}\n".format(
+            **record._asdict()))
+
+    def close(self):
+        self._file.close()
+
+
+def read_report(path):
+    """
+    Load a performance report written by a PerfWriter, as a dict of test ids
+    to PerfRecords.
+    """
+    records = {}
+    with open(path, 'r') as file:
+        if file.readline() != HEADER:
+            raise ValueError("{path} is not an aiotest performance report".format(path=path))
+
+        for number, line in enumerate(file, 2):
+            try:
+                test_id, real_time, virtual_time, callbacks, peak_scheduled = line.rstrip('\n').split('\t')
+                records[test_id] = PerfRecord(
+                    test_id, float(real_time), float(virtual_time), int(callbacks), int(peak_scheduled))
+            except ValueError:
+                raise ValueError("{path}, line {number}: not a performance record".format(
+                    path=path, number=number)) from None
+    return records
+
+
+def compare(current, baseline, threshold=0.5, min_time=0.01):
+    """
+    Find the tests in ``current`` that cost more than they did in
+    ``baseline`` (both dicts of test ids to PerfRecords): those that took
+    more than ``threshold`` (as a fraction) more real time, as long as that
+    is at least ``min_time`` seconds more, so that noise in very quick tests
+    isn't flagged, or that ran more than ``threshold`` more callbacks.
+
+    Callbacks are counted on virtual time, so they don't vary from run to
+    run: any rise in them is down to a change in the code.
+
+    Returns a Regression for each, worst first.
+    """
+    regressions = []
+    for test_id, record in current.items():
+        before = baseline.get(test_id)
+        if before is None:
+            continue
+
+        slower = record.real_time - before.real_time
+        if slower >= min_time and record.real_time > before.real_time * (1 + threshold):
+            reason = "real time went from {before:.3f}s to {after:.3f}s".format(
+                before=before.real_time, after=record.real_time)
+        elif record.callbacks > before.callbacks * (1 + threshold):
+            reason = "callbacks went from {before} to {after}".format(before=before.callbacks, after=record.callbacks)
+        else:
+            continue
+        regressions.append(Regression(test_id, before, record, reason))
+
+    return sorted(regressions, key=lambda regression: regression.current.real_time - regression.baseline.real_time,
+                  reverse=True)
+
+
+def format_regressions(regressions):
+    lines = ["{count} test{s} regressed against the baseline:".format(
+        count=len(regressions), s='' if len(regressions) == 1 else 's')]
+    for regression in regressions:
+        lines.append("  {test_id}: {reason}".format(test_id=regression.test_id, reason=regression.reason))
+    return "\n".join(lines)
@@ -0,0 +1,667 @@
+import asyncio
+import errno
+import os
+import signal
+import subprocess
+import traceback
+
+from aiotest.network import _EOF, Link
+
+#: How subprocess_exec() is asked to connect a child's stdin, stdout and stderr.
+PIPE = subprocess.PIPE
+STDOUT = subprocess.STDOUT
+DEVNULL = subprocess.DEVNULL
+
+#: Virtual pipes are given file descriptor numbers from here up, well clear
+#: of any real ones.
+FIRST_FD = 1 << 20
+#: The first process id handed out to a fake program.
+FIRST_PID = 1000
+
+
+class VirtualPipe:
+    """
+    An in-memory, one-way pipe.  Everything written to it arrives at the
+    read end ``latency`` virtual seconds later (plus its size over
+    ``bandwidth`` bytes per virtual second), in order.
+
+    A pipe has a pair of file descriptor numbers, ``read_fd`` and
+    ``write_fd``, for the loop's add_reader() and add_writer() to watch.
+    They have nothing to do with any real file descriptor.
+    """
+    def __init__(self, loop, latency=0.0, bandwidth=None):
+        self._loop = loop
+        self._link = Link(loop, self._arrived, latency, bandwidth, self._drained)
+        #: What has arrived, but nobody has read yet.
+        self._buffer = bytearray()
+        #: (data callback, EOF callback) that are handed whatever arrives,
+        #: as it arrives, instead of it being buffered.
+        self._consumer = None
+        self._eof = False
+        self._read_closed = False
+        self._write_closed = False
+        #: Handles watching each end, from add_reader() and add_writer().
+        self._reader = None
+        self._writer = None
+        self._reader_scheduled = False
+        self._writer_scheduled = False
+        #: Called once the read end is closed, with how many bytes in flight
+        #: were dropped.
+        self._on_read_closed = None
+        #: Called once some data has arrived, and so is no longer in flight.
+        self._on_drained = None
+        #: The write end stops being writable, for add_writer(), once this
+        #: many bytes are in flight.
+        self.high_water = 64 * 1024
+        self.read_fd, self.write_fd = loop._register_pipe(self)
+
+    def __repr__(self):
+        return "<VirtualPipe read_fd={read_fd} write_fd={write_fd}>".format(
+            read_fd=self.read_fd, write_fd=self.write_fd)
+
+    @property
+    def in_flight(self):
+        """
+        How many bytes have been written but haven't arrived yet.
+        """
+        return self._link.size
+
+    def write(self, data):
+        """
+        Send some bytes down the pipe.  Pipes never fill up, so this never
+        blocks.  Returns how many bytes were written.
+
+        Raises BrokenPipeError if the read end has been closed.
+        """
+        if self._write_closed:
+            raise OSError(errno.EBADF, "write end of the pipe is closed")
+        if self._read_closed:
+            raise BrokenPipeError(errno.EPIPE, "Broken pipe")
+
+        # Our caller is free to reuse a mutable buffer as soon as we return,
+        # so only bytes can be sent without taking a copy.
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        if data:
+            self._link.send(data)
+        return len(data)
+
+    def read(self, size=-1):
+        """
+        Read up to ``size`` bytes (all of them, by default) of what has
+        arrived.  Returns b'' once the write end has been closed and
+        everything it sent has been read.
+
+        Raises BlockingIOError if nothing has arrived yet.
+        """
+        buffer = self._buffer
+        if buffer:
+            if size < 0 or size >= len(buffer):
+                data = bytes(buffer)
+                buffer.clear()
+            else:
+                with memoryview(buffer) as view:
+                    data = view[:size].tobytes()
+                del buffer[:size]
+            return data
+
+        if self._eof:
+            return b''
+        raise BlockingIOError(errno.EAGAIN, "Resource temporarily unavailable")
+
+    def close_write(self):
+        """
+        Close the write end.  The read end sees EOF once everything already
+        written has arrived.
+        """
+        if not self._write_closed:
+            self._write_closed = True
+            self._writer = None
+            if not self._read_closed:
+                self._link.send(_EOF)
+            self._maybe_forget()
+
+    def close_read(self):
+        """
+        Close the read end, dropping anything still in flight or unread.
+        Writing to the pipe from now on raises BrokenPipeError.
+        """
+        if not self._read_closed:
+            self._read_closed = True
+            self._reader = None
+            self._consumer = None
+            self._buffer.clear()
+            dropped = self._link.size
+            self._link.close()
+            if self._on_read_closed is not None:
+                self._loop.call_soon(self._on_read_closed, dropped)
+            self._maybe_forget()
+
+    def close(self):
+        self.close_write()
+        self.close_read()
+
+    def _maybe_forget(self):
+        if self._read_closed and self._write_closed:
+            self._loop._forget_pipe(self)
+
+    def _consume(self, on_data, on_eof):
+        """
+        Hand everything that arrives from now on straight to ``on_data``
+        (and call ``on_eof`` at the end), rather than buffering it.
+        Anything already buffered follows shortly.
+        """
+        self._consumer = (on_data, on_eof)
+        if self._buffer or self._eof:
+            self._loop.call_soon(self._flush_to_consumer)
+
+    def _flush_to_consumer(self):
+        if self._consumer is None:
+            return
+        on_data, on_eof = self._consumer
+        if self._buffer:
+            on_data(self.read())
+        if self._eof and self._consumer is not None:
+            on_eof()
+
+    def _arrived(self, data):
+        # With anything still buffered, a flush to the consumer is on its
+        # way, and this has to wait its turn behind it.
+        if self._consumer is not None and not self._buffer:
+            on_data, on_eof = self._consumer
+            if data is _EOF:
+                self._eof = True
+                on_eof()
+            else:
+                on_data(data)
+            return
+
+        if data is _EOF:
+            self._eof = True
+        else:
+            self._buffer.extend(data)
+        self._schedule_reader()
+
+    def _drained(self):
+        if self._on_drained is not None:
+            self._on_drained()
+        self._schedule_writer()
+
+    # Watching the ends, for add_reader() and add_writer().  Like a real
+    # selector, a watcher is called again and again for as long as its end
+    # stays ready.
+
+    def _readable(self):
+        return bool(self._buffer) or self._eof
+
+    def _writable(self):
+        return self._link.size < self.high_water or self._read_closed
+
+    def _watch_reader(self, handle):
+        self._reader = handle
+        self._schedule_reader()
+
+    def _unwatch_reader(self):
+        watched = self._reader is not None
+        self._reader = None
+        return watched
+
+    def _schedule_reader(self):
+        if self._reader is not None and not self._reader_scheduled and self._readable():
+            self._reader_scheduled = True
+            self._loop.call_soon(self._run_reader)
+
+    def _run_reader(self):
+        self._reader_scheduled = False
+        if self._reader is not None and self._readable():
+            self._reader._run()
+            self._schedule_reader()
+
+    def _watch_writer(self, handle):
+        self._writer = handle
+        self._schedule_writer()
+
+    def _unwatch_writer(self):
+        watched = self._writer is not None
+        self._writer = None
+        return watched
+
+    def _schedule_writer(self):
+        if self._writer is not None and not self._writer_scheduled and self._writable():
+            self._writer_scheduled = True
+            self._loop.call_soon(self._run_writer)
+
+    def _run_writer(self):
+        self._writer_scheduled = False
+        if self._writer is not None and self._writable():
+            self._writer._run()
+            self._schedule_writer()
+
+
+class PipeReadTransport(asyncio.ReadTransport):
+    """
+    The read end of a VirtualPipe, as connect_read_pipe() gives it to a
+    protocol.  Data is handed over exactly as it was written, never copied.
+    """
+    def __init__(self, loop, pipe, protocol):
+        super().__init__(extra={'pipe': pipe})
+        self._loop = loop
+        self._pipe = pipe
+        self._protocol = protocol
+        self._closing = False
+        pipe._consume(self._data_arrived, self._eof_arrived)
+
+    def get_protocol(self):
+        return self._protocol
+
+    def set_protocol(self, protocol):
+        self._protocol = protocol
+
+    def is_closing(self):
+        return self._closing
+
+    def is_reading(self):
+        return not self._pipe._link._paused
+
+    def pause_reading(self):
+        self._pipe._link.pause()
+
+    def resume_reading(self):
+        self._pipe._link.resume()
+
+    def close(self):
+        if not self._closing:
+            self._closing = True
+            self._pipe.close_read()
+            self._loop.call_soon(self._protocol.connection_lost, None)
+
+    def _data_arrived(self, data):
+        if not self._closing:
+            self._protocol.data_received(data)
+
+    def _eof_arrived(self):
+        if not self._closing:
+            self._protocol.eof_received()
+            self.close()
+
+
+class PipeWriteTransport(asyncio.WriteTransport):
+    """
+    The write end of a VirtualPipe, as connect_write_pipe() gives it to a
+    protocol.
+    """
+    def __init__(self, loop, pipe, protocol):
+        super().__init__(extra={'pipe': pipe})
+        self._loop = loop
+        self._pipe = pipe
+        self._protocol = protocol
+        self._closing = False
+        self._connection_lost = False
+        self._protocol_paused = False
+        self._high_water = 64 * 1024
+        self._low_water = 16 * 1024
+        pipe._on_drained = self._maybe_resume_protocol
+        pipe._on_read_closed = self._read_end_closed
+
+    def get_protocol(self):
+        return self._protocol
+
+    def set_protocol(self, protocol):
+        self._protocol = protocol
+
+    def is_closing(self):
+        return self._closing
+
+    def can_write_eof(self):
+        return True
+
+    def get_write_buffer_size(self):
+        return self._pipe.in_flight
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        if high is None:
+            high = 64 * 1024 if low is None else 4 * low
+        if low is None:
+            low = high // 4
+        if not high >= low >= 0:
+            raise ValueError("high ({high!r}) must be >= low ({low!r}) must be >= 0".format(high=high, low=low))
+
+        self._high_water = high
+        self._low_water = low
+        self._maybe_pause_protocol()
+
+    def get_write_buffer_limits(self):
+        return (self._low_water, self._high_water)
+
+    def write(self, data):
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError("data argument must be a bytes-like object, not {!r}".format(type(data).__name__))
+        if self._closing or not data:
+            return
+
+        try:
+            self._pipe.write(data)
+        except BrokenPipeError as exc:
+            self._closing = True
+            self._lose_connection(exc)
+            return
+        self._maybe_pause_protocol()
+
+    def write_eof(self):
+        # Closing is the only way to send EOF down a pipe.
+        self.close()
+
+    def close(self):
+        if not self._closing:
+            self._closing = True
+            self._pipe.close_write()
+            self._loop.call_soon(self._lose_connection, None)
+
+    def abort(self):
+        if not self._connection_lost:
+            self._closing = True
+            self._pipe._link.close()
+            self._pipe.close_write()
+            self._loop.call_soon(self._lose_connection, None)
+
+    def _read_end_closed(self, dropped):
+        # As on a real pipe, that's only an error if we still had something to say.
+        if not self._closing:
+            self._closing = True
+            self._pipe.close_write()
+            self._lose_connection(BrokenPipeError(errno.EPIPE, "Broken pipe") if dropped else None)
+
+    def _maybe_pause_protocol(self):
+        if not self._protocol_paused and self._pipe.in_flight > self._high_water:
+            self._protocol_paused = True
+            self._protocol.pause_writing()
+
+    def _maybe_resume_protocol(self):
+        if self._protocol_paused and not self._connection_lost and self._pipe.in_flight <= self._low_water:
+            self._protocol_paused = False
+            self._protocol.resume_writing()
+
+    def _lose_connection(self, exc):
+        if not self._connection_lost:
+            self._connection_lost = True
+            self._protocol.connection_lost(exc)
+
+
+def connect_read_pipe(loop, protocol_factory, pipe):
+    """
+    Connect a protocol to the read end of a VirtualPipe.
+    """
+    protocol = protocol_factory()
+    transport = PipeReadTransport(loop, pipe, protocol)
+    protocol.connection_made(transport)
+    return transport, protocol
+
+
+def connect_write_pipe(loop, protocol_factory, pipe):
+    """
+    Connect a protocol to the write end of a VirtualPipe.
+    """
+    protocol = protocol_factory()
+    transport = PipeWriteTransport(loop, pipe, protocol)
+    protocol.connection_made(transport)
+    return transport, protocol
+
+
+class ProgramOutput:
+    """
+    A fake program's stdout or stderr.  Writes go down the pipe to whoever
+    started the program, or nowhere if they didn't ask for it.
+    """
+    def __init__(self, pipe=None):
+        self._pipe = pipe
+
+    def write(self, data):
+        if self._pipe is not None and not self._pipe._write_closed:
+            try:
+                self._pipe.write(data)
+            except BrokenPipeError:
+                pass
+
+    def close(self):
+        if self._pipe is not None:
+            self._pipe.close_write()
+
+
+class VirtualProcess:
+    """
+    What a fake program gets to work with: its ``args`` (the program's own
+    name first), its ``pid``, its ``stdin`` (an asyncio.StreamReader), and
+    its ``stdout`` and ``stderr`` (ProgramOutputs).
+    """
+    def __init__(self, args, pid, stdin, stdout, stderr):
+        self.args = args
+        self.pid = pid
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class _SubprocessPipeProtocol(asyncio.Protocol):
+    """
+    Passes what happens on one of a subprocess's pipes on to the
+    subprocess's protocol, the way SubprocessProtocol expects.
+    """
+    def __init__(self, process, fd):
+        self._process = process
+        self._fd = fd
+
+    def data_received(self, data):
+        self._process._protocol.pipe_data_received(self._fd, data)
+
+    def eof_received(self):
+        pass
+
+    def pause_writing(self):
+        self._process._protocol.pause_writing()
+
+    def resume_writing(self):
+        self._process._protocol.resume_writing()
+
+    def connection_lost(self, exc):
+        self._process._pipe_connection_lost(self._fd, exc)
+
+
+class VirtualSubprocessTransport(asyncio.SubprocessTransport):
+    """
+    A fake program running as if it were a child process.
+
+    The program is a coroutine function, called with a VirtualProcess once
+    it has started up.  Whatever it returns is the exit status (None means
+    0); if it raises, its traceback goes to stderr and it exits with 1.
+    Signals cancel it, so a program can catch CancelledError to clean up.
+    """
+    def __init__(self, loop, protocol, program, args, pid, stdin, stdout, stderr, startup=0.0,
+                 latency=0.0, bandwidth=None):
+        super().__init__(extra={'subprocess': None})
+        self._loop = loop
+        self._protocol = protocol
+        self._program = program
+        self._pid = pid
+        self._returncode = None
+        self._exit_waiters = []
+        self._task = None
+        self._signal = None
+        self._closed = False
+        self._finished = False
+        #: fd -> our end of each pipe to the program.
+        self._pipes = {}
+        self._lost_pipes = set()
+
+        program_stdin = asyncio.StreamReader(loop=loop)
+        if stdin == PIPE:
+            pipe = VirtualPipe(loop, latency, bandwidth)
+            pipe._consume(program_stdin.feed_data, program_stdin.feed_eof)
+            self._pipes[0] = PipeWriteTransport(loop, pipe, _SubprocessPipeProtocol(self, 0))
+        else:
+            program_stdin.feed_eof()
+
+        stdout_pipe = stderr_pipe = None
+        if stdout == PIPE:
+            stdout_pipe = VirtualPipe(loop, latency, bandwidth)
+            self._pipes[1] = PipeReadTransport(loop, stdout_pipe, _SubprocessPipeProtocol(self, 1))
+        if stderr == PIPE:
+            stderr_pipe = VirtualPipe(loop, latency, bandwidth)
+            self._pipes[2] = PipeReadTransport(loop, stderr_pipe, _SubprocessPipeProtocol(self, 2))
+        elif stderr == STDOUT:
+            stderr_pipe = stdout_pipe
+
+        #: The program's side of things.
+        self.process = VirtualProcess(args, pid, program_stdin, ProgramOutput(stdout_pipe), ProgramOutput(stderr_pipe))
+
+        protocol.connection_made(self)
+        self._launch = loop.call_later(startup, self._start)
+
+    def get_pid(self):
+        return self._pid
+
+    def get_returncode(self):
+        return self._returncode
+
+    def get_pipe_transport(self, fd):
+        return self._pipes.get(fd)
+
+    def is_closing(self):
+        return self._closed
+
+    def send_signal(self, sig):
+        if self._closed:
+            raise ProcessLookupError()
+        if self._returncode is not None:
+            return
+
+        self._signal = sig
+        if self._task is None:
+            # It never even got going.
+            self._launch.cancel()
+            self._exited(-sig)
+        else:
+            self._task.cancel()
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    def close(self):
+        if self._closed:
+            return
+        if self._returncode is None:
+            self.kill()
+        self._closed = True
+        for transport in self._pipes.values():
+            transport.close()
+
+    @asyncio.coroutine
+    def _wait(self):
+        """
+        Wait for the program to exit, and return its exit status.
+        """
+        if self._returncode is not None:
+            return self._returncode
+
+        waiter = self._loop.create_future()
+        self._exit_waiters.append(waiter)
+        return (yield from waiter)
+
+    def _start(self):
+        self._task = self._loop.create_task(self._program(self.process))
+        self._task.add_done_callback(self._program_finished)
+
+    def _program_finished(self, task):
+        if task.cancelled():
+            returncode = -(self._signal or signal.SIGKILL)
+        elif task.exception() is not None:
+            exc = task.exception()
+            self.process.stderr.write(''.join(traceback.format_exception(type(exc), exc, exc.__traceback__)).encode())
+            returncode = 1
+        else:
+            returncode = task.result()
+            if returncode is None:
+                returncode = 0
+        self._exited(returncode)
+
+    def _exited(self, returncode):
+        # Like a real process, exiting closes everything it had open.
+        self.process.stdout.close()
+        self.process.stderr.close()
+        if 0 in self._pipes:
+            self._pipes[0]._pipe.close_read()
+
+        self._returncode = returncode
+        self._protocol.process_exited()
+        self._try_finish()
+
+        for waiter in self._exit_waiters:
+            if not waiter.cancelled():
+                waiter.set_result(returncode)
+        self._exit_waiters = None
+
+    def _pipe_connection_lost(self, fd, exc):
+        self._protocol.pipe_connection_lost(fd, exc)
+        self._lost_pipes.add(fd)
+        self._try_finish()
+
+    def _try_finish(self):
+        if not self._finished and self._returncode is not None and self._lost_pipes.issuperset(self._pipes):
+            self._finished = True
+            self._loop.call_soon(self._protocol.connection_lost, None)
+
+
+class ProcessTable:
+    """
+    The fake programs a loop can run with subprocess_exec(), and the pipes
+    it connects to them, which take ``latency`` virtual seconds (plus size
+    over ``bandwidth``) to carry anything.
+    """
+    def __init__(self, loop, latency=0.0, bandwidth=None):
+        self._loop = loop
+        self.latency = latency
+        self.bandwidth = bandwidth
+        #: name -> (coroutine function, startup time)
+        self._programs = {}
+        self._next_pid = FIRST_PID
+
+    def register(self, name, program, startup=0.0):
+        """
+        Make ``program``, a coroutine function taking a VirtualProcess, run
+        whenever ``name`` is, ``startup`` virtual seconds after it's asked for.
+        """
+        self._programs[name] = (program, startup)
+
+    def unregister(self, name):
+        del self._programs[name]
+
+    def reset(self):
+        """
+        Forget every registered program.
+        """
+        self._programs.clear()
+        self._next_pid = FIRST_PID
+
+    def spawn(self, protocol_factory, args, stdin=PIPE, stdout=PIPE, stderr=PIPE):
+        """
+        Start the fake program named by ``args[0]`` (or its base name).
+
+        Returns a (VirtualSubprocessTransport, protocol) pair.
+
+        Raises FileNotFoundError if no such program has been registered.
+        """
+        args = [os.fsdecode(arg) if isinstance(arg, bytes) else str(arg) for arg in args]
+        entry = self._programs.get(args[0]) or self._programs.get(os.path.basename(args[0]))
+        if entry is None:
+            raise FileNotFoundError(errno.ENOENT, "No such file or directory", args[0])
+
+        program, startup = entry
+        pid = self._next_pid
+        self._next_pid += 1
+
+        protocol = protocol_factory()
+        transport = VirtualSubprocessTransport(
+            self._loop, protocol, program, args, pid, stdin, stdout, stderr, startup, self.latency, self.bandwidth)
+        return transport, protocol
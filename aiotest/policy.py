@@ -0,0 +1,23 @@
+import asyncio
+
+from aiotest.loop import TimeTravelingTestLoop
+
+
+class TimeTravelingEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    """
+    An event loop policy whose event loops all travel through time, so that
+    code calling asyncio.get_event_loop() or asyncio.new_event_loop() for
+    itself ends up on virtual time too, without having to be passed a loop.
+
+    TestCase installs one for the duration of every test.  To do the same
+    for a whole program::
+
+        asyncio.set_event_loop_policy(TimeTravelingEventLoopPolicy())
+    """
+    def __init__(self, loop_factory=TimeTravelingTestLoop):
+        super().__init__()
+        #: Makes the policy's event loops.
+        self.loop_factory = loop_factory
+
+    def new_event_loop(self):
+        return self.loop_factory()
@@ -0,0 +1,378 @@
+import asyncio
+import functools
+import time
+import weakref
+from collections import namedtuple
+
+#: What a CallbackProfiler found out about one callback.
+CallbackStats = namedtuple('CallbackStats', ['name', 'calls', 'cpu_time', 'total_delay', 'max_delay'])
+
+#: A stretch of virtual time, from ``start`` to ``end``, that a Task spent
+#: waiting on ``label``: a timer, a callback, or another Task, whose own
+#: critical path follows at ``depth`` + 1.
+PathSegment = namedtuple('PathSegment', ['depth', 'start', 'end', 'label'])
+
+#: Timer callbacks that are better known by what they're for.
+_TIMER_KINDS = {
+    'asyncio.futures._set_result_unless_cancelled': 'sleep',
+    'aiotest.clock._wake': 'sleep',
+    'asyncio.tasks._release_waiter': 'timeout',
+    'aiotest.clock.wait_for.<locals>.expire': 'timeout',
+    'aiotest.clock.Timeout._expire': 'timeout',
+}
+
+
+def describe_callback(callback):
+    """
+    A stable, readable name for a callback.  Steps of a Task are named after
+    the coroutine the Task is running.
+    """
+    while isinstance(callback, functools.partial):
+        callback = callback.func
+
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, asyncio.Task):
+        return describe_task(owner)
+
+    name = getattr(callback, '__qualname__', None)
+    if name is None:
+        return type(callback).__qualname__
+
+    module = getattr(callback, '__module__', None)
+    if module:
+        return "{module}.{name}".format(module=module, name=name)
+    return name
+
+
+def describe_task(task):
+    """
+    A stable, readable name for a Task: that of the coroutine it's running.
+    """
+    coro = task._coro
+    return "task {name}".format(name=getattr(coro, '__qualname__', None) or type(coro).__qualname__)
+
+
+class TaskTracker:
+    """
+    Works out which Task a Handle is going to step.
+
+    A Task's first step is scheduled with the Task itself attached, but
+    wake-ups after it has awaited a Future are scheduled by the Future, and
+    the C implementation of Task doesn't say which Task they're for.  So we
+    remember which Future each Task was waiting on when it last ran.
+    """
+    def __init__(self):
+        #: id() of a Future -> the Task waiting on it.
+        self._waiters = {}
+
+    def task_for(self, handle):
+        """
+        The Task the Handle is about to step, or None if it isn't stepping one.
+        """
+        owner = getattr(handle._callback, '__self__', None)
+        if isinstance(owner, asyncio.Task):
+            return owner
+
+        args = handle._args
+        if args and len(args) == 1:
+            return self._waiters.pop(id(args[0]), None)
+        return None
+
+    def stepped(self, task):
+        """
+        Called after a Task has run a step, to remember what it is waiting on now.
+        """
+        waiting_on = task._fut_waiter
+        if waiting_on is not None:
+            self._waiters[id(waiting_on)] = task
+
+    def clear(self):
+        self._waiters.clear()
+
+
+class CallbackProfiler:
+    """
+    A loop instrument that tallies up, for every callback (and coroutine, by
+    way of its Task's steps):
+
+    * how many times it was called,
+    * how much real CPU time it spent running, and
+    * how long it waited, in virtual time, between being scheduled and run.
+
+    Add one to a loop with TimeTravelingTestLoop.add_instrument().
+    """
+    def __init__(self, clock=time.process_time):
+        self._clock = clock
+        self._tasks = TaskTracker()
+        #: name -> [calls, cpu time, total delay, max delay]
+        self._stats = {}
+        #: Every scheduled Handle -> the virtual time it was scheduled, until
+        #: it runs or is cancelled.
+        self._scheduled_at = {}
+        #: (name, task, started) for the Handle that is running.
+        self._running = None
+
+    def clear(self):
+        """
+        Forget everything seen so far.
+        """
+        self._stats.clear()
+        self._scheduled_at.clear()
+        self._tasks.clear()
+
+    def handle_scheduled(self, handle, now):
+        self._scheduled_at[handle] = now
+
+    def handle_cancelled(self, handle, now):
+        self._scheduled_at.pop(handle, None)
+
+    def handle_started(self, handle, now):
+        task = self._tasks.task_for(handle)
+        name = describe_task(task) if task is not None else describe_callback(handle._callback)
+
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = [0, 0.0, 0.0, 0.0]
+
+        scheduled_at = self._scheduled_at.pop(handle, None)
+        if scheduled_at is not None:
+            delay = now - scheduled_at
+            stats[2] += delay
+            if delay > stats[3]:
+                stats[3] = delay
+
+        self._running = (stats, task, self._clock())
+
+    def handle_finished(self, handle, now):
+        stats, task, started = self._running
+        stats[0] += 1
+        stats[1] += self._clock() - started
+        self._running = None
+
+        if task is not None:
+            self._tasks.stepped(task)
+
+    def stats(self, sort='cpu_time'):
+        """
+        A CallbackStats for every callback seen, most expensive first.
+        ``sort`` can be any of the CallbackStats fields.
+        """
+        stats = [CallbackStats(name, *numbers) for name, numbers in self._stats.items()]
+        return sorted(stats, key=lambda stat: getattr(stat, sort), reverse=sort != 'name')
+
+    def report(self, top=10, sort='cpu_time'):
+        """
+        A table of the ``top`` most expensive callbacks.
+        """
+        lines = ["{calls:>8}  {cpu:>10}  {delay:>12}  {max_delay:>10}  {name}".format(
+            calls='calls', cpu='cpu (s)', delay='delay (s)', max_delay='max (s)', name='callback')]
+        for stat in self.stats(sort)[:top]:
+            lines.append("{calls:>8}  {cpu:>10.6f}  {delay:>12.3f}  {max_delay:>10.3f}  {name}".format(
+                calls=stat.calls, cpu=stat.cpu_time, delay=stat.total_delay, max_delay=stat.max_delay, name=stat.name))
+        return "\n".join(lines)
+
+
+def describe_timer(handle, delay):
+    """
+    A readable name for a timer that was set ``delay`` virtual seconds
+    before it went off, like ``sleep 2s`` or ``timeout 0.5s``.
+    """
+    name = describe_callback(handle._callback)
+    kind = _TIMER_KINDS.get(name)
+    if kind is not None:
+        return "{kind} {delay:g}s".format(kind=kind, delay=delay)
+    return "timer {name} ({delay:g}s)".format(name=name, delay=delay)
+
+
+class _TaskHistory:
+    """
+    What a CriticalPathProfiler remembers of a Task: its name, and what it
+    waited on when, but not the Task itself, so that it can be garbage
+    collected once it's finished.
+    """
+    __slots__ = ('name', 'created', 'finished', 'since', 'waits')
+
+    def __init__(self, name, created):
+        self.name = name
+        self.created = created
+        #: When it finished, or None if it hasn't.
+        self.finished = None
+        #: When it last finished a step, and so started waiting.
+        self.since = created
+        #: [(since, until, what woke it)] for each time it was woken.  What
+        #: woke it is another _TaskHistory, a description, or None.
+        self.waits = []
+
+
+class CriticalPathProfiler:
+    """
+    A loop instrument that records what each Task spent its virtual time
+    waiting for, so that it can say why a coroutine took as long as it did.
+
+    Every time a Task is woken up, the profiler notes what woke it: a timer
+    (a sleep or a timeout, say), a plain callback, or another Task, which is
+    followed through any callbacks in between (like those of gather()).
+    critical_path() strings those waits together, expanding each Task that
+    was waited on into what it was waiting for in turn.
+
+    Add one to a loop with TimeTravelingTestLoop.add_instrument().
+    """
+    def __init__(self):
+        self._tasks = TaskTracker()
+        #: Task -> its _TaskHistory, for as long as the Task is alive.
+        self._histories = weakref.WeakKeyDictionary()
+        #: A scheduled timer -> when it was scheduled, until it runs or is cancelled.
+        self._timers = {}
+        #: A scheduled callback -> what was running when it was scheduled.
+        self._origins = {}
+        #: (Task, origin) of the Handle that is running.
+        self._running = None
+
+    def clear(self):
+        """
+        Forget everything seen so far.
+        """
+        self._tasks.clear()
+        self._histories.clear()
+        self._timers.clear()
+        self._origins.clear()
+
+    def handle_scheduled(self, handle, now):
+        if getattr(handle, '_when', None) is not None:
+            self._timers[handle] = now
+            return
+
+        if self._running is not None:
+            self._origins[handle] = self._running[1]
+
+        # A Task's first step is scheduled as it's created.
+        owner = getattr(handle._callback, '__self__', None)
+        if isinstance(owner, asyncio.Task) and owner not in self._histories:
+            self._histories[owner] = _TaskHistory(describe_task(owner), now)
+
+    def handle_cancelled(self, handle, now):
+        self._timers.pop(handle, None)
+        self._origins.pop(handle, None)
+
+    def handle_started(self, handle, now):
+        # Timers never step a Task, though one like wait_for()'s can look
+        # like it does, by being passed the very Future a Task waits on.
+        scheduled_at = self._timers.pop(handle, None)
+        task = self._tasks.task_for(handle) if scheduled_at is None else None
+        inherited = self._origins.pop(handle, None)
+
+        history = self._histories.get(task) if task is not None else None
+        if history is not None:
+            if history.finished is None and now > history.since:
+                history.waits.append((history.since, now, inherited))
+            origin = history
+        elif task is not None:
+            origin = describe_task(task)
+        elif scheduled_at is not None:
+            origin = describe_timer(handle, now - scheduled_at)
+        elif inherited is not None:
+            # Whatever scheduled this callback is what it's really for.
+            origin = inherited
+        else:
+            origin = describe_callback(handle._callback)
+
+        self._running = (task, origin)
+
+    def handle_finished(self, handle, now):
+        task, _ = self._running
+        self._running = None
+
+        if task is not None:
+            self._tasks.stepped(task)
+            history = self._histories.get(task)
+            if history is not None and history.finished is None:
+                if task.done():
+                    history.finished = now
+                else:
+                    history.since = now
+
+    def critical_path(self, task, now=None):
+        """
+        What ``task`` spent its time waiting on, from when it was created to
+        when it finished, as a list of PathSegments in order.  Each Task it
+        waited on is followed by what that Task was waiting on in the
+        meantime.
+
+        If it hasn't finished, the path runs to its latest step, or to
+        ``now`` (the loop's time) if given, with whatever it's still waiting
+        on last.
+
+        Raises ValueError if the profiler never saw ``task`` created.
+        """
+        history = self._history(task)
+        if history.finished is not None:
+            return self._expand(history, history.created, history.finished, 0, {history})
+
+        since = history.since
+        path = self._expand(history, history.created, since, 0, {history})
+        if now is not None and now > since:
+            waiting_on = task._fut_waiter
+            if isinstance(waiting_on, asyncio.Task):
+                label = "still waiting on {name}".format(name=describe_task(waiting_on))
+            else:
+                label = "still waiting"
+            path.append(PathSegment(0, since, now, label))
+        return path
+
+    def _history(self, task):
+        history = self._histories.get(task)
+        if history is None:
+            raise ValueError("{task!r} wasn't created while the profiler was watching".format(task=task))
+        return history
+
+    def _expand(self, history, start, end, depth, seen):
+        path = []
+        for since, until, origin in history.waits:
+            since = max(since, start)
+            until = min(until, end)
+            if until <= since:
+                continue
+
+            if isinstance(origin, _TaskHistory):
+                path.append(PathSegment(depth, since, until, origin.name))
+                if origin not in seen:
+                    path.extend(self._expand(origin, since, until, depth + 1, seen | {origin}))
+            else:
+                path.append(PathSegment(depth, since, until, origin or "something outside the loop"))
+        return path
+
+    def dominant(self, task, now=None):
+        """
+        The longest wait, on anything but another Task, on ``task``'s
+        critical path: the sleep, timeout or callback that held it up the
+        most.  None if it never waited.
+        """
+        leaves = [segment for segment in self.critical_path(task, now) if not segment.label.startswith('task ')]
+        if not leaves:
+            return None
+        return max(leaves, key=lambda segment: segment.end - segment.start)
+
+    def report(self, task, now=None):
+        """
+        The critical path of ``task``, as readable text.
+        """
+        path = self.critical_path(task, now)
+        history = self._history(task)
+        start = history.created
+        end = history.finished
+        if end is None:
+            end = path[-1].end if path else start
+
+        lines = ["Critical path of {name}: {elapsed:.6f} virtual seconds".format(
+            name=describe_task(task), elapsed=end - start)]
+        for segment in path:
+            lines.append("{indent}+{offset:<12.6f} {duration:>12.6f}s  {label}".format(
+                indent="  " * (segment.depth + 1), offset=segment.start - start,
+                duration=segment.end - segment.start, label=segment.label))
+
+        dominant = self.dominant(task, now)
+        if dominant is not None:
+            duration = dominant.end - dominant.start
+            lines.append("Dominated by {label}: {duration:.6f} virtual seconds ({share:.0%})".format(
+                label=dominant.label, duration=duration, share=duration / (end - start) if end > start else 1.0))
+        return "\n".join(lines)
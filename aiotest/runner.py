@@ -0,0 +1,389 @@
+import argparse
+import functools
+import multiprocessing
+import os
+import sys
+import time
+import unittest
+from collections import OrderedDict, namedtuple
+
+from aiotest.case import TestCase
+from aiotest.perf import PerfWriter, compare, format_regressions, read_report, record_outcome
+from aiotest.selection import DependencyRecorder, RecordingSuite, TestCache
+
+#: What happened to a single test, in a form that can be sent between
+#: processes.  ``dependencies`` are the source files it ran code from, if
+#: they were recorded, and ``usage`` is the LoopUsage of an aiotest TestCase.
+TestOutcome = namedtuple('TestOutcome', ['test_id', 'status', 'details', 'duration', 'dependencies', 'usage'])
+
+#: How each status is shown: a single character for the normal progress
+#: line, a word for verbose output, and its name in the final tally.
+STATUS_LABELS = OrderedDict([
+    ('pass', ('.', 'ok', None)),
+    ('fail', ('F', 'FAIL', 'failures')),
+    ('error', ('E', 'ERROR', 'errors')),
+    ('skip', ('s', 'skipped', 'skipped')),
+    ('expected failure', ('x', 'expected failure', 'expected failures')),
+    ('unexpected success', ('u', 'unexpected success', 'unexpected successes')),
+    ('cached', ('c', 'cached', 'cached')),
+])
+
+#: The statuses that make a run unsuccessful.
+FAILING_STATUSES = frozenset(['fail', 'error', 'unexpected success'])
+
+
+class OutcomeResult(unittest.TestResult):
+    """
+    A TestResult that keeps a TestOutcome for every test it runs, rather than
+    holding on to the tests themselves.
+
+    Given a DependencyRecorder, the outcome of every aiotest TestCase lists
+    the source files it ran code from.
+    """
+    def __init__(self, recorder=None):
+        super().__init__()
+        self.outcomes = []
+        self._current = None
+        self._recorder = recorder
+
+    def startTest(self, test):
+        super().startTest(test)
+        if self._recorder is not None:
+            self._recorder.test_started(test)
+        self._current = [test, 'pass', '', time.perf_counter()]
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        test, status, details, started = self._current
+        self._current = None
+
+        dependencies = None
+        if self._recorder is not None:
+            dependencies = self._recorder.test_finished(test)
+            if not isinstance(test, TestCase):
+                dependencies = None
+        self.outcomes.append(TestOutcome(test.id(), status, details, time.perf_counter() - started, dependencies,
+                                         getattr(test, 'loop_usage', None)))
+
+    def _record(self, test, status, details=''):
+        if self._current is not None and self._current[0] is test:
+            self._current[1] = status
+            self._current[2] = details
+        else:
+            # Class and module fixtures fail outside of any test.
+            self.outcomes.append(TestOutcome(test.id(), status, details, 0.0, None, None))
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self._record(test, 'error', self._exc_info_to_string(err, test))
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._record(test, 'fail', self._exc_info_to_string(err, test))
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self._record(test, 'skip', reason)
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self._record(test, 'expected failure', self._exc_info_to_string(err, test))
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self._record(test, 'unexpected success')
+
+
+def iter_tests(suite):
+    """
+    Flatten a (possibly nested) TestSuite into its individual tests.
+    """
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iter_tests(test)
+        else:
+            yield test
+
+
+def _loadable_by_name(cls):
+    """
+    Whether another process could find a test class again from its module
+    and qualified name.  Classes made inside functions can't be, and
+    neither can those of modules that weren't imported by name (like a
+    script run as __main__), nor the stand-ins unittest makes for modules
+    that failed to import.
+    """
+    if cls.__module__.startswith('unittest.'):
+        return False
+
+    module = sys.modules.get(cls.__module__)
+    if module is None or getattr(module, '__spec__', None) is None:
+        return False
+
+    found = module
+    for name in cls.__qualname__.split('.'):
+        found = getattr(found, name, None)
+    return found is cls
+
+
+def shard_tests(suite):
+    """
+    Group the tests of a suite by the class they belong to, so that each
+    class's fixtures only run once, and its tests share a process.
+
+    Returns a list of (shardable, tests) pairs, biggest first.  Tests whose
+    class can't be loaded again by name in another process aren't
+    shardable, and run in this one.
+
+    Module fixtures run in every process that is given a class from the
+    module: setUpModule() and tearDownModule() run once per worker, rather
+    than once per run.
+    """
+    shards = OrderedDict()
+    for test in iter_tests(suite):
+        cls = type(test)
+        shards.setdefault(cls, []).append(test)
+
+    return sorted(((_loadable_by_name(cls), tests) for cls, tests in shards.items()),
+                  key=lambda shard: len(shard[1]), reverse=True)
+
+
+def run_tests(tests, record=False):
+    """
+    Run the given tests one after another, returning their TestOutcomes.
+    With ``record``, the outcomes list the source files each test ran code
+    from.
+    """
+    if not record:
+        result = OutcomeResult()
+        unittest.TestSuite(tests)(result)
+        return result.outcomes
+
+    recorder = DependencyRecorder()
+    result = OutcomeResult(recorder)
+    recorder.start()
+    try:
+        RecordingSuite(tests, recorder)(result)
+    finally:
+        recorder.stop()
+    return result.outcomes
+
+
+def _run_shard(test_ids, record=False):
+    """
+    Load and run a shard of tests by name.  This is what the worker
+    processes run, each with event loops of their own.
+    """
+    return run_tests(unittest.defaultTestLoader.loadTestsFromNames(test_ids), record)
+
+
+def _init_worker(path):
+    sys.path[:] = path
+
+
+def load_tests(names=None, start='.', pattern='test*.py', top_level_dir=None):
+    """
+    Load the named tests, or discover them all if no names are given.
+    """
+    loader = unittest.defaultTestLoader
+    if names:
+        return loader.loadTestsFromNames(names)
+    return loader.discover(start, pattern, top_level_dir)
+
+
+def select_tests(suite, cache):
+    """
+    Split a suite into the tests that need to run, and those aiotest tests
+    that passed last time and haven't had anything they depend on change
+    since, according to a TestCache.
+
+    Returns a TestSuite of the tests to run, and a 'cached' TestOutcome for
+    each of the others.
+    """
+    tests = []
+    cached = []
+    for test in iter_tests(suite):
+        if isinstance(test, TestCase) and cache.is_fresh(test.id()):
+            cached.append(TestOutcome(test.id(), 'cached', '', 0.0, None, None))
+        else:
+            tests.append(test)
+    return unittest.TestSuite(tests), cached
+
+
+def run(suite, jobs=None, on_outcome=None, record=False):
+    """
+    Run a suite, spreading its test classes across ``jobs`` worker processes
+    (one per CPU by default).  ``on_outcome`` is called with each TestOutcome
+    as it comes in.  With ``record``, outcomes list the source files each
+    test ran code from.
+
+    Returns the TestOutcome of every test.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    outcomes = []
+
+    def collect(shard_outcomes):
+        for outcome in shard_outcomes:
+            outcomes.append(outcome)
+            if on_outcome is not None:
+                on_outcome(outcome)
+
+    shards = shard_tests(suite)
+    parallel = jobs > 1 and sum(1 for shardable, tests in shards if shardable) > 1
+    remote = [[test.id() for test in tests] for shardable, tests in shards if parallel and shardable]
+    local = [tests for shardable, tests in shards if not (parallel and shardable)]
+
+    if remote:
+        with multiprocessing.Pool(min(jobs, len(remote)), _init_worker, (sys.path,)) as pool:
+            for shard_outcomes in pool.imap_unordered(functools.partial(_run_shard, record=record), remote):
+                collect(shard_outcomes)
+
+    for tests in local:
+        collect(run_tests(tests, record))
+
+    return outcomes
+
+
+def print_outcome(stream, verbosity, outcome):
+    """
+    Show the progress of a running suite, unittest style.
+    """
+    short, long, _ = STATUS_LABELS[outcome.status]
+    if verbosity > 1:
+        if outcome.status == 'skip':
+            long = "{label} {reason!r}".format(label=long, reason=outcome.details)
+        stream.write("{test_id} ... {label}\n".format(test_id=outcome.test_id, label=long))
+    elif verbosity == 1:
+        stream.write(short)
+    stream.flush()
+
+
+def print_summary(stream, outcomes, elapsed, durations=0):
+    """
+    Show the details of every failure, the slowest tests if asked for, and a
+    unittest style tally at the end.
+    """
+    stream.write("\n")
+    for outcome in outcomes:
+        if outcome.status in ('fail', 'error'):
+            stream.write("=" * 70 + "\n")
+            stream.write("{label}: {test_id}\n".format(label=STATUS_LABELS[outcome.status][1], test_id=outcome.test_id))
+            stream.write("-" * 70 + "\n")
+            stream.write(outcome.details + "\n")
+
+    if durations:
+        stream.write("Slowest {count} tests:\n".format(count=durations))
+        for outcome in sorted(outcomes, key=lambda outcome: outcome.duration, reverse=True)[:durations]:
+            stream.write("{duration:10.3f}s  {test_id}\n".format(duration=outcome.duration, test_id=outcome.test_id))
+
+    stream.write("-" * 70 + "\n")
+    stream.write("Ran {count} test{s} in {elapsed:.3f}s\n\n".format(
+        count=len(outcomes), s='' if len(outcomes) == 1 else 's', elapsed=elapsed))
+
+    counts = OrderedDict((status, 0) for status in STATUS_LABELS)
+    for outcome in outcomes:
+        counts[outcome.status] += 1
+
+    tally = ', '.join("{name}={count}".format(name=STATUS_LABELS[status][2], count=count)
+                      for status, count in counts.items() if count and status != 'pass')
+    if not was_successful(outcomes):
+        stream.write("FAILED ({tally})\n".format(tally=tally))
+    elif tally:
+        stream.write("OK ({tally})\n".format(tally=tally))
+    else:
+        stream.write("OK\n")
+
+
+def was_successful(outcomes):
+    """
+    Whether a run passed.  As with unittest's wasSuccessful(), a test marked
+    as an expected failure that passes fails the run.
+    """
+    return not any(outcome.status in FAILING_STATUSES for outcome in outcomes)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m aiotest', description="Run aiotest suites in parallel.")
+    parser.add_argument('tests', nargs='*', help="test modules, classes or methods to run (default: discover them)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="how many worker processes to use (default: one per CPU)")
+    parser.add_argument('-v', '--verbose', dest='verbosity', action='store_const', const=2, default=1,
+                        help="show every test as it finishes")
+    parser.add_argument('-q', '--quiet', dest='verbosity', action='store_const', const=0,
+                        help="only show the summary")
+    parser.add_argument('-s', '--start-directory', default='.', help="directory to start discovery in")
+    parser.add_argument('-p', '--pattern', default='test*.py', help="pattern to match test files")
+    parser.add_argument('-t', '--top-level-directory', default=None, help="top level directory of the project")
+    parser.add_argument('--durations', type=int, default=0, metavar='N', help="show the N slowest tests")
+    parser.add_argument('--cache', default=None, metavar='PATH',
+                        help="skip aiotest tests that passed last time if nothing they ran has changed since, "
+                             "remembering what they ran in PATH")
+    parser.add_argument('--perf-report', default=None, metavar='PATH',
+                        help="write the real and virtual time, callbacks and peak scheduled handles of every test "
+                             "to PATH")
+    parser.add_argument('--perf-baseline', default=None, metavar='PATH',
+                        help="flag tests that cost more than they did in the performance report at PATH")
+    parser.add_argument('--perf-threshold', type=float, default=0.5, metavar='FRACTION',
+                        help="how much more a test has to cost than its baseline to be flagged (default: 0.5)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None, stream=None):
+    """
+    The ``python -m aiotest`` command line.  Returns the exit status.
+    """
+    args = parse_args(argv)
+    if stream is None:
+        stream = sys.stderr
+
+    # Like `python -m unittest`, tests are imported relative to where we're run from.
+    if '' not in sys.path and os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    suite = load_tests(args.tests, args.start_directory, args.pattern, args.top_level_directory)
+
+    # Read first, so that a bad baseline doesn't only come to light once every test has run.
+    baseline = read_report(args.perf_baseline) if args.perf_baseline else None
+    perf_records = {}
+    perf_writer = None
+    if args.perf_report:
+        perf_writer = PerfWriter(open(args.perf_report, 'w'))
+
+    def on_outcome(outcome):
+        print_outcome(stream, args.verbosity, outcome)
+        record = record_outcome(outcome)
+        if record is not None:
+            perf_records[record.test_id] = record
+            if perf_writer is not None:
+                perf_writer.write(record)
+
+    started = time.perf_counter()
+    outcomes = []
+    cache = None
+    if args.cache:
+        cache = TestCache(args.cache)
+        suite, outcomes = select_tests(suite, cache)
+        for outcome in outcomes:
+            on_outcome(outcome)
+
+    try:
+        outcomes.extend(run(suite, args.jobs, on_outcome, record=cache is not None))
+    finally:
+        if perf_writer is not None:
+            perf_writer.close()
+
+    if cache is not None:
+        for outcome in outcomes:
+            cache.record(outcome)
+        cache.save()
+
+    print_summary(stream, outcomes, time.perf_counter() - started, args.durations)
+
+    if baseline is not None:
+        regressions = compare(perf_records, baseline, args.perf_threshold)
+        if regressions:
+            stream.write(format_regressions(regressions) + "\n")
+
+    return 0 if was_successful(outcomes) else 1
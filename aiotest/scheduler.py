@@ -0,0 +1,119 @@
+import heapq
+from collections import deque
+
+
+class HeapScheduler(list):
+    """
+    Keeps a TimeTravelingTestLoop's TestableHandles in a binary heap, just like
+    BaseEventLoop does.  This is the default.
+
+    Every scheduler offers the same few methods, and may be iterated over
+    (in no particular order), measured with len() and cleared.
+    """
+    def push(self, handle):
+        """
+        Add a Handle.
+        """
+        heapq.heappush(self, handle)
+
+    def peek(self):
+        """
+        The earliest Handle, without removing it.
+        """
+        return self[0]
+
+    def pop_first(self):
+        """
+        Remove and return the earliest Handle.
+        """
+        return heapq.heappop(self)
+
+    def pop_due(self, limit, inclusive=True):
+        """
+        Remove and return, in order, every Handle scheduled before ``limit``
+        (or at it, if ``inclusive``).
+        """
+        due = []
+        while self:
+            when = self[0]._when
+            if when > limit or (when == limit and not inclusive):
+                break
+            due.append(heapq.heappop(self))
+        return due
+
+    def rebuild(self, handles):
+        """
+        Replace every Handle with the given ones.
+        """
+        self[:] = handles
+        heapq.heapify(self)
+
+
+class BucketScheduler:
+    """
+    Keeps a TimeTravelingTestLoop's TestableHandles in buckets, one for each
+    distinct deadline, with a heap of the deadlines themselves.
+
+    When lots of Handles share a deadline (think fixed tick intervals), the
+    heap only has to order the deadlines, scheduling into an existing bucket
+    is O(1), and a whole bucket is handed over in one go when it's due.
+    Handles in the same bucket always run in the order they were scheduled.
+    """
+    def __init__(self):
+        #: A heap of every deadline with a bucket.
+        self._deadlines = []
+        #: deadline -> FIFO of the Handles due then.
+        self._buckets = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for bucket in self._buckets.values():
+            yield from bucket
+
+    def clear(self):
+        self._deadlines.clear()
+        self._buckets.clear()
+        self._size = 0
+
+    def push(self, handle):
+        when = handle._when
+        bucket = self._buckets.get(when)
+        if bucket is None:
+            bucket = self._buckets[when] = deque()
+            heapq.heappush(self._deadlines, when)
+        bucket.append(handle)
+        self._size += 1
+
+    def peek(self):
+        return self._buckets[self._deadlines[0]][0]
+
+    def pop_first(self):
+        when = self._deadlines[0]
+        bucket = self._buckets[when]
+        handle = bucket.popleft()
+        if not bucket:
+            heapq.heappop(self._deadlines)
+            del self._buckets[when]
+        self._size -= 1
+        return handle
+
+    def pop_due(self, limit, inclusive=True):
+        deadlines = self._deadlines
+        buckets = self._buckets
+        due = []
+        while deadlines:
+            when = deadlines[0]
+            if when > limit or (when == limit and not inclusive):
+                break
+            heapq.heappop(deadlines)
+            due.extend(buckets.pop(when))
+        self._size -= len(due)
+        return due
+
+    def rebuild(self, handles):
+        self.clear()
+        for handle in handles:
+            self.push(handle)
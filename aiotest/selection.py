@@ -0,0 +1,304 @@
+import ast
+import hashlib
+import json
+import os
+import sys
+import sysconfig
+import unittest
+
+#: Bumped whenever the cache file changes shape.
+CACHE_VERSION = 1
+
+
+def _standard_library():
+    paths = sysconfig.get_paths()
+    return tuple({os.path.normcase(os.path.abspath(paths[name])) + os.sep for name in ('stdlib', 'platstdlib')})
+
+
+def _imported_names(path, package):
+    """
+    The names of every module the source at ``path`` imports, anywhere in
+    it, along with the packages they're in, and what each ``from`` import
+    takes from a package, in case that's a module too.  ``package`` is what
+    relative imports are relative to.
+    """
+    try:
+        with open(path, 'rb') as file:
+            tree = ast.parse(file.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return frozenset()
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                parts = package.split('.') if package else []
+                if node.level - 1 > len(parts):
+                    continue
+                parts = parts[:len(parts) - (node.level - 1)]
+                base = '.'.join(parts + ([base] if base else []))
+            if base:
+                names.add(base)
+            names.update("{base}.{name}".format(base=base, name=alias.name).lstrip('.') for alias in node.names)
+
+    # Importing a module runs every package it's in, too.
+    for name in list(names):
+        while '.' in name:
+            name = name.rpartition('.')[0]
+            names.add(name)
+    return frozenset(names)
+
+
+class DependencyRecorder:
+    """
+    Finds out which source files each test depends on, by way of
+    sys.settrace(): every time a Python function (or module, or coroutine)
+    is entered, the file its code came from is noted.  Only ``call`` events
+    are asked for, so lines aren't traced.
+
+    Code can depend on a module without running any of it, by reading its
+    constants or class attributes, so the modules imported by every file
+    that code was run from count as well, as long as they're loaded.  So do
+    the modules that were first imported while the test ran, found by
+    looking at sys.modules before and after.
+
+    Anything run outside a test, such as setUpClass(), counts towards every
+    test of the class it ran before, unless fixtures_torn_down() says it
+    was tearing down the class before.  The standard library is left out.
+
+    While recording, the recorder is the only trace function: it doesn't
+    get along with coverage tools or debuggers.
+    """
+    def __init__(self):
+        self._files = set()
+        self._fixture_files = set()
+        self._class = None
+        self._previous = None
+        self._ignored = _standard_library()
+        #: Every name in sys.modules as of the last time we looked.
+        self._modules = set()
+        #: path -> the names of the modules it imports.
+        self._imports = {}
+
+    def _trace(self, frame, event, arg):
+        self._files.add(frame.f_code.co_filename)
+
+    def start(self):
+        """
+        Start recording, for however many tests are run from here on.
+        """
+        self._modules = set(sys.modules)
+        self._previous = sys.gettrace()
+        sys.settrace(self._trace)
+
+    def stop(self):
+        sys.settrace(self._previous)
+        self._previous = None
+
+    def _new_modules(self):
+        """
+        The files of the modules imported since we last looked.
+        """
+        modules = set(sys.modules)
+        new = modules - self._modules
+        self._modules = modules
+
+        files = set()
+        for name in new:
+            filename = getattr(sys.modules.get(name), '__file__', None)
+            if filename:
+                files.add(filename)
+        return files
+
+    def fixtures_torn_down(self):
+        """
+        Called once a class's or module's fixtures have been torn down, so
+        that what tearing them down ran doesn't count towards the next
+        class's tests.  See RecordingSuite.
+        """
+        self._files = set()
+        self._new_modules()
+
+    def test_started(self, test):
+        # Whatever ran since the last test was a fixture of this one's class.
+        if type(test) is not self._class:
+            self._class = type(test)
+            self._fixture_files = set()
+        self._fixture_files |= self._files | self._new_modules()
+        self._files = set()
+
+    def test_finished(self, test):
+        """
+        Returns the sorted, absolute paths of every source file that the
+        test just finished (and its class's fixtures) ran code from, or
+        imported.
+        """
+        files = self._files | self._new_modules() | self._fixture_files
+        self._files = set()
+
+        dependencies = set()
+        for filename in files:
+            path = self._dependency(filename)
+            if path is not None and path not in dependencies:
+                dependencies.add(path)
+                dependencies.update(self._imported_files(path))
+        return sorted(dependencies)
+
+    def _dependency(self, filename):
+        """
+        The absolute path of a file code came from, or None if it doesn't count.
+        """
+        if filename.startswith('<'):
+            return None
+        path = os.path.abspath(filename)
+        if os.path.normcase(path).startswith(self._ignored):
+            return None
+        return path
+
+    def _imported_files(self, path):
+        """
+        The files of the loaded modules that the source at ``path`` imports.
+        """
+        names = self._imports.get(path)
+        if names is None:
+            names = self._imports[path] = _imported_names(path, self._package_of(path))
+
+        files = []
+        for name in names:
+            filename = getattr(sys.modules.get(name), '__file__', None)
+            if filename:
+                imported = self._dependency(filename)
+                if imported is not None:
+                    files.append(imported)
+        return files
+
+    def _package_of(self, path):
+        """
+        The package the module loaded from ``path`` is in, or None.
+        """
+        path = os.path.normcase(path)
+        for module in list(sys.modules.values()):
+            filename = getattr(module, '__file__', None)
+            if filename and os.path.normcase(os.path.abspath(filename)) == path:
+                return getattr(module, '__package__', None)
+        return None
+
+
+class RecordingSuite(unittest.TestSuite):
+    """
+    A TestSuite that lets a DependencyRecorder know whenever it has torn
+    down a class's or a module's fixtures.
+    """
+    def __init__(self, tests=(), recorder=None):
+        super().__init__(tests)
+        self._recorder = recorder
+
+    def _tearDownPreviousClass(self, test, result):
+        super()._tearDownPreviousClass(test, result)
+        if self._recorder is not None:
+            self._recorder.fixtures_torn_down()
+
+    def _handleModuleTearDown(self, result):
+        super()._handleModuleTearDown(result)
+        if self._recorder is not None:
+            self._recorder.fixtures_torn_down()
+
+
+class TestCache:
+    """
+    Remembers which tests passed last time, and a hash of every source file
+    they ran code from, in a JSON file at ``path``.  A test is fresh, and
+    doesn't need to run again, if it passed and none of those files have
+    changed since.
+
+    Because aiotest tests run on virtual time, a test that passed against
+    the same code will pass again, which is what makes this safe.  Files
+    are only hashed again when their size or modification time changes.
+    """
+    def __init__(self, path):
+        self.path = path
+        #: test id -> [[path, hash], ...] for every test that passed.
+        self._tests = {}
+        #: path -> [modification time, size, hash] as of when it was last hashed.
+        self._files = {}
+        #: path -> hash, for files hashed during this run.
+        self._hashes = {}
+        self.load()
+
+    def load(self):
+        """
+        Read the cache file.  One that is missing, unreadable, or written by
+        another version of Python or of the cache, is treated as empty.
+        """
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if data.get('version') != CACHE_VERSION or data.get('python') != sys.version:
+            return
+        self._tests = data.get('tests', {})
+        self._files = data.get('files', {})
+
+    def save(self):
+        """
+        Write the cache file, replacing the old one all at once.
+        """
+        data = {'version': CACHE_VERSION, 'python': sys.version, 'tests': self._tests, 'files': self._files}
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(data, file, sort_keys=True)
+        os.replace(temporary, self.path)
+
+    def file_hash(self, path):
+        """
+        The hash of a file's contents as they are now, or None if it's gone.
+        """
+        digest = self._hashes.get(path)
+        if digest is not None:
+            return digest
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        known = self._files.get(path)
+        if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            digest = known[2]
+        else:
+            try:
+                with open(path, 'rb') as file:
+                    digest = hashlib.sha1(file.read()).hexdigest()
+            except OSError:
+                return None
+            self._files[path] = [stat.st_mtime_ns, stat.st_size, digest]
+
+        self._hashes[path] = digest
+        return digest
+
+    def is_fresh(self, test_id):
+        """
+        Whether the test passed last time, and nothing it depends on has changed since.
+        """
+        dependencies = self._tests.get(test_id)
+        if dependencies is None:
+            return False
+        return all(self.file_hash(path) == digest for path, digest in dependencies)
+
+    def record(self, outcome):
+        """
+        Remember how a test went, and what it depended on, if that was recorded.
+        """
+        if outcome.dependencies is None:
+            return
+
+        if outcome.status == 'pass':
+            dependencies = [[path, self.file_hash(path)] for path in outcome.dependencies]
+            self._tests[outcome.test_id] = [dependency for dependency in dependencies if dependency[1] is not None]
+        else:
+            self._tests.pop(outcome.test_id, None)
@@ -1,5 +1,8 @@
 import asyncio
+import unittest
+
 from aiotest import TestCase
+from aiotest.loop import TimeTravelingTestLoop
 
 
 @asyncio.coroutine
@@ -38,7 +41,7 @@ class BasicApiTests(TestCase):
 
         @asyncio.coroutine
         def takes_5_seconds():
-            yield from asyncio.sleep(5, loop=self.event_loop) # FIXME Shouldn't need to specify loop.
+            yield from asyncio.sleep(5)
 
         self.assertCoroDuration(5, takes_5_seconds)
 
@@ -46,7 +49,458 @@ class BasicApiTests(TestCase):
 
         @asyncio.coroutine
         def takes_10_seconds():
-            yield from asyncio.sleep(10, loop=self.event_loop) # FIXME Shouldn't need to specify loop.
+            yield from asyncio.sleep(10)
 
         with self.assertRaises(TestCase.failureException):
             self.assertCoroDuration(5, takes_10_seconds)
+
+    def test_assert_coro_duration_too_soon(self):
+
+        @asyncio.coroutine
+        def takes_2_seconds():
+            yield from asyncio.sleep(2)
+
+        with self.assertRaisesRegex(TestCase.failureException, "too soon"):
+            self.assertCoroDuration(5, takes_2_seconds)
+
+    def test_assert_coro_result_max_time(self):
+
+        @asyncio.coroutine
+        def slow_add(a, b):
+            yield from asyncio.sleep(10)
+            return a + b
+
+        with self.assertRaisesRegex(TestCase.failureException, r"slow_add\(1, 2\) did not complete"):
+            self.assertCoroResult(3, slow_add, 1, 2, max_time=5)
+        with self.assertRaisesRegex(TestCase.failureException, r"slow_add\(1, 2\) did not complete"):
+            self.assertCoroNotResult(4, slow_add, 1, 2, max_time=5)
+
+        self.assertCoroResult(3, slow_add, 1, 2, max_time=10)
+
+    def test_assert_coro_within(self):
+
+        @asyncio.coroutine
+        def steps(count):
+            for _ in range(count):
+                yield from asyncio.sleep(0.1)
+            return count
+
+        usage = self.assertCoroWithin(steps, 30, min_time=3, max_time=3, cpu_budget=10)
+
+        self.assertAlmostEqual(3, usage.elapsed, places=5)
+        self.assertLess(usage.cpu_time, 10)
+        # The first step, then two batches for each sleep: its timer, then the wake up it sets off.
+        self.assertEqual(61, usage.iterations)
+        self.assertEqual(61, usage.callbacks)
+
+    def test_assert_coro_within_failures(self):
+
+        @asyncio.coroutine
+        def sleeps(seconds):
+            yield from asyncio.sleep(seconds)
+
+        @asyncio.coroutine
+        def stuck():
+            yield from asyncio.Future()
+
+        with self.assertRaisesRegex(TestCase.failureException, r"sleeps\(1\) completed in 1.0 virtual seconds, "
+                                                               r"sooner than 5 \(1.0 virtual seconds, .* callbacks\)"):
+            self.assertCoroWithin(sleeps, 1, min_time=5)
+
+        with self.assertRaisesRegex(TestCase.failureException, "did not complete within 5 virtual seconds"):
+            self.assertCoroWithin(sleeps, 10, max_time=5)
+
+        with self.assertRaisesRegex(TestCase.failureException, "will never happen"):
+            self.assertCoroWithin(stuck)
+
+        with self.assertRaisesRegex(TestCase.failureException, "over its budget of -1"):
+            self.assertCoroWithin(sleeps, 1, cpu_budget=-1)
+
+        with self.assertRaisesRegex(TestCase.failureException, "^custom$"):
+            self.assertCoroWithin(sleeps, 1, min_time=5, msg="custom")
+
+    def test_assert_coro_within_raises(self):
+
+        @asyncio.coroutine
+        def fails():
+            raise KeyError("nope")
+
+        with self.assertRaises(KeyError):
+            self.assertCoroWithin(fails, min_time=5)
+
+    def test_assert_coro_results(self):
+        self.assertCoroResults(simple_add, [((1, 1), 2), ((2, 2), 4), ([3, 4], 7)])
+
+    def test_assert_coro_results_concurrent(self):
+        """
+        Every call runs at the same time, so the loop only needs to advance as far as the slowest one.
+        """
+        @asyncio.coroutine
+        def slow_double(seconds):
+            yield from asyncio.sleep(seconds)
+            return seconds * 2
+
+        start = self.event_loop.time()
+        self.assertCoroResults(slow_double, [((seconds,), seconds * 2) for seconds in range(100)], max_time=99)
+        self.assertEqual(start + 99, self.event_loop.time())
+
+    def test_assert_coro_results_incorrect(self):
+        @asyncio.coroutine
+        def slow_add(a, b):
+            yield from asyncio.sleep(a)
+            return a + b
+
+        @asyncio.coroutine
+        def divide(a, b):
+            return a / b
+
+        with self.assertRaises(TestCase.failureException) as context:
+            self.assertCoroResults(slow_add, [((1, 1), 2), ((2, 2), 5), ((3, 3), 7), ((10, 1), 11)], max_time=5)
+
+        self.assertEqual(str(context.exception), '\n'.join([
+            '3 of 4 calls failed:',
+            '5 != 4 for slow_add(2, 2)',
+            '7 != 6 for slow_add(3, 3)',
+            'slow_add(10, 1) did not complete within max time allowed.',
+        ]))
+
+        with self.assertRaises(TestCase.failureException) as context:
+            self.assertCoroResults(divide, [((1, 0), 0)])
+
+        self.assertIn("divide(1, 0) raised ZeroDivisionError", str(context.exception))
+
+    def test_assert_coro_results_custom_message(self):
+        msg = "What a terrible table"
+        with self.assertRaises(TestCase.failureException) as context:
+            self.assertCoroResults(simple_add, [((2, 2), 5)], msg=msg)
+
+        self.assertEqual(str(context.exception), msg)
+
+
+def run_case(case_class):
+    """
+    Run every test on an aiotest TestCase the way unittest would, class fixtures and all.
+    """
+    result = unittest.TestResult()
+    unittest.defaultTestLoader.loadTestsFromTestCase(case_class).run(result)
+    return result
+
+
+class LoopScopeTests(unittest.TestCase):
+
+    def make_case(self, scope):
+        loops = []
+
+        class ScopedTests(TestCase):
+            loop_scope = scope
+
+            def test_1(self):
+                loops.append(self.event_loop)
+                self.event_loop.call_later(10, print)
+                self.event_loop.advance(5)
+
+            def test_2(self):
+                loops.append(self.event_loop)
+                self.event_loop.call_later(10, print)
+                self.event_loop.advance(5)
+
+            def test_3(self):
+                loops.append(self.event_loop)
+                self.event_loop.call_later(10, print)
+                self.event_loop.advance(5)
+
+        return ScopedTests, loops
+
+    def test_no_loop_at_collection(self):
+        """
+        Collecting tests doesn't make any event loops.
+        """
+        case_class, loops = self.make_case('test')
+        test = case_class('test_1')
+        self.assertNotIn('_event_loop', test.__dict__)
+
+    def test_test_scope(self):
+        case_class, loops = self.make_case('test')
+        result = run_case(case_class)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(3, len(set(loops)))
+        self.assertTrue(all(loop.is_closed() for loop in loops))
+
+    def test_class_scope(self):
+        case_class, loops = self.make_case('class')
+        result = run_case(case_class)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(1, len(set(loops)))
+        self.assertTrue(loops[0].is_closed())
+
+    def test_module_scope(self):
+        case_class, loops = self.make_case('module')
+        result = run_case(case_class)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(1, len(set(loops)))
+        # It's closed as the module is torn down, which puts the module back the way it was.
+        self.assertTrue(loops[0].is_closed())
+        self.assertNotIn('tearDownModule', globals())
+
+    def test_module_scope_without_teardown(self):
+        """
+        Runners that never tear modules down get a module's loop closed once another module's tests want theirs.
+        """
+        case_class, loops = self.make_case('module')
+        result = unittest.TestResult()
+        for test in unittest.defaultTestLoader.loadTestsFromTestCase(case_class):
+            test(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertFalse(loops[0].is_closed())
+
+        other_class, other_loops = self.make_case('module')
+        other_class.__module__ = 'some.other.module'
+        run_case(other_class)
+
+        self.assertTrue(loops[0].is_closed())
+        self.assertIsNot(loops[0], other_loops[0])
+        globals().pop('tearDownModule', None)
+
+    def test_assigned_loop(self):
+        """
+        Assigning event_loop in setUp, as TestCases always could, runs the test on that loop.
+        """
+        assigned = []
+
+        class AssignedTests(TestCase):
+            def setUp(self):
+                self.event_loop = TimeTravelingTestLoop()
+                assigned.append(self.event_loop)
+
+            def test_current(self):
+                self.assertIs(asyncio.get_event_loop(), assigned[0])
+                self.assertCoroResult(4, simple_add, 2, 2)
+
+        result = run_case(AssignedTests)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertTrue(assigned[0].is_closed())
+
+    def test_assigned_loop_is_shared(self):
+        """
+        A loop assigned to a shared scope replaces the one it had, and is used by the rest of the class.
+        """
+        loops = []
+
+        class AssignedTests(TestCase):
+            loop_scope = 'class'
+
+            def test_1(self):
+                loops.append(self.event_loop)
+                self.event_loop = TimeTravelingTestLoop()
+                loops.append(self.event_loop)
+
+            def test_2(self):
+                loops.append(self.event_loop)
+
+        result = run_case(AssignedTests)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertIsNot(loops[0], loops[1])
+        self.assertIs(loops[1], loops[2])
+        self.assertTrue(loops[0].is_closed())
+        self.assertTrue(loops[1].is_closed())
+
+    def test_shared_loop_reset(self):
+        """
+        Each test sharing a loop starts with a fresh clock and nothing scheduled.
+        """
+        times = []
+
+        class ResetTests(TestCase):
+            loop_scope = 'class'
+
+            def test_1(self):
+                times.append((self.event_loop.time(), self.event_loop.scheduled_count))
+                self.event_loop.call_later(10, print)
+                self.event_loop.advance(5)
+
+            def test_2(self):
+                times.append((self.event_loop.time(), self.event_loop.scheduled_count))
+                self.event_loop.call_later(10, print)
+                self.event_loop.advance(5)
+
+        result = run_case(ResetTests)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(times[0], times[1])
+        self.assertEqual(0, times[0][1])
+
+    def test_current_loop(self):
+        """
+        A test's loop is the current event loop while it runs, and the previous one is put back afterwards.
+        """
+        previous = asyncio.get_event_loop()
+        current = []
+
+        class CurrentTests(TestCase):
+            def test_current(self):
+                current.append(asyncio.get_event_loop() is self.event_loop)
+
+        run_case(CurrentTests)
+
+        self.assertEqual([True], current)
+        self.assertIs(previous, asyncio.get_event_loop())
+
+    def test_invalid_scope(self):
+        class InvalidTests(TestCase):
+            loop_scope = 'session'
+
+            def test_nothing(self):
+                pass
+
+        result = run_case(InvalidTests)
+
+        self.assertEqual(1, len(result.errors))
+
+
+class CoroutineTestMethodTests(unittest.TestCase):
+
+    def test_coroutine_test_method(self):
+        """
+        Coroutine test methods, setUp and tearDown all run on the test's loop, in virtual time.
+        """
+        calls = []
+
+        class CoroutineTests(TestCase):
+
+            @asyncio.coroutine
+            def setUp(self):
+                self.start = self.event_loop.time()
+                yield from asyncio.sleep(10)
+                calls.append(('setUp', self.event_loop.time() - self.start))
+
+            @asyncio.coroutine
+            def test_sleep(self):
+                yield from asyncio.sleep(3600)
+                calls.append(('test_sleep', self.event_loop.time() - self.start))
+
+            @asyncio.coroutine
+            def tearDown(self):
+                yield from asyncio.sleep(5)
+                calls.append(('tearDown', self.event_loop.time() - self.start))
+
+        result = run_case(CoroutineTests)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual([('setUp', 10), ('test_sleep', 3610), ('tearDown', 3615)], calls)
+
+    def test_background_timers(self):
+        """
+        Timers left running in the background don't keep a test from finishing.
+        """
+        class HeartbeatTests(TestCase):
+
+            def beat(self):
+                self.event_loop.call_later(1, self.beat)
+
+            @asyncio.coroutine
+            def test_heartbeat(self):
+                self.beat()
+                yield from asyncio.sleep(60)
+
+        result = run_case(HeartbeatTests)
+
+        self.assertTrue(result.wasSuccessful())
+
+    def test_failures(self):
+        class FailingTests(TestCase):
+            async_timeout = 100
+
+            @asyncio.coroutine
+            def test_assertion(self):
+                yield from asyncio.sleep(1)
+                self.assertEqual(1, 2)
+
+            @asyncio.coroutine
+            def test_deadlock(self):
+                yield from asyncio.Future()
+
+            @asyncio.coroutine
+            def test_timeout(self):
+                yield from asyncio.sleep(1000)
+
+            @unittest.skip("not today")
+            @asyncio.coroutine
+            def test_skipped(self):
+                raise AssertionError("should have been skipped")
+
+        result = run_case(FailingTests)
+        failures = {test._testMethodName: message for test, message in result.failures}
+
+        self.assertEqual(['test_assertion', 'test_deadlock', 'test_timeout'], sorted(failures))
+        self.assertIn("will never happen", failures['test_deadlock'])
+        self.assertIn("did not complete within 100 virtual seconds", failures['test_timeout'])
+        self.assertEqual(1, len(result.skipped))
+
+    def test_run_coroutine(self):
+        class RunCoroutineTests(TestCase):
+            def runTest(self):
+                pass
+
+        case = RunCoroutineTests()
+
+        @asyncio.coroutine
+        def answer():
+            yield from asyncio.sleep(1)
+            return 42
+
+        self.assertEqual(42, case.runCoroutine(answer()))
+        case.doCleanups()
+
+
+class LeakCheckTests(unittest.TestCase):
+
+    def test_leaks_fail_the_test(self):
+        class LeakyTests(TestCase):
+            check_leaks = True
+
+            def test_pending_task(self):
+                asyncio.ensure_future(asyncio.sleep(60))
+
+            def test_timer(self):
+                self.event_loop.call_later(60, print)
+
+            def test_unretrieved_exception(self):
+                @asyncio.coroutine
+                def boom():
+                    raise ValueError("boom")
+
+                # Still found once it has been thrown away, logged and all.
+                self.event_loop.set_exception_handler(lambda loop, context: None)
+                asyncio.ensure_future(boom())
+                self.event_loop.advance(0)
+
+            def test_clean(self):
+                self.event_loop.call_later(60, print).cancel()
+                self.assertEqual(42, self.runCoroutine(asyncio.sleep(1, 42)))
+
+        result = run_case(LeakyTests)
+        failures = {test._testMethodName: message for test, message in result.failures}
+
+        self.assertEqual(['test_pending_task', 'test_timer', 'test_unretrieved_exception'], sorted(failures))
+        self.assertIn("1 pending task(s)", failures['test_pending_task'])
+        self.assertIn("0 pending task(s), 1 handle(s)", failures['test_timer'])
+        self.assertIn("ValueError('boom',) never retrieved", failures['test_unretrieved_exception'])
+
+    def test_leaks_ignored_by_default(self):
+        class LeakyTests(TestCase):
+            loop_scope = 'class'
+
+            def test_pending_task(self):
+                self.task = asyncio.ensure_future(asyncio.sleep(60))
+                type(self).task = self.task
+
+        result = run_case(LeakyTests)
+
+        self.assertTrue(result.wasSuccessful())
+        # Leftover tasks are cancelled rather than left for the next test.
+        self.assertTrue(LeakyTests.task.cancelled())
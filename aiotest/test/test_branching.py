@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+
+from aiotest import TestCase
+from aiotest.branching import CAN_FORK, BranchFailed, fork_branches
+from aiotest.loop import TimeTravelingTestLoop
+
+
+@unittest.skipUnless(CAN_FORK, "needs os.fork()")
+class ForkBranchesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = TimeTravelingTestLoop()
+        self.ticks = []
+
+        @asyncio.coroutine
+        def ticker():
+            while True:
+                yield from asyncio.sleep(1, loop=self.event_loop)
+                self.ticks.append(self.event_loop.time())
+
+        self.ticker = self.event_loop.create_task(ticker())
+        # The shared warm-up.
+        self.event_loop.advance(600)
+
+    def tearDown(self):
+        self.ticker.cancel()
+        self.event_loop.advance(0)
+        self.event_loop.close()
+
+    def test_branches_carry_on_from_the_prefix(self):
+        @asyncio.coroutine
+        def wait(seconds):
+            yield from asyncio.sleep(seconds, loop=self.event_loop)
+            return len(self.ticks)
+
+        def stop_ticking():
+            self.ticker.cancel()
+            self.event_loop.advance(100)
+            return len(self.ticks)
+
+        results = fork_branches(self.event_loop, {
+            'short': lambda: wait(10.5),
+            'long': lambda: wait(3600.5),
+            'stopped': stop_ticking,
+        })
+
+        self.assertEqual({'short': 610, 'long': 4200, 'stopped': 600}, results)
+
+        # The parent's loop hasn't moved on at all.
+        self.assertEqual(600, len(self.ticks))
+        self.assertFalse(self.ticker.done())
+
+    def test_failing_branch(self):
+        def fails():
+            raise ValueError("no good")
+
+        with self.assertRaises(BranchFailed) as caught:
+            fork_branches(self.event_loop, {'fine': lambda: 1, 'fails': fails})
+
+        self.assertEqual('fails', caught.exception.name)
+        self.assertIn("ValueError: no good", caught.exception.details)
+
+    def test_max_time(self):
+        with self.assertRaisesRegex(BranchFailed, "did not complete within 10 virtual seconds"):
+            fork_branches(self.event_loop, {'slow': lambda: asyncio.sleep(60, loop=self.event_loop)}, max_time=10)
+
+    def test_unpicklable_result(self):
+        with self.assertRaisesRegex(BranchFailed, "pickle"):
+            fork_branches(self.event_loop, {'lambda': lambda: (lambda: None)})
+
+
+@unittest.skipUnless(CAN_FORK, "needs os.fork()")
+class ForkBranchesTestCaseTests(TestCase):
+
+    def test_fork_branches(self):
+        self.runCoroutine(asyncio.sleep(60))
+
+        @asyncio.coroutine
+        def elapsed(seconds):
+            yield from asyncio.sleep(seconds)
+            return self.event_loop.time()
+
+        start = self.event_loop.time()
+        results = self.forkBranches({seconds: (lambda seconds=seconds: elapsed(seconds)) for seconds in (1, 2, 3)})
+
+        self.assertEqual({1: start + 1, 2: start + 2, 3: start + 3}, results)
+        self.assertEqual(start, self.event_loop.time())
+
+    def test_fork_branches_failure(self):
+        @asyncio.coroutine
+        def deadlock():
+            yield from asyncio.Future()
+
+        with self.assertRaisesRegex(self.failureException, "will never happen"):
+            self.forkBranches({'deadlock': deadlock})
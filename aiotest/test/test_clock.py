@@ -0,0 +1,184 @@
+import asyncio
+import time
+import unittest
+
+import aiotest
+from aiotest import TestCase
+from aiotest.clock import patch_clock
+from aiotest.loop import TimeTravelingTestLoop
+
+
+class SleepTests(TestCase):
+
+    def test_sleep(self):
+        start = self.event_loop.time()
+        self.assertEqual('done', self.runCoroutine(aiotest.sleep(30, 'done')))
+        self.assertEqual(30, self.event_loop.time() - start)
+
+    def test_sleep_zero(self):
+        start = self.event_loop.time()
+        self.assertIsNone(self.runCoroutine(aiotest.sleep(0)))
+        self.assertEqual(start, self.event_loop.time())
+
+    def test_cancelled_sleep(self):
+        task = asyncio.ensure_future(aiotest.sleep(30))
+        self.event_loop.advance(1)
+        task.cancel()
+        self.event_loop.advance(0)
+
+        self.assertTrue(task.cancelled())
+        # The wake up is taken off the schedule too.
+        self.assertEqual(1, self.event_loop.cancelled_count)
+
+    def test_explicit_loop(self):
+        other = TimeTravelingTestLoop()
+        self.addCleanup(other.close)
+
+        other.run_until_complete(aiotest.sleep(30, loop=other))
+        self.assertEqual(30, other.time() - self.event_loop.time())
+
+
+class WaitForTests(TestCase):
+
+    def test_in_time(self):
+        start = self.event_loop.time()
+        self.assertEqual(42, self.runCoroutine(aiotest.wait_for(aiotest.sleep(5, 42), 10)))
+        self.assertEqual(5, self.event_loop.time() - start)
+        self.assertEqual(0, self.event_loop.scheduled_count - self.event_loop.cancelled_count)
+
+    def test_timeout(self):
+        start = self.event_loop.time()
+        inner = asyncio.ensure_future(aiotest.sleep(50))
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.runCoroutine(aiotest.wait_for(inner, 10))
+
+        self.assertEqual(10, self.event_loop.time() - start)
+        self.assertTrue(inner.cancelled())
+
+    def test_timeout_ignored(self):
+        """
+        It still times out when the coroutine catches being cancelled and returns anyway.
+        """
+        @asyncio.coroutine
+        def stubborn():
+            try:
+                yield from aiotest.sleep(50)
+            except asyncio.CancelledError:
+                return 'ignored'
+
+        start = self.event_loop.time()
+        with self.assertRaises(asyncio.TimeoutError):
+            self.runCoroutine(aiotest.wait_for(stubborn(), 10))
+        self.assertEqual(10, self.event_loop.time() - start)
+
+    def test_result_at_deadline(self):
+        """
+        A future that finishes at the deadline, before the timeout gets to cancel it, keeps its result.
+        """
+        for wait_for in (aiotest.wait_for, asyncio.wait_for):
+            with self.subTest(wait_for=wait_for):
+                inner = asyncio.Future(loop=self.event_loop)
+                self.event_loop.call_later(10, inner.set_result, 'just in time')
+                self.assertEqual('just in time', self.runCoroutine(wait_for(inner, 10)))
+
+    def test_timeout_at_deadline(self):
+        """
+        A future still pending at the deadline times out, just as with asyncio.wait_for().
+        """
+        for wait_for in (aiotest.wait_for, asyncio.wait_for):
+            with self.subTest(wait_for=wait_for):
+                inner = asyncio.Future(loop=self.event_loop)
+                with self.assertRaises(asyncio.TimeoutError):
+                    self.runCoroutine(wait_for(inner, 10))
+                self.assertTrue(inner.cancelled())
+
+    def test_no_timeout(self):
+        self.assertEqual(1, self.runCoroutine(aiotest.wait_for(aiotest.sleep(5000, 1), None)))
+
+    def test_cancelled_from_outside(self):
+        inner = asyncio.ensure_future(aiotest.sleep(50))
+        outer = asyncio.ensure_future(aiotest.wait_for(inner, 10))
+        self.event_loop.advance(1)
+        outer.cancel()
+        self.event_loop.advance(0)
+
+        self.assertTrue(outer.cancelled())
+        self.assertTrue(inner.cancelled())
+
+
+class TimeoutTests(TestCase):
+
+    def test_timeout(self):
+        @asyncio.coroutine
+        def too_slow():
+            with aiotest.Timeout(10) as timeout:
+                yield from aiotest.sleep(50)
+            return timeout
+
+        start = self.event_loop.time()
+        with self.assertRaises(asyncio.TimeoutError):
+            self.runCoroutine(too_slow())
+        self.assertEqual(10, self.event_loop.time() - start)
+
+    def test_in_time(self):
+        @asyncio.coroutine
+        def quick():
+            with aiotest.Timeout(10) as timeout:
+                yield from aiotest.sleep(5)
+            return timeout
+
+        timeout = self.runCoroutine(quick())
+        self.assertFalse(timeout.expired)
+        self.assertEqual(0, self.event_loop.scheduled_count - self.event_loop.cancelled_count)
+
+    def test_no_limit(self):
+        @asyncio.coroutine
+        def slow():
+            with aiotest.Timeout(None):
+                yield from aiotest.sleep(5000)
+            return True
+
+        self.assertTrue(self.runCoroutine(slow()))
+
+    def test_outside_task(self):
+        with self.assertRaises(RuntimeError):
+            with aiotest.Timeout(10):
+                pass
+
+
+class PatchClockTests(unittest.TestCase):
+
+    def test_patch_clock(self):
+        loop = TimeTravelingTestLoop()
+        self.addCleanup(loop.close)
+        monotonic, wall = time.monotonic, time.time
+
+        with patch_clock(loop):
+            before = time.monotonic()
+            loop.advance(3600)
+            self.assertEqual(3600, time.monotonic() - before)
+            self.assertEqual(loop.time(), time.time())
+
+        self.assertIs(monotonic, time.monotonic)
+        self.assertIs(wall, time.time)
+
+    def test_test_case(self):
+        readings = []
+
+        class ClockTests(TestCase):
+            patch_clock = True
+
+            @asyncio.coroutine
+            def test_clock(self):
+                readings.append(time.monotonic())
+                yield from asyncio.sleep(60)
+                readings.append(time.monotonic())
+
+        monotonic = time.monotonic
+        result = unittest.TestResult()
+        unittest.defaultTestLoader.loadTestsFromTestCase(ClockTests).run(result)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(60, readings[1] - readings[0])
+        self.assertIs(monotonic, time.monotonic)
@@ -0,0 +1,175 @@
+import asyncio
+import random
+import unittest
+
+from aiotest import loop
+from aiotest.cluster import Cluster
+
+
+class ClusterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cluster = Cluster()
+        self.start = self.cluster.time()
+        self.events = []
+
+    def tearDown(self):
+        self.cluster.close()
+
+    def record(self, event_loop, name):
+        self.events.append((name, event_loop.time() - self.start))
+
+    def test_shared_clock(self):
+        first = self.cluster.new_loop()
+        second = self.cluster.new_loop()
+        self.assertEqual(first.time(), self.start)
+
+        advancement = self.cluster.advance(5)
+        self.assertEqual(advancement.elapsed, 5)
+        self.assertEqual(first.time(), self.cluster.time())
+        self.assertEqual(second.time(), self.cluster.time())
+        self.assertEqual(self.cluster.time() - self.start, 5)
+
+    def test_earliest_handle_runs_next(self):
+        first = self.cluster.new_loop()
+        second = self.cluster.new_loop()
+        first.call_later(2, self.record, first, 'first 2')
+        second.call_later(1, self.record, second, 'second 1')
+        first.call_later(3, self.record, first, 'first 3')
+        second.call_later(2.5, self.record, second, 'second 2.5')
+        first.call_soon(self.record, first, 'first now')
+
+        advancement = self.cluster.advance(10)
+        self.assertEqual(advancement.callbacks, 5)
+        self.assertEqual(self.events, [
+            ('first now', 0), ('second 1', 1), ('first 2', 2), ('second 2.5', 2.5), ('first 3', 3)])
+
+    def test_calls_across_loops(self):
+        first = self.cluster.new_loop()
+        second = self.cluster.new_loop()
+
+        def ping():
+            self.record(first, 'ping')
+            second.call_later(1, pong)
+
+        def pong():
+            self.record(second, 'pong')
+
+        first.call_later(1, ping)
+        self.cluster.run_until_idle()
+        self.assertEqual(self.events, [('ping', 1), ('pong', 2)])
+
+    def test_coroutines_find_their_own_loop(self):
+        nodes = [self.cluster.new_loop() for _ in range(3)]
+        seen = []
+
+        @asyncio.coroutine
+        def node(delay):
+            yield from asyncio.sleep(delay)
+            seen.append(asyncio.get_event_loop())
+            return delay
+
+        tasks = [node_loop.create_task(node(index + 1)) for index, node_loop in enumerate(nodes)]
+        self.assertEqual(self.cluster.run_until_complete(tasks[-1]), 3)
+        self.assertEqual(seen, nodes)
+        self.assertEqual(self.cluster.time() - self.start, 3)
+
+    def test_deadlock(self):
+        event_loop = self.cluster.new_loop()
+        future = event_loop.create_future()
+        with self.assertRaises(loop.DeadlockError):
+            self.cluster.run_until_complete(future)
+
+    def test_run_until_done_max_time(self):
+        event_loop = self.cluster.new_loop()
+        future = event_loop.create_future()
+        event_loop.call_later(10, future.set_result, None)
+
+        advancement = self.cluster.run_until_done(future, max_time=5)
+        self.assertFalse(future.done())
+        self.assertEqual(advancement.elapsed, 5)
+
+        self.cluster.run_until_done(future)
+        self.assertTrue(future.done())
+        self.assertEqual(self.cluster.time() - self.start, 10)
+
+    def test_cancelled_timers_are_skipped(self):
+        event_loop = self.cluster.new_loop()
+        event_loop.call_later(1, self.record, event_loop, 'cancelled').cancel()
+        event_loop.call_later(2, self.record, event_loop, 'kept')
+        self.assertFalse(self.cluster.is_idle())
+
+        self.cluster.run_until_idle()
+        self.assertEqual(self.events, [('kept', 2)])
+        self.assertTrue(self.cluster.is_idle())
+
+    def test_earlier_timer_after_later_one(self):
+        event_loop = self.cluster.new_loop()
+        event_loop.call_later(5, self.record, event_loop, 'later')
+        event_loop.call_later(1, self.record, event_loop, 'sooner')
+        self.cluster.run_until_idle()
+        self.assertEqual(self.events, [('sooner', 1), ('later', 5)])
+
+    def test_loops_take_turns(self):
+        first = self.cluster.new_loop()
+        second = self.cluster.new_loop()
+
+        def spin(event_loop, name, times):
+            self.events.append(name)
+            if times > 1:
+                event_loop.call_soon(spin, event_loop, name, times - 1)
+
+        first.call_soon(spin, first, 'first', 3)
+        second.call_soon(spin, second, 'second', 3)
+        self.cluster.advance(0)
+        self.assertEqual(self.events, ['first', 'second'] * 3)
+
+    def test_add_existing_loop(self):
+        event_loop = loop.TimeTravelingTestLoop()
+        event_loop.call_later(1, self.record, event_loop, 'timer')
+        self.cluster.add(event_loop)
+        with self.assertRaises(ValueError):
+            Cluster().add(event_loop)
+
+        self.cluster.run_until_idle()
+        self.assertEqual(self.events, [('timer', 1)])
+
+    def test_remove(self):
+        first = self.cluster.new_loop()
+        second = self.cluster.new_loop()
+        second.call_later(1, self.record, second, 'removed')
+        self.cluster.advance(2)
+        self.events.clear()
+
+        second.call_later(1, self.record, second, 'removed')
+        self.cluster.remove(second)
+        self.cluster.advance(2)
+        self.assertEqual(self.events, [])
+        self.assertEqual(second.time() - self.start, 2)
+        self.assertEqual(self.cluster.loops, [first])
+
+        second.advance(1)
+        self.assertEqual(self.events, [('removed', 3)])
+        second.close()
+
+    def test_many_loops(self):
+        rng = random.Random(7)
+        ticks = []
+
+        def heartbeat(event_loop, period):
+            ticks.append(event_loop.time())
+            event_loop.call_later(period, heartbeat, event_loop, period)
+
+        expected = 0
+        for _ in range(300):
+            period = rng.choice([0.5, 1.0, 1.5, 2.0])
+            event_loop = self.cluster.new_loop()
+            event_loop.call_soon(heartbeat, event_loop, period)
+            expected += int(10 / period) + 1
+
+        self.cluster.advance(10)
+        self.assertEqual(len(ticks), expected)
+        self.assertEqual(ticks, sorted(ticks))
+        self.assertEqual(self.cluster.callbacks_run, expected)
+        # Only the next deadline of each loop is ever on the heap, give or take a few stale entries.
+        self.assertLess(len(self.cluster._deadlines), 2 * len(self.cluster.loops))
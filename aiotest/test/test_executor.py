@@ -0,0 +1,128 @@
+import asyncio
+import concurrent.futures
+import threading
+import unittest
+
+from aiotest import loop
+from aiotest.executor import InlineExecutor, virtual_cost
+
+
+class InlineExecutorTests(unittest.TestCase):
+
+    def test_submit(self):
+        future = InlineExecutor().submit(pow, 2, 10)
+        self.assertTrue(future.done())
+        self.assertEqual(1024, future.result())
+
+    def test_submit_exception(self):
+        future = InlineExecutor().submit(int, 'not a number')
+        self.assertIsInstance(future.exception(), ValueError)
+
+    def test_same_thread(self):
+        future = InlineExecutor().submit(threading.get_ident)
+        self.assertEqual(threading.get_ident(), future.result())
+
+    def test_shutdown(self):
+        executor = InlineExecutor()
+        executor.shutdown()
+        self.assertRaises(RuntimeError, executor.submit, print)
+
+
+class RunInExecutorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+        self.start = self.event_loop.time()
+
+    def test_default_executor(self):
+        """
+        With no cost declared, the result is ready on the next pass of the loop.
+        """
+        future = self.event_loop.run_in_executor(None, pow, 2, 10)
+        self.assertFalse(future.done())
+
+        self.event_loop.advance(0)
+
+        self.assertEqual(1024, future.result())
+        self.assertEqual(self.start, self.event_loop.time())
+
+    def test_exception(self):
+        future = self.event_loop.run_in_executor(None, int, 'not a number')
+        self.event_loop.advance(0)
+        self.assertIsInstance(future.exception(), ValueError)
+
+    def test_declared_cost(self):
+        """
+        A function's declared virtual cost is charged to the loop clock.
+        """
+        @virtual_cost(3.0)
+        def slow():
+            return 'done'
+
+        future = self.event_loop.run_in_executor(None, slow)
+
+        self.event_loop.advance(2.9)
+        self.assertFalse(future.done())
+        self.event_loop.advance(0.1)
+        self.assertEqual('done', future.result())
+
+    def test_executor_cost(self):
+        """
+        Functions without a declared cost are charged the executor's cost.
+        """
+        self.event_loop.set_default_executor(InlineExecutor(cost=2.0))
+
+        future = self.event_loop.run_in_executor(None, pow, 2, 10)
+        result = self.event_loop.run_until_idle()
+
+        self.assertEqual(1024, future.result())
+        self.assertEqual(2.0, result.elapsed)
+
+    def test_ordering(self):
+        """
+        Results arrive in order of virtual cost, and in order of submission
+        when the costs are the same.
+        """
+        order = []
+
+        for name, cost in [('a', 2.0), ('b', 1.0), ('c', 0.0), ('d', 1.0)]:
+            future = self.event_loop.run_in_executor(InlineExecutor(cost), str, name)
+            future.add_done_callback(lambda f: order.append(f.result()))
+
+        self.event_loop.run_until_idle()
+
+        self.assertEqual(['c', 'b', 'd', 'a'], order)
+
+    def test_cancelled(self):
+        future = self.event_loop.run_in_executor(InlineExecutor(1.0), pow, 2, 10)
+        future.cancel()
+        self.event_loop.run_until_idle()
+        self.assertTrue(future.cancelled())
+
+    def test_real_executor(self):
+        """
+        A real thread pool can still be used, and its results arrive on the virtual clock.
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+
+        @virtual_cost(5.0)
+        def in_thread():
+            return threading.get_ident()
+
+        future = self.event_loop.run_in_executor(executor, in_thread)
+        result = self.event_loop.run_until_idle()
+
+        self.assertNotEqual(threading.get_ident(), future.result())
+        self.assertEqual(5.0, result.elapsed)
+
+    def test_coroutine(self):
+        @asyncio.coroutine
+        def offload():
+            return (yield from self.event_loop.run_in_executor(InlineExecutor(0.5), sum, [1, 2, 3]))
+
+        future = asyncio.ensure_future(offload(), loop=self.event_loop)
+        self.event_loop.run_until_idle()
+
+        self.assertEqual(6, future.result())
+        self.assertEqual(self.start + 0.5, self.event_loop.time())
@@ -0,0 +1,182 @@
+import asyncio
+import unittest
+
+from aiotest import loop, TestCase
+from aiotest.explore import explore, replay
+
+
+class ExploreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def racing_writers(self, *names):
+        """
+        A scenario that only passes if its writers, who all wake up at the
+        same moment, finish in the order they were started.
+        """
+        def scenario():
+            log = []
+
+            @asyncio.coroutine
+            def writer(name):
+                yield from asyncio.sleep(1.0, loop=self.event_loop)
+                log.append(name)
+
+            @asyncio.coroutine
+            def main():
+                # gather() would start coroutines in no particular order.
+                writers = [self.event_loop.create_task(writer(name)) for name in names]
+                yield from asyncio.gather(*writers, loop=self.event_loop)
+                assert log == list(names), log
+                return log
+
+            return main()
+        return scenario
+
+    def test_fifo_by_default(self):
+        scenario = self.racing_writers('a', 'b', 'c')
+        self.assertEqual(self.event_loop.run_until_complete(scenario()), ['a', 'b', 'c'])
+
+    def test_exhaustive(self):
+        report = explore(self.event_loop, self.racing_writers('a', 'b'), exhaustive=True)
+
+        # Two picks each for the writers' first steps, their timers, and their wake ups, then gather()'s callbacks.
+        self.assertTrue(report.complete)
+        self.assertEqual(report.runs, 16)
+        self.assertEqual(len(report.interleavings), 16)
+        self.assertEqual(len(report.failures), 8)
+        self.assertEqual(report.outcomes()["returned ['a', 'b']"], 8)
+        self.assertEqual(report.interleavings[0].choices, (0, 0, 0, 0))
+
+    def test_ready_handles(self):
+        """
+        Handles on the ready FIFO are reordered too, not just timers that fall due together.
+        """
+        def scenario():
+            log = []
+
+            @asyncio.coroutine
+            def writer(name):
+                log.append(name)
+                yield from asyncio.sleep(0, loop=self.event_loop)
+
+            @asyncio.coroutine
+            def main():
+                writers = [self.event_loop.create_task(writer(name)) for name in 'ab']
+                yield from asyncio.wait(writers, loop=self.event_loop)
+                return log
+
+            return main()
+
+        report = explore(self.event_loop, scenario, exhaustive=True)
+        self.assertTrue(report.complete)
+        self.assertEqual(set(report.outcomes()), {"returned ['a', 'b']", "returned ['b', 'a']"})
+
+    def test_exhaustive_bounded_by_runs(self):
+        report = explore(self.event_loop, self.racing_writers('a', 'b', 'c'), runs=4, exhaustive=True)
+        self.assertFalse(report.complete)
+        self.assertEqual(report.runs, 4)
+
+    def test_max_decisions(self):
+        report = explore(self.event_loop, self.racing_writers('a', 'b', 'c'), exhaustive=True, max_decisions=1)
+        self.assertTrue(report.complete)
+        self.assertEqual(len(report.interleavings), 3)
+
+    def test_random_deduplicates(self):
+        report = explore(self.event_loop, self.racing_writers('a', 'b'), runs=50, seed=1)
+        self.assertEqual(report.runs, 50)
+        self.assertEqual(len(report.interleavings), 16)
+        self.assertEqual(len(report.failures), 8)
+        self.assertIsInstance(report.failures[0].error, AssertionError)
+        self.assertIn("16 distinct interleavings in 50 runs, 8 failed", report.summary())
+
+    def test_random_is_seeded(self):
+        first = explore(self.event_loop, self.racing_writers('a', 'b', 'c', 'd'), runs=10, seed=3)
+        second = explore(self.event_loop, self.racing_writers('a', 'b', 'c', 'd'), runs=10, seed=3)
+        self.assertEqual([interleaving[:2] for interleaving in first.interleavings],
+                         [interleaving[:2] for interleaving in second.interleavings])
+
+    def test_replay(self):
+        report = explore(self.event_loop, self.racing_writers('a', 'b'), exhaustive=True)
+        failure = report.failures[0]
+        with self.assertRaises(AssertionError):
+            replay(self.event_loop, self.racing_writers('a', 'b'), failure.choices)
+        self.assertEqual(replay(self.event_loop, self.racing_writers('a', 'b'), (0,)), ['a', 'b'])
+
+    def test_never_finishes(self):
+        def scenario():
+            return self.event_loop.create_future()
+
+        report = explore(self.event_loop, scenario, runs=3)
+        self.assertEqual(report.runs, 3)
+        self.assertEqual(len(report.interleavings), 1)
+        self.assertIsInstance(report.failures[0].error, loop.DeadlockError)
+
+    def test_max_time(self):
+        def scenario():
+            return asyncio.sleep(10.0, loop=self.event_loop)
+
+        report = explore(self.event_loop, scenario, runs=1, max_time=5)
+        self.assertIsInstance(report.failures[0].error, asyncio.TimeoutError)
+        self.assertTrue(self.event_loop.is_idle())
+
+    def test_reset_between_runs(self):
+        starts = []
+
+        @asyncio.coroutine
+        def scenario():
+            starts.append(self.event_loop.time())
+            yield from asyncio.sleep(1.0, loop=self.event_loop)
+
+        explore(self.event_loop, scenario, runs=3)
+        self.assertEqual(len(starts), 3)
+        self.assertEqual(len(set(starts)), 1)
+
+    def test_servers_kept_between_runs(self):
+        """
+        Only the schedule is reset between runs: servers set up beforehand are still listening.
+        """
+        server = self.event_loop.run_until_complete(self.event_loop.create_server(asyncio.Protocol, port=8080))
+
+        @asyncio.coroutine
+        def scenario():
+            transport, _ = yield from self.event_loop.create_connection(asyncio.Protocol, port=8080)
+            transport.close()
+
+        report = explore(self.event_loop, scenario, runs=3)
+        self.assertEqual(report.failures, [])
+        server.close()
+
+
+class ExploreInterleavingsTests(TestCase):
+
+    def test_race_found(self):
+        @asyncio.coroutine
+        def scenario():
+            log = []
+
+            @asyncio.coroutine
+            def writer(name):
+                yield from asyncio.sleep(1.0)
+                log.append(name)
+
+            writers = [asyncio.ensure_future(writer('a')), asyncio.ensure_future(writer('b'))]
+            yield from asyncio.gather(*writers)
+            self.assertEqual(log, ['a', 'b'])
+
+        with self.assertRaisesRegex(self.failureException, r'8 of 16 interleavings failed.*choices \(0, 0, 1, 0\)'):
+            self.exploreInterleavings(scenario, exhaustive=True)
+
+    def test_no_race(self):
+        @asyncio.coroutine
+        def scenario():
+            sleeps = [asyncio.ensure_future(asyncio.sleep(1.0, result=result)) for result in 'ab']
+            return (yield from asyncio.gather(*sleeps))
+
+        report = self.exploreInterleavings(scenario, exhaustive=True)
+        self.assertTrue(report.complete)
+        self.assertEqual(list(report.outcomes()), ["returned ['a', 'b']"])
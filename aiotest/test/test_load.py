@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+from array import array
+from collections import Counter
+
+from aiotest import TestCase
+from aiotest.load import LoadReport, burst, poisson, simulate_load, uniform
+from aiotest.loop import TimeTravelingTestLoop
+
+
+class LoadReportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.report = LoadReport(array('d', [float(latency) for latency in range(100, 0, -1)]), Counter(), 0, 50.0)
+
+    def test_percentiles(self):
+        self.assertEqual(1, self.report.percentile(0))
+        self.assertEqual(50, self.report.percentile(50))
+        self.assertEqual(99, self.report.percentile(99))
+        self.assertEqual(100, self.report.percentile(99.9))
+        self.assertEqual(100, self.report.percentile(100))
+        self.assertRaises(ValueError, self.report.percentile, 101)
+
+    def test_stats(self):
+        self.assertEqual(100, self.report.completed)
+        self.assertEqual(50.5, self.report.mean)
+        self.assertEqual(100, self.report.max)
+        self.assertEqual(2, self.report.throughput)
+
+    def test_histogram(self):
+        self.assertEqual([(10, 10), (50, 40), (float('inf'), 50)], self.report.histogram([50, 10]))
+        self.assertEqual([(10.0 * bucket, 10) for bucket in range(1, 11)] + [(float('inf'), 0)], self.report.histogram())
+
+    def test_empty(self):
+        report = LoadReport(array('d'), Counter(), 3, 0.0)
+        self.assertEqual(0, report.percentile(50))
+        self.assertEqual(0, report.mean)
+        self.assertIn("0 completed, 0 failed, 3 incomplete", report.summary())
+
+
+class SimulateLoadTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = TimeTravelingTestLoop()
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def server(self, service_time, capacity):
+        """
+        A client that queues for one of ``capacity`` slots, then takes ``service_time`` to be served.
+        """
+        slots = asyncio.Semaphore(capacity, loop=self.event_loop)
+
+        @asyncio.coroutine
+        def client(index):
+            with (yield from slots):
+                yield from asyncio.sleep(service_time, loop=self.event_loop)
+        return client
+
+    def test_uniform_without_queueing(self):
+        report = simulate_load(self.event_loop, self.server(0.5, 10), 100, uniform(10))
+
+        self.assertEqual(100, report.completed)
+        self.assertEqual([0.5] * 100, [round(latency, 6) for latency in report.latencies])
+        self.assertAlmostEqual(10.4, report.elapsed, places=6)
+
+    def test_burst_queues(self):
+        report = simulate_load(self.event_loop, self.server(1, 10), 100, burst())
+
+        # Ten at a time: the last ten wait for the nine batches ahead of them.
+        self.assertAlmostEqual(1, report.percentile(10), places=6)
+        self.assertAlmostEqual(10, report.percentile(100), places=6)
+        self.assertEqual([(float(batch), 10) for batch in range(1, 11)] + [(float('inf'), 0)],
+                         [(round(bound, 6), count) for bound, count in report.histogram()])
+
+    def test_seeded_poisson(self):
+        first = simulate_load(self.event_loop, self.server(0.01, 4), 1000, poisson(200), seed=42)
+        second = simulate_load(self.event_loop, self.server(0.01, 4), 1000, poisson(200), seed=42)
+        other = simulate_load(self.event_loop, self.server(0.01, 4), 1000, poisson(200), seed=7)
+
+        self.assertEqual(first.latencies, second.latencies)
+        self.assertNotEqual(first.latencies, other.latencies)
+        # About 200 arrivals a second.
+        self.assertAlmostEqual(5, first.elapsed, delta=1)
+
+    def test_errors(self):
+        @asyncio.coroutine
+        def client(index):
+            yield from asyncio.sleep(1, loop=self.event_loop)
+            if index % 4 == 0:
+                raise ConnectionResetError()
+
+        report = simulate_load(self.event_loop, client, 100, uniform(100))
+
+        self.assertEqual(75, report.completed)
+        self.assertEqual({'ConnectionResetError': 25}, report.errors)
+
+    def test_max_time(self):
+        report = simulate_load(self.event_loop, self.server(1, 1), 100, uniform(10), max_time=5)
+
+        self.assertEqual(5, report.completed)
+        self.assertEqual(95, report.incomplete)
+        self.assertAlmostEqual(5, report.elapsed, places=6)
+        self.assertFalse(self.event_loop.leaks())
+
+    def test_ten_thousand_clients(self):
+        report = simulate_load(self.event_loop, self.server(0.05, 1000), 10000, poisson(10000))
+
+        self.assertEqual(10000, report.completed)
+        self.assertGreaterEqual(report.percentile(50), 0.05 - 1e-6)
+
+
+class SimulateLoadTestCaseTests(TestCase):
+
+    def test_simulate_load(self):
+        @asyncio.coroutine
+        def client(index):
+            yield from asyncio.sleep(0.1)
+
+        report = self.simulateLoad(client, 50, uniform(5))
+
+        self.assertEqual(50, report.completed)
+        self.assertAlmostEqual(0.1, report.percentile(99), places=6)
@@ -1,5 +1,6 @@
 import unittest
 import asyncio
+import sys
 
 from aiotest import loop
 
@@ -33,6 +34,70 @@ class TestableHandleTest(unittest.TestCase):
         t.cancel()
         self.assertTrue(t.cancelled)
 
+    def test_task_order_ties(self):
+        """
+        Handles due at the same time are ordered by their sequence number.
+        """
+        t1 = loop.TestableHandle(1.5, print, [], seq=1)
+        t2 = loop.TestableHandle(1.5, print, [], seq=2)
+        t3 = loop.TestableHandle(1.0, print, [], seq=3)
+
+        self.assertTrue(t1 < t2)
+        self.assertFalse(t2 < t1)
+        self.assertEqual([t3, t1, t2], sorted([t2, t1, t3]))
+
+    def test_smaller_than_timer_handle(self):
+        event_loop = loop.TimeTravelingTestLoop()
+        self.addCleanup(event_loop.close)
+
+        self.assertFalse(hasattr(loop.TestableHandle(1, print, []), '__dict__'))
+        self.assertLess(sys.getsizeof(loop.TestableHandle(1, print, [])),
+                        sys.getsizeof(asyncio.TimerHandle(1, print, [], event_loop)))
+
+    def test_loop_allocates(self):
+        event_loop = loop.TimeTravelingTestLoop()
+        self.addCleanup(event_loop.close)
+
+        timer = event_loop.call_later(10, print)
+        self.assertIsInstance(timer, loop.TestableHandle)
+        self.assertEqual(event_loop.time() + 10, timer.when)
+
+        timer.cancel()
+        self.assertEqual(1, event_loop.cancelled_count)
+        self.assertIsNone(timer.callback)
+
+    def test_fifo_ties_on_loop(self):
+        """
+        Timers due at the same moment run in the order they were scheduled, however many there are.
+        """
+        event_loop = loop.TimeTravelingTestLoop()
+        self.addCleanup(event_loop.close)
+        calls = []
+
+        when = event_loop.time() + 5
+        for i in range(100):
+            event_loop.call_at(when + (i % 3), calls.append, i)
+        event_loop.advance(10)
+
+        self.assertEqual([i for i in range(100) if i % 3 == 0] + [i for i in range(100) if i % 3 == 1] +
+                         [i for i in range(100) if i % 3 == 2], calls)
+
+    def test_exception_in_callback(self):
+        event_loop = loop.TimeTravelingTestLoop()
+        self.addCleanup(event_loop.close)
+        contexts = []
+        event_loop.set_exception_handler(lambda event_loop, context: contexts.append(context))
+
+        def boom():
+            raise ValueError("boom")
+
+        timer = event_loop.call_later(1, boom)
+        event_loop.advance(1)
+
+        self.assertEqual(1, len(contexts))
+        self.assertIs(timer, contexts[0]['handle'])
+        self.assertIsInstance(contexts[0]['exception'], ValueError)
+
 class TimeTravelingTestLoopTest(unittest.TestCase):
     def setUp(self):
         self.f = asyncio.Future()
@@ -271,8 +336,259 @@ class TestLoopCoroutineTests(unittest.TestCase):
 
         self.assertEqual(calls, [5])
 
-        # This doesn't work, but for understandable reason.  But should it?
-        # self.event_loop.run_until_complete(takes_5_seconds())
+        start = self.event_loop.time()
+        self.event_loop.run_until_complete(takes_5_seconds())
+        self.assertEqual(calls, [5, 5])
+        self.assertAlmostEqual(5, self.event_loop.time() - start, places=6)
+
+
+class TestLoopRunForeverTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def test_run_until_complete_jumps_to_deadlines(self):
+        """
+        run_until_complete() jumps the clock straight to each deadline
+        instead of waiting for it.
+        """
+        @asyncio.coroutine
+        def sleepy():
+            yield from asyncio.sleep(3600, loop=self.event_loop)
+            yield from asyncio.sleep(1800, loop=self.event_loop)
+            return 'rested'
+
+        start = self.event_loop.time()
+        self.assertEqual('rested', self.event_loop.run_until_complete(sleepy()))
+        self.assertEqual(5400, self.event_loop.time() - start)
+
+    def test_run_until_complete_leaves_later_timers(self):
+        start = self.event_loop.time()
+        later = []
+        self.event_loop.call_later(100, later.append, 100)
+
+        self.event_loop.run_until_complete(asyncio.sleep(10, loop=self.event_loop))
+
+        self.assertEqual(10, self.event_loop.time() - start)
+        self.assertEqual([], later)
+        self.assertEqual(1, self.event_loop.scheduled_count)
+
+    def test_run_until_complete_deadlock(self):
+        """
+        Waiting on a future nothing will ever resolve raises DeadlockError,
+        rather than hanging.
+        """
+        @asyncio.coroutine
+        def stuck():
+            yield from asyncio.Future(loop=self.event_loop)
+
+        with self.assertRaisesRegex(loop.DeadlockError, "can never complete"):
+            self.event_loop.run_until_complete(stuck())
+
+        self.assertFalse(self.event_loop.is_running())
+
+    def test_run_until_complete_runs_due_timers_while_busy(self):
+        """
+        A coroutine spinning on sleep(0) keeps the ready FIFO from ever
+        emptying, but timers that are already due still get their turn.
+        """
+        fired = []
+        self.event_loop.call_later(0, fired.append, True)
+
+        @asyncio.coroutine
+        def spin():
+            while not fired:
+                yield from asyncio.sleep(0, loop=self.event_loop)
+            return 'fired'
+
+        start = self.event_loop.time()
+        self.assertEqual('fired', self.event_loop.run_until_complete(spin()))
+        self.assertEqual(0, self.event_loop.time() - start)
+
+    def test_run_forever_until_stopped(self):
+        start = self.event_loop.time()
+        self.event_loop.call_later(60, self.event_loop.stop)
+
+        self.event_loop.run_forever()
+
+        self.assertEqual(60, self.event_loop.time() - start)
+        self.assertFalse(self.event_loop.is_running())
+
+    def test_run_forever_deadlock(self):
+        with self.assertRaises(loop.DeadlockError):
+            self.event_loop.run_forever()
+
+    def test_stop_runs_one_iteration(self):
+        """
+        Like any other loop, stopping before run_forever() runs whatever is
+        ready, and nothing it makes ready.
+        """
+        calls = []
+
+        def first():
+            calls.append(1)
+            self.event_loop.call_soon(calls.append, 2)
+
+        self.event_loop.call_soon(first)
+        self.event_loop.stop()
+        self.event_loop.run_forever()
+        self.assertEqual([1], calls)
+
+        self.event_loop.stop()
+        self.event_loop.run_forever()
+        self.assertEqual([1, 2], calls)
+
+    def test_stop_with_nothing_to_run(self):
+        start = self.event_loop.time()
+        self.event_loop.call_later(10, lambda: None)
+        self.event_loop.stop()
+        self.event_loop.run_forever()
+
+        self.assertEqual(10, self.event_loop.time() - start)
+
+    def test_is_running(self):
+        running = []
+        self.event_loop.call_soon(lambda: running.append(self.event_loop.is_running()))
+        self.event_loop.call_soon(self.event_loop.stop)
+
+        self.assertFalse(self.event_loop.is_running())
+        self.event_loop.run_forever()
+        self.assertEqual([True], running)
+
+    def test_close(self):
+        self.event_loop.close()
+
+        self.assertTrue(self.event_loop.is_closed())
+        with self.assertRaises(RuntimeError):
+            self.event_loop.run_forever()
+
+
+class TestLoopCounterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def test_counters(self):
+        """
+        Every way of running the loop counts the batches and callbacks it runs.
+        """
+        self.event_loop.call_soon(print_nothing)
+        self.event_loop.call_soon(print_nothing)
+        self.event_loop.call_later(5, print_nothing)
+        self.event_loop.call_later(5, print_nothing).cancel()
+        self.event_loop.advance(10)
+        self.assertEqual((1, 3), (self.event_loop.iterations, self.event_loop.callbacks_run))
+
+        self.event_loop.call_later(5, print_nothing)
+        self.event_loop.run_until_idle()
+        self.assertEqual((2, 4), (self.event_loop.iterations, self.event_loop.callbacks_run))
+
+        self.event_loop.run_until_complete(asyncio.sleep(5, loop=self.event_loop))
+        self.assertGreater(self.event_loop.iterations, 3)
+        self.assertGreater(self.event_loop.callbacks_run, 4)
+
+    def test_peak_scheduled(self):
+        """
+        The scheduled heap's high water mark counts cancelled Handles still on it.
+        """
+        for delay in range(3):
+            self.event_loop.call_later(delay, print_nothing)
+        self.event_loop.call_later(5, print_nothing).cancel()
+        self.event_loop.advance(10)
+        self.event_loop.call_later(1, print_nothing)
+
+        self.assertEqual(4, self.event_loop.peak_scheduled)
+
+
+def print_nothing():
+    pass
+
+
+class TestLoopLeakTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def test_no_leaks(self):
+        self.event_loop.run_until_complete(asyncio.sleep(10, loop=self.event_loop))
+        self.event_loop.call_later(10, print).cancel()
+
+        self.assertFalse(self.event_loop.leaks())
+
+    def test_leaks(self):
+        @asyncio.coroutine
+        def boom():
+            raise ValueError("boom")
+
+        pending = self.event_loop.create_task(asyncio.sleep(60, loop=self.event_loop))
+        failed = self.event_loop.create_task(boom())
+        self.event_loop.advance(0)
+        timer = self.event_loop.call_later(30, print)
+        soon = self.event_loop.call_soon(print)
+
+        leaks = self.event_loop.leaks()
+
+        self.assertTrue(leaks)
+        self.assertEqual([pending], leaks.tasks)
+        self.assertEqual([failed], leaks.exceptions)
+        # The ready Handle comes first, then the timers in order.
+        self.assertEqual(soon, leaks.handles[0])
+        self.assertEqual(timer, leaks.handles[1])
+        self.assertIn("never retrieved", leaks.describe())
+
+        failed.exception()
+        self.assertEqual([], self.event_loop.leaks().exceptions)
+        self.event_loop.reset()
+
+    def test_cancel_pending_tasks(self):
+        cancelled = []
+
+        @asyncio.coroutine
+        def sleeper():
+            try:
+                yield from asyncio.sleep(60, loop=self.event_loop)
+            except asyncio.CancelledError:
+                cancelled.append(self.event_loop.time())
+                raise
+
+        start = self.event_loop.time()
+        task = self.event_loop.create_task(sleeper())
+        self.event_loop.advance(1)
+
+        self.assertEqual(1, self.event_loop.cancel_pending_tasks())
+        self.assertTrue(task.cancelled())
+        self.assertEqual([start + 1], cancelled)
+        self.assertFalse(self.event_loop.leaks())
+
+    def test_reset_forgets_tasks(self):
+        task = self.event_loop.create_task(asyncio.sleep(60, loop=self.event_loop))
+        self.event_loop.reset()
+
+        self.assertTrue(task.cancelled())
+        self.assertFalse(self.event_loop.leaks())
+
+    def test_cancel_pending_tasks_polling(self):
+        """
+        A callback that keeps rescheduling itself doesn't keep cancel_pending_tasks() going forever.
+        """
+        def poll():
+            self.event_loop.call_soon(poll)
+
+        task = self.event_loop.create_task(asyncio.sleep(60, loop=self.event_loop))
+        self.event_loop.call_soon(poll)
+
+        self.assertEqual(1, self.event_loop.cancel_pending_tasks())
+        self.assertTrue(task.cancelled())
+
 
 class TestLoopRealtimeTests(unittest.TestCase):
 
@@ -322,3 +638,285 @@ class TestLoopInclusionTests(unittest.TestCase):
         # self.assertEqual(calls, [4.0])
 
         # self.assertEqual([1234, 2057, 5643, 667], exec_order_list)
+
+
+class TestLoopFastForwardTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+
+    def test_advance_reports_progress(self):
+        """
+        advance() reports how far it travelled and how many callbacks it ran.
+        """
+        calls = []
+
+        self.event_loop.call_soon(calls.append, 1)
+        self.event_loop.call_later(2.0, calls.append, 2)
+
+        result = self.event_loop.advance(5.0)
+
+        self.assertEqual(result, loop.Advancement(elapsed=5.0, callbacks=2))
+
+    def test_advance_to_next_jumps_to_deadline(self):
+        """
+        advance_to_next() lands exactly on the next deadline and runs
+        everything due at that instant, but nothing later.
+        """
+        start = self.event_loop.time()
+        calls = []
+
+        self.event_loop.call_later(10.0, calls.append, 1)
+        self.event_loop.call_later(10.0, calls.append, 2)
+        self.event_loop.call_later(20.0, calls.append, 3)
+
+        result = self.event_loop.advance_to_next()
+
+        self.assertEqual(result, loop.Advancement(elapsed=10.0, callbacks=2))
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertEqual(start + 10.0, self.event_loop.time())
+
+    def test_advance_to_next_skips_cancelled(self):
+        """
+        Cancelled handles don't count as a deadline worth jumping to.
+        """
+        start = self.event_loop.time()
+        calls = []
+
+        self.event_loop.call_later(5.0, calls.append, 5).cancel()
+        self.event_loop.call_later(8.0, calls.append, 8)
+
+        self.event_loop.advance_to_next()
+
+        self.assertEqual(calls, [8])
+        self.assertEqual(start + 8.0, self.event_loop.time())
+
+    def test_advance_to_next_idle(self):
+        """
+        With nothing to do, advance_to_next() doesn't move the clock.
+        """
+        start = self.event_loop.time()
+        self.assertEqual(self.event_loop.advance_to_next(), loop.Advancement(elapsed=0, callbacks=0))
+        self.assertEqual(start, self.event_loop.time())
+
+    def test_run_until_idle(self):
+        """
+        run_until_idle() follows timers that schedule further timers, and stops
+        at the last one instead of at some arbitrary point in the future.
+        """
+        start = self.event_loop.time()
+        call_times = []
+
+        def tick(remaining):
+            call_times.append(self.event_loop.time() - start)
+            if remaining:
+                self.event_loop.call_later(3600.0, tick, remaining - 1)
+
+        self.event_loop.call_soon(tick, 24 * 7)
+
+        result = self.event_loop.run_until_idle()
+
+        self.assertEqual(result, loop.Advancement(elapsed=3600.0 * 24 * 7, callbacks=24 * 7 + 1))
+        self.assertEqual(call_times[-1], 3600.0 * 24 * 7)
+        self.assertEqual(start + 3600.0 * 24 * 7, self.event_loop.time())
+
+    def test_run_until_idle_max_time(self):
+        """
+        run_until_idle() won't run anything scheduled past max_time, and leaves
+        the clock at exactly max_time.
+        """
+        start = self.event_loop.time()
+        calls = []
+
+        self.event_loop.call_later(1.0, calls.append, 1)
+        self.event_loop.call_later(3.0, calls.append, 3)
+
+        result = self.event_loop.run_until_idle(max_time=2.0)
+
+        self.assertEqual(result, loop.Advancement(elapsed=2.0, callbacks=1))
+        self.assertEqual(calls, [1])
+        self.assertEqual(start + 2.0, self.event_loop.time())
+
+    def test_run_until_idle_invalid(self):
+        self.assertRaises(ValueError, self.event_loop.run_until_idle, -1.0)
+
+    def test_run_until_done(self):
+        """
+        run_until_done() stops once the future is done, even with timers still to come.
+        """
+        f = asyncio.Future(loop=self.event_loop)
+        self.event_loop.call_later(5.0, f.set_result, 'done')
+        self.event_loop.call_later(50.0, print)
+
+        result = self.event_loop.run_until_done(f)
+
+        self.assertEqual('done', f.result())
+        self.assertEqual(5.0, result.elapsed)
+        self.assertFalse(self.event_loop.is_idle())
+
+    def test_run_until_done_polling(self):
+        """
+        run_until_done() stops once the future is done, even with a callback that keeps calling itself soon.
+        """
+        f = asyncio.Future(loop=self.event_loop)
+        polls = []
+
+        def poll():
+            polls.append(self.event_loop.time())
+            if len(polls) == 3:
+                f.set_result('done')
+            self.event_loop.call_soon(poll)
+
+        self.event_loop.call_later(1.0, poll)
+        result = self.event_loop.run_until_done(f)
+
+        self.assertEqual('done', f.result())
+        self.assertEqual(1.0, result.elapsed)
+        self.assertEqual(3, len(polls))
+
+    def test_run_until_done_runs_due_timers_while_busy(self):
+        """
+        run_until_done() still runs timers that are already due while a coroutine spins on sleep(0).
+        """
+        fired = []
+        self.event_loop.call_later(0, fired.append, True)
+
+        @asyncio.coroutine
+        def spin():
+            while not fired:
+                yield from asyncio.sleep(0, loop=self.event_loop)
+
+        task = self.event_loop.create_task(spin())
+        result = self.event_loop.run_until_done(task, max_time=1.0)
+
+        self.assertTrue(task.done())
+        self.assertEqual([True], fired)
+        self.assertEqual(0, result.elapsed)
+
+    def test_run_until_done_gives_up(self):
+        """
+        run_until_done() gives up when there's nothing left to run, or once max_time is up.
+        """
+        f = asyncio.Future(loop=self.event_loop)
+        self.event_loop.call_later(5.0, print)
+
+        self.assertEqual(5.0, self.event_loop.run_until_done(f).elapsed)
+        self.assertFalse(f.done())
+        self.assertTrue(self.event_loop.is_idle())
+
+        self.event_loop.call_later(5.0, f.set_result, 'done')
+
+        self.assertEqual(2.0, self.event_loop.run_until_done(f, max_time=2.0).elapsed)
+        self.assertFalse(f.done())
+
+
+class TestLoopCompactionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop(compact_fraction=0.5, compact_minimum=100)
+
+    def test_cancelled_count(self):
+        """
+        Cancelled handles are counted while they're on the heap, and stop being
+        counted once they're popped off of it.
+        """
+        self.event_loop.call_later(1.0, print).cancel()
+        self.event_loop.call_later(2.0, print).cancel()
+        self.event_loop.call_later(3.0, print)
+
+        self.assertEqual(2, self.event_loop.cancelled_count)
+        self.assertEqual(3, self.event_loop.scheduled_count)
+
+        self.event_loop.advance(2.5)
+
+        self.assertEqual(0, self.event_loop.cancelled_count)
+        self.assertEqual(1, self.event_loop.scheduled_count)
+
+    def test_cancel_after_ready(self):
+        """
+        Cancelling a handle that already left the heap doesn't count against it.
+        """
+        handles = []
+
+        def cancel_other():
+            handles[1].cancel()
+
+        handles.append(self.event_loop.call_later(1.0, cancel_other))
+        handles.append(self.event_loop.call_later(1.0, print))
+
+        self.event_loop.advance(1.0)
+
+        self.assertEqual(0, self.event_loop.cancelled_count)
+
+    def test_heap_stays_bounded(self):
+        """
+        Creating and cancelling lots of timeouts doesn't grow the heap without bound.
+        """
+        calls = []
+
+        for i in range(10000):
+            self.event_loop.call_later(60.0, calls.append, i).cancel()
+
+        self.event_loop.call_later(30.0, calls.append, 'kept')
+
+        self.assertLessEqual(self.event_loop.scheduled_count, 200)
+        self.assertGreater(self.event_loop.compactions, 0)
+        self.assertGreaterEqual(self.event_loop.compacted_handles, 9800)
+
+        self.event_loop.advance(120.0)
+
+        self.assertEqual(['kept'], calls)
+        self.assertEqual(0, self.event_loop.cancelled_count)
+        self.assertEqual(0, self.event_loop.scheduled_count)
+
+    def test_compaction_keeps_order(self):
+        """
+        Live handles still run in chronological order after the heap is rebuilt.
+        """
+        calls = []
+
+        for i in range(300):
+            handle = self.event_loop.call_later(float(300 - i), calls.append, 300 - i)
+            if i % 3:
+                handle.cancel()
+
+        self.assertGreater(self.event_loop.compactions, 0)
+
+        self.event_loop.advance(300.0)
+
+        self.assertEqual(sorted(calls), calls)
+        self.assertEqual(100, len(calls))
+
+    def test_below_minimum_not_compacted(self):
+        for i in range(50):
+            self.event_loop.call_later(1.0, print).cancel()
+
+        self.assertEqual(0, self.event_loop.compactions)
+        self.assertEqual(50, self.event_loop.scheduled_count)
+
+
+class TestLoopResetTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+
+    def test_reset(self):
+        """
+        reset() throws away everything pending and turns the clock back.
+        """
+        start = self.event_loop.time()
+        calls = []
+
+        self.event_loop.call_later(10.0, calls.append, 10)
+        self.event_loop.call_later(20.0, calls.append, 20).cancel()
+        self.event_loop.advance(5.0)
+        self.event_loop.call_soon(calls.append, 5)
+
+        self.event_loop.reset()
+
+        self.assertEqual(start, self.event_loop.time())
+        self.assertEqual(0, self.event_loop.scheduled_count)
+        self.assertEqual(0, self.event_loop.cancelled_count)
+
+        self.event_loop.advance(30.0)
+        self.assertEqual([], calls)
@@ -0,0 +1,264 @@
+import asyncio
+import unittest
+
+from aiotest import loop
+
+
+class RecordingProtocol(asyncio.Protocol):
+    """
+    Keeps track of everything that happens to it, and when.
+    """
+    def __init__(self, event_loop, reply=None):
+        self.event_loop = event_loop
+        self.reply = reply
+        self.transport = None
+        self.received = []
+        self.events = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.events.append(('connection_made', self.event_loop.time()))
+
+    def data_received(self, data):
+        self.received.append(data)
+        self.events.append(('data_received', self.event_loop.time()))
+        if self.reply is not None:
+            self.transport.write(self.reply)
+
+    def eof_received(self):
+        self.events.append(('eof_received', self.event_loop.time()))
+
+    def connection_lost(self, exc):
+        self.events.append(('connection_lost', exc))
+
+
+class VirtualNetworkTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+        self.start = self.event_loop.time()
+        self.servers = []
+
+    def serve(self, reply=None, host=None, port=8080):
+        future = asyncio.ensure_future(self.event_loop.create_server(
+            lambda: self.servers.append(RecordingProtocol(self.event_loop, reply)) or self.servers[-1],
+            host, port), loop=self.event_loop)
+        self.event_loop.run_until_idle()
+        return future.result()
+
+    def connect(self, host='localhost', port=8080):
+        future = asyncio.ensure_future(self.event_loop.create_connection(
+            lambda: RecordingProtocol(self.event_loop), host, port), loop=self.event_loop)
+        self.event_loop.run_until_idle()
+        return future.result()
+
+    def test_connect_and_send(self):
+        self.serve(reply=b'pong')
+        transport, client = self.connect()
+
+        transport.write(b'ping')
+        self.event_loop.run_until_idle()
+
+        self.assertEqual([b'ping'], self.servers[0].received)
+        self.assertEqual([b'pong'], client.received)
+
+    def test_zero_copy(self):
+        """
+        The receiver gets the very bytes object that was written.
+        """
+        self.serve()
+        transport, client = self.connect()
+
+        data = b'x' * 4096
+        transport.write(data)
+        self.event_loop.run_until_idle()
+
+        self.assertIs(data, self.servers[0].received[0])
+
+    def test_mutable_buffer_copied(self):
+        """
+        Reusing a bytearray after writing it doesn't change what was sent.
+        """
+        self.serve()
+        transport, client = self.connect()
+
+        data = bytearray(b'abc')
+        transport.write(data)
+        data[:] = b'xyz'
+        self.event_loop.run_until_idle()
+
+        self.assertEqual([b'abc'], self.servers[0].received)
+
+    def test_latency(self):
+        """
+        Connecting takes a round trip, and data takes the latency to arrive.
+        """
+        self.event_loop.network.latency = 0.25
+        self.serve()
+        transport, client = self.connect()
+
+        self.assertEqual([('connection_made', self.start + 0.5)], client.events)
+
+        transport.write(b'hello')
+        self.event_loop.run_until_idle()
+
+        self.assertEqual(('data_received', self.start + 0.75), self.servers[0].events[-1])
+
+    def test_bandwidth(self):
+        """
+        Writes queue up behind one another on a link with limited bandwidth.
+        """
+        self.event_loop.network.bandwidth = 100
+        self.event_loop.network.latency = 1.0
+        self.serve()
+        transport, client = self.connect()
+        connected = self.event_loop.time()
+
+        transport.write(b'a' * 1000)
+        transport.write(b'b' * 500)
+        self.assertEqual(1500, transport.get_write_buffer_size())
+
+        self.event_loop.run_until_idle()
+
+        self.assertEqual(
+            [('data_received', connected + 11.0), ('data_received', connected + 16.0)],
+            self.servers[0].events[1:])
+        self.assertEqual(0, transport.get_write_buffer_size())
+
+    def test_flow_control(self):
+        """
+        Writing past the high water mark pauses the protocol until the link drains.
+        """
+        self.event_loop.network.bandwidth = 100
+        self.serve()
+        transport, client = self.connect()
+        paused = []
+        client.pause_writing = lambda: paused.append(True)
+        client.resume_writing = lambda: paused.append(False)
+
+        transport.set_write_buffer_limits(high=100, low=10)
+        transport.write(b'a' * 50)
+        transport.write(b'a' * 60)
+
+        self.assertEqual([True], paused)
+
+        self.event_loop.run_until_idle()
+
+        self.assertEqual([True, False], paused)
+
+    def test_connection_refused(self):
+        future = asyncio.ensure_future(self.event_loop.create_connection(
+            lambda: RecordingProtocol(self.event_loop), 'localhost', 9999), loop=self.event_loop)
+        self.event_loop.run_until_idle()
+
+        self.assertRaises(ConnectionRefusedError, future.result)
+
+    def test_address_in_use(self):
+        self.serve()
+
+        future = asyncio.ensure_future(self.event_loop.create_server(asyncio.Protocol, None, 8080), loop=self.event_loop)
+        self.event_loop.run_until_idle()
+
+        self.assertRaises(OSError, future.result)
+
+    def test_server_host(self):
+        """
+        A server bound to a specific host only accepts connections for that host.
+        """
+        self.serve(host='10.0.0.1')
+
+        transport, client = self.connect(host='10.0.0.1')
+        self.assertEqual(('10.0.0.1', 8080), transport.get_extra_info('peername'))
+
+        self.assertRaises(ConnectionRefusedError, self.connect, host='10.0.0.2')
+
+    def test_ephemeral_port(self):
+        server = self.serve(port=0)
+        host, port = server.sockets[0].getsockname()
+
+        transport, client = self.connect(port=port)
+
+        self.assertEqual(port, transport.get_extra_info('peername')[1])
+
+    def test_server_close(self):
+        server = self.serve()
+        server.close()
+
+        self.assertRaises(ConnectionRefusedError, self.connect)
+
+    def test_close(self):
+        """
+        Closing one end gives the other end an EOF, and then both lose their connection.
+        """
+        self.serve()
+        transport, client = self.connect()
+
+        transport.write(b'last words')
+        transport.close()
+        self.event_loop.run_until_idle()
+
+        self.assertEqual(
+            ['connection_made', 'data_received', 'eof_received', 'connection_lost'],
+            [event for event, detail in self.servers[0].events])
+        self.assertEqual(('connection_lost', None), client.events[-1])
+        self.assertTrue(self.servers[0].transport.is_closing())
+
+    def test_abort(self):
+        self.serve()
+        transport, client = self.connect()
+
+        transport.abort()
+        self.event_loop.run_until_idle()
+
+        event, exc = self.servers[0].events[-1]
+        self.assertEqual('connection_lost', event)
+        self.assertIsInstance(exc, ConnectionResetError)
+
+    def test_write_after_eof(self):
+        self.serve()
+        transport, client = self.connect()
+
+        transport.write_eof()
+
+        self.assertRaises(RuntimeError, transport.write, b'too late')
+
+    def test_pause_reading(self):
+        self.serve()
+        transport, client = self.connect()
+
+        self.servers[0].transport.pause_reading()
+        transport.write(b'held')
+        self.event_loop.run_until_idle()
+
+        self.assertEqual([], self.servers[0].received)
+
+        self.servers[0].transport.resume_reading()
+        self.event_loop.run_until_idle()
+
+        self.assertEqual([b'held'], self.servers[0].received)
+
+    def test_streams(self):
+        """
+        asyncio's streams work over the virtual network.
+        """
+        self.event_loop.network.latency = 0.1
+
+        @asyncio.coroutine
+        def handle_echo(reader, writer):
+            data = yield from reader.readline()
+            writer.write(data.upper())
+            yield from writer.drain()
+            writer.close()
+
+        @asyncio.coroutine
+        def client():
+            yield from asyncio.start_server(handle_echo, '127.0.0.1', 8888, loop=self.event_loop)
+            reader, writer = yield from asyncio.open_connection('127.0.0.1', 8888, loop=self.event_loop)
+            writer.write(b'hello\n')
+            return (yield from reader.read())
+
+        future = asyncio.ensure_future(client(), loop=self.event_loop)
+        self.event_loop.run_until_idle()
+
+        self.assertEqual(b'HELLO\n', future.result())
+        self.assertAlmostEqual(0.4, self.event_loop.time() - self.start, places=6)
@@ -0,0 +1,92 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from aiotest.case import LoopUsage
+from aiotest.perf import PerfRecord, PerfWriter, compare, format_regressions, read_report, record_outcome
+from aiotest.runner import TestOutcome
+
+
+class RecordOutcomeTests(unittest.TestCase):
+
+    def test_aiotest_test(self):
+        outcome = TestOutcome('tests.test_one', 'pass', '', 0.25, None, LoopUsage(60.0, 12, 3))
+        self.assertEqual(record_outcome(outcome), PerfRecord('tests.test_one', 0.25, 60.0, 12, 3))
+
+    def test_plain_test(self):
+        outcome = TestOutcome('tests.test_one', 'fail', 'on purpose', 0.25, None, None)
+        self.assertEqual(record_outcome(outcome), PerfRecord('tests.test_one', 0.25, 0.0, 0, 0))
+
+    def test_tests_that_did_not_run(self):
+        self.assertIsNone(record_outcome(TestOutcome('tests.test_one', 'skip', 'not today', 0.1, None, None)))
+        self.assertIsNone(record_outcome(TestOutcome('tests.test_one', 'cached', '', 0.0, None, None)))
+        self.assertIsNone(record_outcome(TestOutcome('setUpClass (tests.Tests)', 'error', 'broken', 0.0, None, None)))
+
+
+class ReportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'perf.tsv')
+
+    def test_round_trip(self):
+        records = [PerfRecord('tests.test_one', 0.25, 60.0, 12, 3), PerfRecord('tests.test_two', 1.5, 0.0, 0, 0)]
+        writer = PerfWriter(open(self.path, 'w'))
+        for record in records:
+            writer.write(record)
+        writer.close()
+
+        self.assertEqual(read_report(self.path), {record.test_id: record for record in records})
+
+    def test_not_a_report(self):
+        with open(self.path, 'w') as report:
+            report.write("something else\n")
+        self.assertRaises(ValueError, read_report, self.path)
+
+    def test_bad_record(self):
+        writer = PerfWriter(open(self.path, 'w'))
+        writer._file.write("tests.test_one\tslow\n")
+        writer.close()
+        with self.assertRaisesRegex(ValueError, 'line 2'):
+            read_report(self.path)
+
+
+class CompareTests(unittest.TestCase):
+
+    def report(self, *records):
+        return {record[0]: PerfRecord(*record) for record in records}
+
+    def test_slower(self):
+        baseline = self.report(('tests.test_one', 0.1, 1.0, 10, 1), ('tests.test_two', 0.1, 1.0, 10, 1))
+        current = self.report(('tests.test_one', 0.5, 1.0, 10, 1), ('tests.test_two', 0.12, 1.0, 10, 1))
+
+        regressions = compare(current, baseline)
+        self.assertEqual(['tests.test_one'], [regression.test_id for regression in regressions])
+        self.assertEqual("real time went from 0.100s to 0.500s", regressions[0].reason)
+
+    def test_noise_is_ignored(self):
+        baseline = self.report(('tests.test_one', 0.001, 1.0, 10, 1))
+        current = self.report(('tests.test_one', 0.004, 1.0, 10, 1))
+        self.assertEqual([], compare(current, baseline))
+
+    def test_more_callbacks(self):
+        baseline = self.report(('tests.test_one', 0.001, 1.0, 10, 1))
+        current = self.report(('tests.test_one', 0.001, 1.0, 100, 1))
+
+        regressions = compare(current, baseline)
+        self.assertEqual("callbacks went from 10 to 100", regressions[0].reason)
+
+    def test_new_tests_are_ignored(self):
+        current = self.report(('tests.test_one', 10.0, 1.0, 10, 1))
+        self.assertEqual([], compare(current, {}))
+
+    def test_worst_first(self):
+        baseline = self.report(('tests.test_one', 0.1, 1.0, 10, 1), ('tests.test_two', 0.1, 1.0, 10, 1))
+        current = self.report(('tests.test_one', 0.5, 1.0, 10, 1), ('tests.test_two', 0.9, 1.0, 10, 1))
+
+        regressions = compare(current, baseline)
+        self.assertEqual(['tests.test_two', 'tests.test_one'], [regression.test_id for regression in regressions])
+        self.assertIn("2 tests regressed against the baseline", format_regressions(regressions))
@@ -0,0 +1,355 @@
+import asyncio
+import signal
+import unittest
+
+from aiotest import loop
+from aiotest.pipes import STDOUT, VirtualPipe
+
+
+class RecordingProtocol(asyncio.Protocol):
+    """
+    Keeps track of everything that happens to it, and when.
+    """
+    def __init__(self, event_loop):
+        self.event_loop = event_loop
+        self.transport = None
+        self.received = []
+        self.events = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.received.append(data)
+        self.events.append(('data_received', self.event_loop.time()))
+
+    def eof_received(self):
+        self.events.append(('eof_received', self.event_loop.time()))
+
+    def connection_lost(self, exc):
+        self.events.append(('connection_lost', exc))
+
+
+@asyncio.coroutine
+def cat(process):
+    while True:
+        data = yield from process.stdin.read(1024)
+        if not data:
+            break
+        process.stdout.write(data)
+
+
+@asyncio.coroutine
+def forever(process):
+    process.stdout.write(b'started\n')
+    yield from asyncio.sleep(3600)
+
+
+@asyncio.coroutine
+def crash(process):
+    process.stdout.write(b'about to crash\n')
+    raise ValueError("something went wrong")
+
+
+@asyncio.coroutine
+def exit_code(process):
+    return int(process.args[1])
+
+
+class VirtualPipeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+        self.start = self.event_loop.time()
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def test_data_arrives_after_latency(self):
+        pipe = VirtualPipe(self.event_loop, latency=0.5)
+        self.assertEqual(pipe.write(b'hello'), 5)
+        self.assertEqual(pipe.in_flight, 5)
+        with self.assertRaises(BlockingIOError):
+            pipe.read()
+
+        self.event_loop.advance(0.4)
+        with self.assertRaises(BlockingIOError):
+            pipe.read()
+
+        self.event_loop.advance(0.1)
+        self.assertEqual(pipe.in_flight, 0)
+        self.assertEqual(pipe.read(2), b'he')
+        self.assertEqual(pipe.read(), b'llo')
+
+    def test_eof_follows_data(self):
+        pipe = VirtualPipe(self.event_loop, latency=0.5)
+        pipe.write(b'last words')
+        pipe.close_write()
+        with self.assertRaises(OSError):
+            pipe.write(b'more')
+
+        self.event_loop.advance(1)
+        self.assertEqual(pipe.read(), b'last words')
+        self.assertEqual(pipe.read(), b'')
+
+    def test_write_after_read_end_closed(self):
+        pipe = VirtualPipe(self.event_loop)
+        pipe.close_read()
+        with self.assertRaises(BrokenPipeError):
+            pipe.write(b'anyone there?')
+
+    def test_bandwidth(self):
+        pipe = VirtualPipe(self.event_loop, bandwidth=1000)
+        pipe.write(b'x' * 500)
+        self.event_loop.advance(0.4)
+        with self.assertRaises(BlockingIOError):
+            pipe.read()
+        self.event_loop.advance(0.1)
+        self.assertEqual(len(pipe.read()), 500)
+
+    def test_fds_are_forgotten_once_closed(self):
+        pipe = VirtualPipe(self.event_loop)
+        self.assertIs(self.event_loop._pipes[pipe.read_fd], pipe)
+        self.assertIs(self.event_loop._pipes[pipe.write_fd], pipe)
+        pipe.close()
+        self.assertNotIn(pipe.read_fd, self.event_loop._pipes)
+        self.assertNotIn(pipe.write_fd, self.event_loop._pipes)
+
+    def test_fds_start_over_after_reset(self):
+        first = VirtualPipe(self.event_loop)
+        VirtualPipe(self.event_loop)
+        self.event_loop.reset()
+
+        self.assertEqual({}, self.event_loop._pipes)
+        self.assertEqual(first.read_fd, VirtualPipe(self.event_loop).read_fd)
+
+
+class WatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+        self.start = self.event_loop.time()
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def test_add_reader(self):
+        pipe = VirtualPipe(self.event_loop, latency=1)
+        received = []
+
+        def on_readable():
+            data = pipe.read()
+            received.append((data, self.event_loop.time() - self.start))
+            if not data:
+                self.event_loop.remove_reader(pipe.read_fd)
+
+        self.event_loop.add_reader(pipe.read_fd, on_readable)
+        pipe.write(b'one')
+        self.event_loop.advance(0.5)
+        pipe.write(b'two')
+        pipe.close_write()
+        self.event_loop.advance(10)
+
+        self.assertEqual(len(received), 3)
+        self.assertEqual(received[0][0], b'one')
+        self.assertAlmostEqual(received[0][1], 1, places=6)
+        self.assertEqual(received[1][0], b'two')
+        self.assertAlmostEqual(received[1][1], 1.5, places=6)
+        self.assertEqual(received[2][0], b'')
+
+    def test_reader_is_level_triggered(self):
+        pipe = VirtualPipe(self.event_loop)
+        chunks = []
+
+        def on_readable():
+            chunks.append(pipe.read(2))
+
+        self.event_loop.add_reader(pipe.read_fd, on_readable)
+        pipe.write(b'abcdef')
+        self.event_loop.advance(0)
+        self.assertEqual(chunks, [b'ab', b'cd', b'ef'])
+        self.assertTrue(self.event_loop.remove_reader(pipe.read_fd))
+        self.assertFalse(self.event_loop.remove_reader(pipe.read_fd))
+
+    def test_add_writer(self):
+        pipe = VirtualPipe(self.event_loop, latency=1)
+        pipe.high_water = 10
+        writes = []
+
+        def on_writable():
+            pipe.write(b'x' * 10)
+            writes.append(self.event_loop.time() - self.start)
+            if len(writes) == 3:
+                self.event_loop.remove_writer(pipe.write_fd)
+
+        self.event_loop.add_writer(pipe.write_fd, on_writable)
+        self.event_loop.advance(10)
+
+        self.assertEqual(len(writes), 3)
+        self.assertAlmostEqual(writes[0], 0, places=6)
+        self.assertAlmostEqual(writes[1], 1, places=6)
+        self.assertAlmostEqual(writes[2], 2, places=6)
+
+    def test_wrong_fd(self):
+        pipe = VirtualPipe(self.event_loop)
+        with self.assertRaises(ValueError):
+            self.event_loop.add_reader(pipe.write_fd, print)
+        with self.assertRaises(ValueError):
+            self.event_loop.add_writer(pipe.read_fd, print)
+        with self.assertRaises(ValueError):
+            self.event_loop.add_reader(0, print)
+
+
+class PipeTransportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+        self.start = self.event_loop.time()
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def connect(self, pipe):
+        _, reader = self.event_loop.run_until_complete(
+            self.event_loop.connect_read_pipe(lambda: RecordingProtocol(self.event_loop), pipe))
+        writer_transport, writer = self.event_loop.run_until_complete(
+            self.event_loop.connect_write_pipe(lambda: RecordingProtocol(self.event_loop), pipe))
+        return reader, writer_transport, writer
+
+    def test_write_and_read(self):
+        pipe = VirtualPipe(self.event_loop, latency=0.25)
+        reader, transport, writer = self.connect(pipe)
+        transport.write(b'hello ')
+        transport.write(b'world')
+        transport.close()
+        self.event_loop.advance(1)
+
+        self.assertEqual(b''.join(reader.received), b'hello world')
+        self.assertAlmostEqual(reader.events[0][1] - self.start, 0.25, places=6)
+        self.assertEqual(reader.events[-2][0], 'eof_received')
+        self.assertEqual(reader.events[-1], ('connection_lost', None))
+        self.assertEqual(writer.events, [('connection_lost', None)])
+
+    def test_buffered_data_comes_first(self):
+        pipe = VirtualPipe(self.event_loop, latency=0.25)
+        pipe.write(b'early ')
+        self.event_loop.advance(1)
+        pipe.write(b'late')
+        pipe.close_write()
+        reader, _, _ = self.connect(pipe)
+        self.event_loop.advance(1)
+        self.assertEqual(b''.join(reader.received), b'early late')
+
+    def test_broken_pipe(self):
+        pipe = VirtualPipe(self.event_loop, latency=1)
+        reader, transport, writer = self.connect(pipe)
+        transport.write(b'never read')
+        reader.transport.close()
+        self.event_loop.advance(0)
+
+        self.assertEqual(len(writer.events), 1)
+        self.assertIsInstance(writer.events[0][1], BrokenPipeError)
+        self.assertTrue(transport.is_closing())
+
+    def test_flow_control(self):
+        pipe = VirtualPipe(self.event_loop, latency=1)
+        _, transport, writer = self.connect(pipe)
+        paused = []
+        writer.pause_writing = lambda: paused.append(('pause', self.event_loop.time() - self.start))
+        writer.resume_writing = lambda: paused.append(('resume', self.event_loop.time() - self.start))
+        transport.set_write_buffer_limits(high=100)
+        transport.write(b'x' * 101)
+        self.assertEqual(transport.get_write_buffer_size(), 101)
+        self.event_loop.advance(2)
+
+        self.assertEqual([event for event, _ in paused], ['pause', 'resume'])
+        self.assertAlmostEqual(paused[1][1], 1, places=6)
+
+
+class SubprocessTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+        self.start = self.event_loop.time()
+        self.event_loop.processes.register('cat', cat)
+        self.event_loop.processes.register('forever', forever, startup=0.5)
+        self.event_loop.processes.register('crash', crash)
+        self.event_loop.processes.register('exit', exit_code)
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def run_coro(self, coro):
+        return self.event_loop.run_until_complete(coro)
+
+    def test_communicate(self):
+        self.event_loop.processes.latency = 0.1
+
+        @asyncio.coroutine
+        def go():
+            process = yield from asyncio.create_subprocess_exec(
+                '/bin/cat', stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, loop=self.event_loop)
+            self.assertEqual(process.pid, 1000)
+            out, err = yield from process.communicate(b'meow')
+            return out, err, process.returncode
+
+        out, err, returncode = self.run_coro(go())
+        self.assertEqual(out, b'meow')
+        self.assertIsNone(err)
+        self.assertEqual(returncode, 0)
+        # There and back again.
+        self.assertAlmostEqual(self.event_loop.time() - self.start, 0.2, places=6)
+
+    def test_shell(self):
+        @asyncio.coroutine
+        def go():
+            process = yield from asyncio.create_subprocess_shell("exit 3", loop=self.event_loop)
+            return (yield from process.wait())
+
+        self.assertEqual(self.run_coro(go()), 3)
+
+    def test_kill(self):
+        @asyncio.coroutine
+        def go():
+            process = yield from asyncio.create_subprocess_exec(
+                'forever', stdout=asyncio.subprocess.PIPE, loop=self.event_loop)
+            line = yield from process.stdout.readline()
+            process.kill()
+            returncode = yield from process.wait()
+            return line, returncode
+
+        line, returncode = self.run_coro(go())
+        self.assertEqual(line, b'started\n')
+        self.assertEqual(returncode, -signal.SIGKILL)
+        self.assertAlmostEqual(self.event_loop.time() - self.start, 0.5, places=6)
+
+    def test_terminate_before_startup(self):
+        @asyncio.coroutine
+        def go():
+            process = yield from asyncio.create_subprocess_exec('forever', loop=self.event_loop)
+            process.terminate()
+            return (yield from process.wait())
+
+        self.assertEqual(self.run_coro(go()), -signal.SIGTERM)
+
+    def test_program_raises(self):
+        @asyncio.coroutine
+        def go():
+            process = yield from asyncio.create_subprocess_exec(
+                'crash', stdout=asyncio.subprocess.PIPE, stderr=STDOUT, loop=self.event_loop)
+            out, _ = yield from process.communicate()
+            return out, process.returncode
+
+        out, returncode = self.run_coro(go())
+        self.assertEqual(returncode, 1)
+        self.assertTrue(out.startswith(b'about to crash\nTraceback'))
+        self.assertIn(b'ValueError: something went wrong', out)
+
+    def test_unknown_program(self):
+        with self.assertRaises(FileNotFoundError):
+            self.run_coro(asyncio.create_subprocess_exec('nonesuch', loop=self.event_loop))
+
+    def test_reset_forgets_programs(self):
+        self.event_loop.reset()
+        with self.assertRaises(FileNotFoundError):
+            self.run_coro(asyncio.create_subprocess_exec('cat', loop=self.event_loop))
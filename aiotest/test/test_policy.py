@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+
+from aiotest import TestCase
+from aiotest.loop import TimeTravelingTestLoop
+from aiotest.policy import TimeTravelingEventLoopPolicy
+
+
+class PolicyTests(unittest.TestCase):
+
+    def test_new_event_loop(self):
+        policy = TimeTravelingEventLoopPolicy()
+        loop = policy.new_event_loop()
+        self.addCleanup(loop.close)
+
+        self.assertIsInstance(loop, TimeTravelingTestLoop)
+
+    def test_loop_factory(self):
+        class CustomLoop(TimeTravelingTestLoop):
+            pass
+
+        loop = TimeTravelingEventLoopPolicy(CustomLoop).new_event_loop()
+        self.addCleanup(loop.close)
+
+        self.assertIsInstance(loop, CustomLoop)
+
+
+class TestCasePolicyTests(TestCase):
+
+    def test_installed(self):
+        self.assertIsInstance(asyncio.get_event_loop_policy(), TimeTravelingEventLoopPolicy)
+        self.assertIs(self.event_loop, asyncio.get_event_loop())
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        self.assertIsInstance(loop, TimeTravelingTestLoop)
+        self.assertIsNot(self.event_loop, loop)
+
+    def test_restored(self):
+        previous = asyncio.get_event_loop_policy()
+        previous_loop = previous.get_event_loop()
+
+        class InnerTests(TestCase):
+            def test_nothing(self):
+                pass
+
+        result = unittest.TestResult()
+        unittest.defaultTestLoader.loadTestsFromTestCase(InnerTests).run(result)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertIs(previous, asyncio.get_event_loop_policy())
+        self.assertIs(previous_loop, asyncio.get_event_loop())
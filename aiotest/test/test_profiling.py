@@ -0,0 +1,320 @@
+import asyncio
+import functools
+import gc
+import unittest
+import weakref
+
+from aiotest import loop, TestCase
+from aiotest.profiling import CallbackProfiler, CriticalPathProfiler, describe_callback
+
+
+def named_callback():
+    pass
+
+
+class DescribeCallbackTests(unittest.TestCase):
+
+    def test_function(self):
+        self.assertEqual('aiotest.test.test_profiling.named_callback', describe_callback(named_callback))
+
+    def test_partial(self):
+        self.assertEqual('aiotest.test.test_profiling.named_callback',
+                         describe_callback(functools.partial(named_callback)))
+
+    def test_builtin(self):
+        self.assertEqual('builtins.print', describe_callback(print))
+
+
+class CallbackProfilerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+        self.profiler = CallbackProfiler()
+        self.event_loop.add_instrument(self.profiler)
+
+    def stats(self):
+        return {stat.name: stat for stat in self.profiler.stats()}
+
+    def test_callbacks(self):
+        """
+        Calls and virtual delays are tallied up per callback.
+        """
+        self.event_loop.call_soon(named_callback)
+        self.event_loop.call_later(2.0, named_callback)
+        self.event_loop.call_later(5.0, named_callback)
+        self.event_loop.advance(10.0)
+
+        stats = self.stats()['aiotest.test.test_profiling.named_callback']
+
+        self.assertEqual(3, stats.calls)
+        self.assertEqual(7.0, stats.total_delay)
+        self.assertEqual(5.0, stats.max_delay)
+        self.assertGreaterEqual(stats.cpu_time, 0.0)
+
+    def test_cpu_time(self):
+        """
+        CPU time is measured by the profiler's clock around each callback.
+        """
+        ticks = iter(range(0, 100, 3))
+        profiler = CallbackProfiler(clock=lambda: next(ticks))
+        self.event_loop.remove_instrument(self.profiler)
+        self.event_loop.add_instrument(profiler)
+
+        self.event_loop.call_soon(named_callback)
+        self.event_loop.call_soon(named_callback)
+        self.event_loop.advance(0)
+
+        self.assertEqual(6, profiler.stats()[0].cpu_time)
+
+    def test_coroutines(self):
+        """
+        Every step of a Task counts towards its coroutine, not the Task's internals.
+        """
+        @asyncio.coroutine
+        def sleepy():
+            for i in range(3):
+                yield from asyncio.sleep(1.0, loop=self.event_loop)
+
+        asyncio.ensure_future(sleepy(), loop=self.event_loop)
+        self.event_loop.run_until_idle()
+
+        stats = [stat for stat in self.profiler.stats() if stat.name.startswith('task ')]
+
+        self.assertEqual(1, len(stats))
+        self.assertIn('sleepy', stats[0].name)
+        self.assertEqual(4, stats[0].calls)
+
+    def test_cancelled(self):
+        """
+        Cancelled Handles are forgotten, rather than held on to until the profiler is cleared.
+        """
+        @asyncio.coroutine
+        def quick():
+            yield from asyncio.sleep(1.0, loop=self.event_loop)
+
+        self.event_loop.call_soon(named_callback).cancel()
+        self.event_loop.call_later(1.0, named_callback).cancel()
+        task = asyncio.ensure_future(asyncio.wait_for(quick(), 10.0, loop=self.event_loop), loop=self.event_loop)
+        self.event_loop.run_until_idle()
+
+        self.assertTrue(task.done())
+        self.assertEqual({}, self.profiler._scheduled_at)
+        self.assertNotIn('aiotest.test.test_profiling.named_callback', self.stats())
+
+    def test_removed(self):
+        self.event_loop.remove_instrument(self.profiler)
+
+        self.event_loop.call_soon(named_callback)
+        self.event_loop.advance(0)
+
+        self.assertEqual([], self.profiler.stats())
+
+    def test_report(self):
+        self.event_loop.call_soon(named_callback)
+        self.event_loop.call_soon(len, '')
+        self.event_loop.advance(0)
+
+        report = self.profiler.report(top=1, sort='name')
+
+        self.assertEqual(2, len(report.splitlines()))
+        self.assertIn('aiotest.test.test_profiling.named_callback', report)
+
+
+class CriticalPathProfilerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop()
+        self.profiler = CriticalPathProfiler()
+        self.event_loop.add_instrument(self.profiler)
+        self.start = self.event_loop.time()
+
+    def tearDown(self):
+        self.event_loop.close()
+
+    def run_task(self, coro):
+        task = self.event_loop.create_task(coro)
+        self.event_loop.run_until_complete(task)
+        return task
+
+    def path(self, task):
+        return [(segment.depth, round(segment.start - self.start, 6), round(segment.end - self.start, 6),
+                 segment.label) for segment in self.profiler.critical_path(task)]
+
+    def test_sleeps(self):
+        @asyncio.coroutine
+        def sleepy():
+            yield from asyncio.sleep(1.0, loop=self.event_loop)
+            yield from asyncio.sleep(2.0, loop=self.event_loop)
+
+        task = self.run_task(sleepy())
+        self.assertEqual(self.path(task), [(0, 0, 1, 'sleep 1s'), (0, 1, 3, 'sleep 2s')])
+        self.assertEqual(self.profiler.dominant(task).label, 'sleep 2s')
+
+    def test_child_task(self):
+        @asyncio.coroutine
+        def child():
+            yield from asyncio.sleep(5.0, loop=self.event_loop)
+
+        @asyncio.coroutine
+        def parent():
+            yield from asyncio.sleep(1.0, loop=self.event_loop)
+            yield from self.event_loop.create_task(child())
+
+        task = self.run_task(parent())
+        path = self.path(task)
+        self.assertEqual(path[0], (0, 0, 1, 'sleep 1s'))
+        self.assertEqual(path[1][:3], (0, 1, 6))
+        self.assertRegex(path[1][3], r'task .*child')
+        self.assertEqual(path[2], (1, 1, 6, 'sleep 5s'))
+
+    def test_gather_follows_slowest_child(self):
+        @asyncio.coroutine
+        def child(delay):
+            yield from asyncio.sleep(delay, loop=self.event_loop)
+
+        @asyncio.coroutine
+        def parent():
+            yield from asyncio.gather(child(3.0), child(7.0), child(2.0), loop=self.event_loop)
+
+        task = self.run_task(parent())
+        path = self.path(task)
+        self.assertEqual(len(path), 2)
+        self.assertRegex(path[0][3], r'task .*child')
+        self.assertEqual(path[1], (1, 0, 7, 'sleep 7s'))
+
+    def test_timeout(self):
+        @asyncio.coroutine
+        def impatient():
+            try:
+                yield from asyncio.wait_for(asyncio.sleep(10.0, loop=self.event_loop), 4.0, loop=self.event_loop)
+            except asyncio.TimeoutError:
+                pass
+
+        task = self.run_task(impatient())
+        self.assertEqual(self.profiler.dominant(task)[1:], (self.start, self.start + 4, 'timeout 4s'))
+
+    def test_plain_callback(self):
+        @asyncio.coroutine
+        def waiter(future):
+            yield from future
+
+        future = self.event_loop.create_future()
+        self.event_loop.call_later(2.0, future.set_result, None)
+        task = self.run_task(waiter(future))
+        self.assertEqual(len(self.path(task)), 1)
+        self.assertRegex(self.path(task)[0][3], r'timer .*set_result \(2s\)')
+
+    def test_report(self):
+        @asyncio.coroutine
+        def sleepy():
+            yield from asyncio.sleep(1.0, loop=self.event_loop)
+            yield from asyncio.sleep(3.0, loop=self.event_loop)
+
+        report = self.profiler.report(self.run_task(sleepy()))
+        self.assertRegex(report, r'Critical path of task .*sleepy: 4\.0+ virtual seconds')
+        self.assertIn('Dominated by sleep 3s: 3.000000 virtual seconds (75%)', report)
+
+    def test_unfinished(self):
+        @asyncio.coroutine
+        def child():
+            yield from asyncio.sleep(10.0, loop=self.event_loop)
+
+        @asyncio.coroutine
+        def parent():
+            yield from asyncio.sleep(1.0, loop=self.event_loop)
+            yield from self.event_loop.create_task(child())
+
+        task = self.event_loop.create_task(parent())
+        self.event_loop.advance(3)
+        self.assertEqual(self.path(task), [(0, 0, 1, 'sleep 1s')])
+
+        path = self.profiler.critical_path(task, self.event_loop.time())
+        self.assertRegex(path[-1].label, r'still waiting on task .*child')
+        self.assertAlmostEqual(path[-1].end - path[-1].start, 2, places=6)
+        task.cancel()
+        self.event_loop.advance(0)
+
+    def test_cancelled_timers(self):
+        """
+        Timers that never go off are forgotten, rather than mistaken for whatever later gets the same id().
+        """
+        @asyncio.coroutine
+        def patient():
+            yield from asyncio.wait_for(asyncio.sleep(1.0, loop=self.event_loop), 4.0, loop=self.event_loop)
+            yield from asyncio.sleep(2.0, loop=self.event_loop)
+
+        task = self.run_task(patient())
+        self.assertEqual({}, self.profiler._timers)
+        self.assertEqual({}, self.profiler._origins)
+        self.assertEqual(self.profiler.dominant(task)[1:], (self.start + 1, self.start + 3, 'sleep 2s'))
+
+    def test_finished_tasks_are_let_go(self):
+        """
+        Only what the report needs is kept of Tasks that were waited on, not the Tasks themselves.
+        """
+        children = []
+
+        @asyncio.coroutine
+        def child():
+            yield from asyncio.sleep(5.0, loop=self.event_loop)
+
+        @asyncio.coroutine
+        def parent():
+            task = self.event_loop.create_task(child())
+            children.append(weakref.ref(task))
+            yield from task
+
+        task = self.run_task(parent())
+        gc.collect()
+
+        self.assertIsNone(children[0]())
+        self.assertRegex(self.path(task)[0][3], r'task .*child')
+        self.assertEqual(self.path(task)[1], (1, 0, 5, 'sleep 5s'))
+
+    def test_unknown_task(self):
+        task = asyncio.Future(loop=self.event_loop)
+        self.assertRaises(ValueError, self.profiler.critical_path, task)
+
+
+class CriticalPathTests(TestCase):
+    profile_critical_path = True
+
+    def test_critical_path(self):
+        @asyncio.coroutine
+        def nap():
+            yield from asyncio.sleep(1.0)
+            yield from asyncio.sleep(4.0)
+
+        self.assertCoroWithin(nap, max_time=5)
+        self.assertIn('Dominated by sleep 4s', self.criticalPath())
+
+    def test_explains_failures(self):
+        @asyncio.coroutine
+        def nap():
+            yield from asyncio.sleep(10.0)
+
+        with self.assertRaisesRegex(self.failureException, r'(?s)did not complete.*Dominated by still waiting: 5\.0'):
+            self.assertCoroWithin(nap, max_time=5)
+
+
+class ProfiledTests(TestCase):
+    profile_callbacks = True
+
+    def test_profile_report(self):
+        @asyncio.coroutine
+        def nap():
+            yield from asyncio.sleep(1.0)
+            return True
+
+        self.assertCoroResult(True, nap, max_time=1.0)
+
+        self.assertRegex(self.profileReport(), r'task .*nap')
+
+
+class UnprofiledTests(TestCase):
+
+    def test_profile_report(self):
+        self.assertRaises(RuntimeError, self.profileReport)
+
+    def test_critical_path(self):
+        self.assertRaises(RuntimeError, self.criticalPath)
@@ -0,0 +1,235 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from aiotest import perf, runner
+
+SAMPLE_TESTS = '''
+import asyncio
+import os
+import unittest
+
+from aiotest import TestCase
+
+
+class PassingTests(TestCase):
+
+    def test_sleep(self):
+        @asyncio.coroutine
+        def nap():
+            yield from asyncio.sleep(60)
+            return os.getpid()
+
+        self.assertCoroResult(os.getpid(), nap, max_time=60)
+
+    def test_pass(self):
+        pass
+
+
+class FailingTests(TestCase):
+
+    def test_fail(self):
+        self.fail("on purpose")
+
+    def test_error(self):
+        raise KeyError("on purpose")
+
+    @unittest.skip("not today")
+    def test_skip(self):
+        pass
+
+
+class BrokenFixtureTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        raise RuntimeError("broken fixture")
+
+    def test_never_runs(self):
+        pass
+'''
+
+
+class RunnerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        # Every test gets a differently named module, so they don't trip over each other in sys.modules.
+        self.module = 'test_runner_sample_{id}'.format(id=id(self))
+        with open(os.path.join(self.directory, self.module + '.py'), 'w') as sample:
+            sample.write(textwrap.dedent(SAMPLE_TESTS))
+
+        sys.path.insert(0, self.directory)
+        self.addCleanup(sys.path.remove, self.directory)
+
+    def statuses(self, outcomes):
+        return {outcome.test_id.replace(self.module + '.', ''): outcome.status for outcome in outcomes}
+
+    def test_shard_tests(self):
+        suite = runner.load_tests([self.module])
+        shards = runner.shard_tests(suite)
+
+        self.assertEqual([3, 2, 1], [len(tests) for shardable, tests in shards])
+        self.assertTrue(all(shardable for shardable, tests in shards))
+
+    def test_shard_local_classes(self):
+        """
+        Classes defined in a function can't be found by name in a worker, so they're run in this process.
+        """
+        class LocalTests(unittest.TestCase):
+            def test_local(self):
+                pass
+
+        suite = unittest.TestSuite([runner.load_tests([self.module]),
+                                    unittest.defaultTestLoader.loadTestsFromTestCase(LocalTests)])
+        shards = runner.shard_tests(suite)
+
+        unshardable = [tests for shardable, tests in shards if not shardable]
+        self.assertEqual([[LocalTests('test_local')]], unshardable)
+        self.assertEqual(4, len(shards))
+
+        outcomes = runner.run(suite, jobs=3)
+        self.assertIn('pass', [outcome.status for outcome in outcomes if outcome.test_id.endswith('test_local')])
+
+    def check_outcomes(self, outcomes):
+        self.assertEqual({
+            'PassingTests.test_sleep': 'pass',
+            'PassingTests.test_pass': 'pass',
+            'FailingTests.test_fail': 'fail',
+            'FailingTests.test_error': 'error',
+            'FailingTests.test_skip': 'skip',
+            'setUpClass (BrokenFixtureTests)': 'error',
+        }, self.statuses(outcomes))
+
+    def test_run_serial(self):
+        outcomes = runner.run(runner.load_tests([self.module]), jobs=1)
+        self.check_outcomes(outcomes)
+
+    def test_run_parallel(self):
+        seen = []
+        outcomes = runner.run(runner.load_tests([self.module]), jobs=3, on_outcome=seen.append)
+
+        self.check_outcomes(outcomes)
+        self.assertEqual(outcomes, seen)
+
+        failure = [outcome for outcome in outcomes if outcome.status == 'fail'][0]
+        self.assertIn("on purpose", failure.details)
+
+    def test_import_failure(self):
+        """
+        Modules that fail to import are reported as errors, rather than sent to a worker.
+        """
+        with open(os.path.join(self.directory, 'test_runner_broken.py'), 'w') as broken:
+            broken.write("import no_such_module\n")
+
+        outcomes = runner.run(runner.load_tests(
+            start=self.directory, pattern='test_runner_broken.py', top_level_dir=self.directory), jobs=2)
+
+        self.assertEqual(['error'], [outcome.status for outcome in outcomes])
+
+    def test_main(self):
+        stream = io.StringIO()
+        status = runner.main(['-j', '2', '-v', '--durations', '2', self.module + '.PassingTests'], stream=stream)
+
+        self.assertEqual(0, status)
+        self.assertIn(self.module + ".PassingTests.test_sleep ... ok", stream.getvalue())
+        self.assertIn("Slowest 2 tests", stream.getvalue())
+        self.assertIn("Ran 2 tests", stream.getvalue())
+
+    def test_main_failures(self):
+        stream = io.StringIO()
+        status = runner.main(['-j', '2', self.module], stream=stream)
+
+        self.assertEqual(1, status)
+        self.assertIn("FAILED (failures=1, errors=2, skipped=1)", stream.getvalue())
+
+    def test_main_unexpected_success(self):
+        """
+        Like unittest, an expected failure that passes fails the run.
+        """
+        module = self.module + '_expected'
+        with open(os.path.join(self.directory, module + '.py'), 'w') as sample:
+            sample.write(textwrap.dedent('''
+                import unittest
+
+
+                class ExpectedFailureTests(unittest.TestCase):
+
+                    @unittest.expectedFailure
+                    def test_fails(self):
+                        self.fail("as expected")
+
+                    @unittest.expectedFailure
+                    def test_passes(self):
+                        pass
+            '''))
+
+        stream = io.StringIO()
+        status = runner.main(['-j', '1', module], stream=stream)
+
+        self.assertEqual(1, status)
+        self.assertIn("FAILED (expected failures=1, unexpected successes=1)", stream.getvalue())
+
+    def test_main_cache(self):
+        cache = os.path.join(self.directory, 'cache.json')
+        arguments = ['-j', '2', '--cache', cache, self.module]
+
+        stream = io.StringIO()
+        self.assertEqual(1, runner.main(arguments, stream=stream))
+        self.assertIn("FAILED (failures=1, errors=2, skipped=1)", stream.getvalue())
+
+        # Only the tests that passed are skipped, and only until their module changes.
+        stream = io.StringIO()
+        self.assertEqual(1, runner.main(arguments, stream=stream))
+        self.assertIn("FAILED (failures=1, errors=2, skipped=1, cached=2)", stream.getvalue())
+        self.assertIn("Ran 6 tests", stream.getvalue())
+
+        with open(os.path.join(self.directory, self.module + '.py'), 'a') as sample:
+            sample.write("# changed\n")
+
+        stream = io.StringIO()
+        runner.main(arguments, stream=stream)
+        self.assertIn("FAILED (failures=1, errors=2, skipped=1)", stream.getvalue())
+
+    def test_run_records_dependencies(self):
+        outcomes = runner.run(runner.load_tests([self.module + '.PassingTests']), jobs=1, record=True)
+        for outcome in outcomes:
+            self.assertIn(os.path.join(self.directory, self.module + '.py'), outcome.dependencies)
+
+    def test_loop_usage(self):
+        outcomes = runner.run(runner.load_tests([self.module + '.PassingTests']), jobs=2)
+        usages = {outcome.test_id.rsplit('.', 1)[-1]: outcome.usage for outcome in outcomes}
+
+        self.assertEqual(60, round(usages['test_sleep'].virtual_time))
+        self.assertGreater(usages['test_sleep'].callbacks, 0)
+        self.assertEqual(1, usages['test_sleep'].peak_scheduled)
+        self.assertEqual((0, 0, 0), usages['test_pass'])
+
+    def test_main_perf_report(self):
+        report = os.path.join(self.directory, 'perf.tsv')
+        stream = io.StringIO()
+        runner.main(['-j', '1', '--perf-report', report, self.module], stream=stream)
+
+        records = perf.read_report(report)
+        self.assertEqual(4, len(records))
+        self.assertEqual(60, round(records[self.module + '.PassingTests.test_sleep'].virtual_time))
+
+        # Make the baseline look like it ran no callbacks at all.
+        with open(report) as original:
+            lines = original.readlines()
+        with open(report, 'w') as baseline:
+            baseline.write(lines[0])
+            for line in lines[1:]:
+                test_id, real_time, virtual_time, _, peak = line.split('\t')
+                baseline.write('\t'.join([test_id, real_time, virtual_time, '0', peak]))
+
+        stream = io.StringIO()
+        runner.main(['-j', '1', '--perf-baseline', report, self.module + '.PassingTests'], stream=stream)
+        self.assertIn("1 test regressed against the baseline:\n  {module}.PassingTests.test_sleep: callbacks went "
+                      "from 0 to".format(module=self.module), stream.getvalue())
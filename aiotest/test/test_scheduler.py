@@ -0,0 +1,125 @@
+import unittest
+
+from aiotest import loop
+from aiotest.scheduler import BucketScheduler, HeapScheduler
+from aiotest.test import test_loop
+
+
+class Timer:
+    """
+    Just enough of a TimerHandle for the schedulers.
+    """
+    def __init__(self, when, name):
+        self._when = when
+        self.name = name
+
+    def __lt__(self, other):
+        return self._when < other._when
+
+
+class HeapSchedulerTest(unittest.TestCase):
+
+    scheduler_class = HeapScheduler
+
+    def setUp(self):
+        self.scheduler = self.scheduler_class()
+
+    def push(self, *timers):
+        for when, name in timers:
+            self.scheduler.push(Timer(when, name))
+
+    def test_empty(self):
+        self.assertEqual(0, len(self.scheduler))
+        self.assertEqual([], list(self.scheduler))
+        self.assertEqual([], self.scheduler.pop_due(100.0))
+
+    def test_peek_and_pop_first(self):
+        self.push((3.0, 'c'), (1.0, 'a'), (2.0, 'b'))
+
+        self.assertEqual('a', self.scheduler.peek().name)
+        self.assertEqual(['a', 'b', 'c'], [self.scheduler.pop_first().name for i in range(3)])
+        self.assertEqual(0, len(self.scheduler))
+
+    def test_pop_due(self):
+        self.push((3.0, 'c'), (1.0, 'a'), (2.0, 'b'), (4.0, 'd'))
+
+        self.assertEqual(['a', 'b'], [timer.name for timer in self.scheduler.pop_due(3.0, inclusive=False)])
+        self.assertEqual(['c'], [timer.name for timer in self.scheduler.pop_due(3.0)])
+        self.assertEqual(1, len(self.scheduler))
+
+    def test_rebuild(self):
+        self.push((3.0, 'c'), (1.0, 'a'), (2.0, 'b'))
+
+        self.scheduler.rebuild([timer for timer in self.scheduler if timer.name != 'a'])
+
+        self.assertEqual(2, len(self.scheduler))
+        self.assertEqual('b', self.scheduler.peek().name)
+
+    def test_clear(self):
+        self.push((3.0, 'c'), (1.0, 'a'))
+        self.scheduler.clear()
+        self.assertEqual(0, len(self.scheduler))
+
+
+class BucketSchedulerTest(HeapSchedulerTest):
+
+    scheduler_class = BucketScheduler
+
+    def test_fifo_within_bucket(self):
+        """
+        Timers sharing a deadline come out in the order they went in.
+        """
+        self.push(*[(5.0, i) for i in range(100)])
+        self.push((1.0, 'first'))
+
+        self.assertEqual(['first'] + list(range(100)), [timer.name for timer in self.scheduler.pop_due(5.0)])
+
+    def test_rebuild_keeps_fifo(self):
+        self.push(*[(5.0, i) for i in range(10)])
+
+        self.scheduler.rebuild([timer for timer in self.scheduler if timer.name % 2])
+
+        self.assertEqual([1, 3, 5, 7, 9], [timer.name for timer in self.scheduler.pop_due(5.0)])
+
+    def test_buckets(self):
+        self.push((5.0, 'a'), (5.0, 'b'), (6.0, 'c'))
+
+        self.assertEqual(2, len(self.scheduler._deadlines))
+        self.scheduler.pop_first()
+        self.scheduler.pop_first()
+        self.assertEqual(1, len(self.scheduler._deadlines))
+
+
+def bucket_loop():
+    return loop.TimeTravelingTestLoop(scheduler=BucketScheduler)
+
+
+class BucketLoopTest(test_loop.TimeTravelingTestLoopTest):
+    """
+    Everything the loop does with its default scheduler, it does with buckets too.
+    """
+    def setUp(self):
+        super().setUp()
+        self.event_loop = bucket_loop()
+
+    def test_same_tick_fifo(self):
+        calls = []
+
+        for i in range(1000):
+            self.event_loop.call_later(1.0, calls.append, i)
+
+        self.event_loop.advance(1.0)
+
+        self.assertEqual(list(range(1000)), calls)
+
+
+class BucketLoopFastForwardTest(test_loop.TestLoopFastForwardTests):
+
+    def setUp(self):
+        self.event_loop = bucket_loop()
+
+
+class BucketLoopCompactionTest(test_loop.TestLoopCompactionTests):
+
+    def setUp(self):
+        self.event_loop = loop.TimeTravelingTestLoop(compact_fraction=0.5, compact_minimum=100, scheduler=BucketScheduler)
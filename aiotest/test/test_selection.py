@@ -0,0 +1,165 @@
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from aiotest import TestCase
+from aiotest.loop import EPOCH
+from aiotest.runner import OutcomeResult, TestOutcome
+from aiotest.selection import DependencyRecorder, RecordingSuite, TestCache
+
+
+def helper():
+    return 42
+
+
+class DependencyRecorderTests(unittest.TestCase):
+
+    class SampleTests(TestCase):
+
+        @classmethod
+        def setUpClass(cls):
+            os.path.join('setup', 'class')
+
+        def test_helper(self):
+            helper()
+
+        def test_nothing(self):
+            pass
+
+        def test_constant(self):
+            return EPOCH + 1
+
+    def record(self, *names):
+        recorder = DependencyRecorder()
+        recorded = {}
+        recorder.start()
+        try:
+            self.SampleTests.setUpClass()
+            for name in names:
+                test = self.SampleTests(name)
+                recorder.test_started(test)
+                getattr(test, name)()
+                recorded[name] = recorder.test_finished(test)
+        finally:
+            recorder.stop()
+        return recorded
+
+    def test_records_files_run(self):
+        recorded = self.record('test_helper')
+        self.assertIn(os.path.abspath(__file__), recorded['test_helper'])
+
+    def test_records_modules_read_from(self):
+        """
+        Modules imported by the files a test ran code from count, even if it only read a constant from them.
+        """
+        recorded = self.record('test_constant')
+        self.assertIn(os.path.abspath(sys.modules['aiotest.loop'].__file__), recorded['test_constant'])
+
+    def test_teardown_not_counted_towards_next_class(self):
+        class FirstTests(TestCase):
+            @classmethod
+            def tearDownClass(cls):
+                # Found by name, so that nothing the second test runs imports it.
+                importlib.import_module('aiotest.cluster').Cluster().close()
+                super().tearDownClass()
+
+            def test_first(self):
+                pass
+
+        class SecondTests(TestCase):
+            def test_second(self):
+                pass
+
+        recorder = DependencyRecorder()
+        result = OutcomeResult(recorder)
+        recorder.start()
+        try:
+            RecordingSuite([FirstTests('test_first'), SecondTests('test_second')], recorder)(result)
+        finally:
+            recorder.stop()
+
+        dependencies = {outcome.test_id.rpartition('.')[2]: outcome.dependencies for outcome in result.outcomes}
+        self.assertNotIn(os.path.abspath(sys.modules['aiotest.cluster'].__file__), dependencies['test_second'])
+
+    def test_standard_library_left_out(self):
+        recorded = self.record('test_helper')
+        self.assertNotIn(os.path.abspath(os.path.__file__), recorded['test_helper'])
+        self.assertFalse([path for path in recorded['test_helper'] if path.startswith('<')])
+
+    def test_restores_previous_tracer(self):
+        previous = sys.gettrace()
+        self.record('test_nothing')
+        self.assertIs(sys.gettrace(), previous)
+
+
+class TestCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'cache.json')
+        self.source = os.path.join(self.directory, 'source.py')
+        self.write_source("VALUE = 1\n")
+
+    def write_source(self, text):
+        with open(self.source, 'w') as source:
+            source.write(text)
+
+    def outcome(self, test_id, status='pass', dependencies=None):
+        if dependencies is None:
+            dependencies = [self.source]
+        return TestOutcome(test_id, status, '', 0.0, dependencies, None)
+
+    def test_fresh_after_passing(self):
+        cache = TestCache(self.path)
+        self.assertFalse(cache.is_fresh('tests.test_one'))
+
+        cache.record(self.outcome('tests.test_one'))
+        cache.save()
+
+        self.assertTrue(TestCache(self.path).is_fresh('tests.test_one'))
+        self.assertFalse(TestCache(self.path).is_fresh('tests.test_two'))
+
+    def test_stale_once_a_dependency_changes(self):
+        cache = TestCache(self.path)
+        cache.record(self.outcome('tests.test_one'))
+        cache.save()
+
+        self.write_source("VALUE = 2  # and longer\n")
+        self.assertFalse(TestCache(self.path).is_fresh('tests.test_one'))
+
+    def test_stale_once_a_dependency_is_gone(self):
+        cache = TestCache(self.path)
+        cache.record(self.outcome('tests.test_one'))
+        cache.save()
+
+        os.remove(self.source)
+        self.assertFalse(TestCache(self.path).is_fresh('tests.test_one'))
+
+    def test_unchanged_files_are_not_hashed_again(self):
+        cache = TestCache(self.path)
+        cache.record(self.outcome('tests.test_one'))
+        cache.save()
+
+        cache = TestCache(self.path)
+        cache._files[self.source][2] = 'made up'
+        self.assertEqual(cache.file_hash(self.source), 'made up')
+
+    def test_failures_are_forgotten(self):
+        cache = TestCache(self.path)
+        cache.record(self.outcome('tests.test_one'))
+        cache.record(self.outcome('tests.test_one', status='fail'))
+        self.assertFalse(cache.is_fresh('tests.test_one'))
+
+    def test_unrecorded_outcomes_are_ignored(self):
+        cache = TestCache(self.path)
+        cache.record(TestOutcome('tests.test_one', 'pass', '', 0.0, None, None))
+        self.assertFalse(cache.is_fresh('tests.test_one'))
+
+    def test_corrupt_cache(self):
+        with open(self.path, 'w') as corrupt:
+            corrupt.write("{not json")
+        self.assertFalse(TestCache(self.path).is_fresh('tests.test_one'))
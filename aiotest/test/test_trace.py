@@ -0,0 +1,139 @@
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from aiotest import TestCase
+from aiotest.loop import TimeTravelingTestLoop
+from aiotest.trace import TraceRecorder, TraceWriter, diff_traces, main, read_trace
+
+
+def scenario(loop, last_delay=3):
+    """
+    A couple of coroutines and timers, always run in the same order.
+    """
+    @asyncio.coroutine
+    def worker(delay):
+        yield from asyncio.sleep(delay, loop=loop)
+        loop.call_later(1, print_nothing)
+
+    for delay in (1, 2, last_delay):
+        loop.create_task(worker(delay))
+    loop.run_until_idle()
+
+
+def print_nothing():
+    pass
+
+
+class TraceRecorderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def record(self, recorder, **kwargs):
+        loop = TimeTravelingTestLoop()
+        loop.add_instrument(recorder)
+        scenario(loop, **kwargs)
+        loop.remove_instrument(recorder)
+        recorder.close()
+        loop.close()
+        return recorder
+
+    def record_file(self, name, buffer_size=4096, **kwargs):
+        path = os.path.join(self.directory, name)
+        self.record(TraceRecorder(TraceWriter(open(path, 'wb')), buffer_size), **kwargs)
+        return path
+
+    def test_in_memory(self):
+        trace = self.record(TraceRecorder()).trace()
+        events = list(trace)
+
+        self.assertEqual(len(trace), len(events))
+        ran = [event.name for event in events if event.kind == 'ran']
+        self.assertEqual('scheduled', events[0].kind)
+        self.assertRegex(ran[0], r"^task .*worker$")
+        self.assertEqual(3, ran.count('aiotest.test.test_trace.print_nothing'))
+        self.assertEqual(sorted(event.time for event in events), [event.time for event in events])
+        self.assertEqual(events[-1], trace[-1])
+
+    def test_file_round_trip(self):
+        in_memory = self.record(TraceRecorder()).trace()
+        # A tiny buffer writes lots of small blocks.
+        trace = read_trace(self.record_file('scenario.trace', buffer_size=3))
+
+        self.assertEqual(list(in_memory), list(trace))
+
+    def test_identical_runs(self):
+        self.assertIsNone(diff_traces(read_trace(self.record_file('a.trace')), read_trace(self.record_file('b.trace'))))
+
+    def test_divergence(self):
+        left = read_trace(self.record_file('a.trace'))
+        right = read_trace(self.record_file('b.trace', last_delay=2.5))
+        divergence = diff_traces(left, right)
+
+        self.assertIsNotNone(divergence)
+        self.assertEqual(list(left)[:divergence.index], list(right)[:divergence.index])
+        self.assertNotEqual(divergence.left, divergence.right)
+
+    def test_one_trace_ends_first(self):
+        trace = self.record(TraceRecorder()).trace()
+        shorter = TraceRecorder()
+        shorter._times, shorter._name_ids, shorter._kinds = trace.times[:-1], trace.name_ids[:-1], trace.kinds[:-1]
+        shorter._names = trace.names
+
+        divergence = diff_traces(trace, shorter.trace())
+        self.assertEqual(len(trace) - 1, divergence.index)
+        self.assertIsNone(divergence.right)
+
+    def test_not_a_trace(self):
+        path = os.path.join(self.directory, 'junk')
+        with open(path, 'wb') as file:
+            file.write(b'junk')
+
+        with self.assertRaises(ValueError):
+            read_trace(path)
+
+    def test_cli(self):
+        a, b = self.record_file('a.trace'), self.record_file('b.trace')
+        c = self.record_file('c.trace', last_delay=2.5)
+
+        stream = io.StringIO()
+        self.assertEqual(0, main(['diff', a, b], stream))
+        self.assertIn("identical", stream.getvalue())
+
+        stream = io.StringIO()
+        self.assertEqual(1, main(['diff', a, c], stream))
+        self.assertIn("Traces diverge at event #", stream.getvalue())
+        self.assertIn("\n- #", stream.getvalue())
+        self.assertIn("\n+ #", stream.getvalue())
+
+        stream = io.StringIO()
+        self.assertEqual(0, main(['show', a], stream))
+        self.assertEqual(len(read_trace(a)), len(stream.getvalue().splitlines()))
+
+
+class TestCaseTraceTests(unittest.TestCase):
+
+    def test_trace_dir(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        class TracedTests(TestCase):
+            trace_dir = directory
+
+            @asyncio.coroutine
+            def test_sleep(self):
+                yield from asyncio.sleep(10)
+
+        result = unittest.TestResult()
+        suite = unittest.defaultTestLoader.loadTestsFromTestCase(TracedTests)
+        test_id = next(iter(suite)).id()
+        suite.run(result)
+
+        self.assertTrue(result.wasSuccessful())
+        trace = read_trace(os.path.join(directory, test_id + '.trace'))
+        self.assertTrue(any(event.name.endswith('test_sleep') for event in trace))
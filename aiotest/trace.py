@@ -0,0 +1,304 @@
+import argparse
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+from aiotest.profiling import TaskTracker, describe_callback, describe_task
+
+#: Every trace file starts with this.
+MAGIC = b'AIOTRC1\n'
+
+#: A callback was scheduled, with call_soon() or call_at().
+SCHEDULED = 0
+#: A callback was run.
+RAN = 1
+#: How each kind of event is shown.
+KIND_NAMES = ('scheduled', 'ran')
+
+#: One thing that happened on a traced loop: the ``index``th event, at
+#: virtual ``time``, of the given ``kind``, to the callback called ``name``.
+TraceEvent = namedtuple('TraceEvent', ['index', 'time', 'kind', 'name'])
+
+#: Where two traces part ways: the index of the first event that differs,
+#: and that event in each trace (None for a trace that had already ended).
+Divergence = namedtuple('Divergence', ['index', 'left', 'right'])
+
+_NAME = struct.Struct('<cIH')
+_EVENTS = struct.Struct('<cI')
+
+
+def _little_endian(block):
+    if sys.byteorder != 'little':
+        block = array(block.typecode, block)
+        block.byteswap()
+    return block.tobytes()
+
+
+class TraceWriter:
+    """
+    Streams a trace into a binary file as it is recorded.
+
+    After the MAGIC header, a trace file is a series of records, each
+    starting with a tag byte:
+
+    * ``N``, the id (uint32) and length (uint16) of a callback name, then
+      the name in UTF-8.  Every name is written once, before it is used.
+    * ``E``, a count (uint32) of events, then that many times (float64),
+      that many name ids (uint32) and that many kinds (uint8).
+
+    Everything is little-endian.
+    """
+    def __init__(self, file):
+        self._file = file
+        file.write(MAGIC)
+
+    def write_name(self, name_id, name):
+        encoded = name.encode('utf-8')[:0xffff]
+        self._file.write(_NAME.pack(b'N', name_id, len(encoded)))
+        self._file.write(encoded)
+
+    def write_events(self, times, name_ids, kinds):
+        self._file.write(_EVENTS.pack(b'E', len(times)))
+        self._file.write(_little_endian(times))
+        self._file.write(_little_endian(name_ids))
+        self._file.write(kinds.tobytes())
+
+    def close(self):
+        self._file.close()
+
+
+class Trace:
+    """
+    A recorded trace, held in three parallel arrays and a table of callback
+    names.  Indexing and iterating give TraceEvents.
+    """
+    def __init__(self, times=None, name_ids=None, kinds=None, names=None):
+        self.times = times if times is not None else array('d')
+        self.name_ids = name_ids if name_ids is not None else array('I')
+        self.kinds = kinds if kinds is not None else array('B')
+        self.names = names if names is not None else []
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.times)
+        return TraceEvent(index, self.times[index], KIND_NAMES[self.kinds[index]], self.names[self.name_ids[index]])
+
+    def __iter__(self):
+        for index in range(len(self.times)):
+            yield self[index]
+
+
+class TraceRecorder:
+    """
+    A loop instrument that records, in order, every callback the loop
+    schedules and runs: when, what kind of event, and which callback (named
+    as the CallbackProfiler names them, so Task steps are named after their
+    coroutine).
+
+    Events pile up in compact arrays.  Given a TraceWriter, they're written
+    out every ``buffer_size`` events, so that the memory a trace takes stays
+    flat however long it runs; otherwise they're all kept, and trace() gives
+    them back.  Call close() once done.
+
+    Add one to a loop with TimeTravelingTestLoop.add_instrument().
+    """
+    def __init__(self, writer=None, buffer_size=4096):
+        self._writer = writer
+        self.buffer_size = buffer_size
+        self._tasks = TaskTracker()
+        self._times = array('d')
+        self._name_ids = array('I')
+        self._kinds = array('B')
+        #: Every callback name seen, and name -> its index.
+        self._names = []
+        self._name_ids_by_name = {}
+        #: How many events have been recorded, written out or not.
+        self.count = 0
+        self._running = None
+
+    def _record(self, now, kind, name):
+        name_id = self._name_ids_by_name.get(name)
+        if name_id is None:
+            name_id = self._name_ids_by_name[name] = len(self._names)
+            self._names.append(name)
+            if self._writer is not None:
+                self._writer.write_name(name_id, name)
+
+        self._times.append(now)
+        self._name_ids.append(name_id)
+        self._kinds.append(kind)
+        self.count += 1
+
+        if self._writer is not None and len(self._times) >= self.buffer_size:
+            self.flush()
+
+    def handle_scheduled(self, handle, now):
+        self._record(now, SCHEDULED, describe_callback(handle._callback))
+
+    def handle_started(self, handle, now):
+        task = self._tasks.task_for(handle)
+        self._record(now, RAN, describe_task(task) if task is not None else describe_callback(handle._callback))
+        self._running = task
+
+    def handle_finished(self, handle, now):
+        task = self._running
+        self._running = None
+        if task is not None:
+            self._tasks.stepped(task)
+
+    def handle_cancelled(self, handle, now):
+        # Only what runs, and what's scheduled, is traced.
+        pass
+
+    def flush(self):
+        """
+        Write out any events still held in memory.
+        """
+        if self._writer is not None and self._times:
+            self._writer.write_events(self._times, self._name_ids, self._kinds)
+            del self._times[:]
+            del self._name_ids[:]
+            del self._kinds[:]
+
+    def close(self):
+        """
+        Write out anything left, and close the writer.
+        """
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+    def trace(self):
+        """
+        Everything recorded so far, when there's no writer to send it to.
+        """
+        if self._writer is not None:
+            raise RuntimeError("This recorder is writing its events out; use read_trace() on the file instead")
+        return Trace(self._times, self._name_ids, self._kinds, self._names)
+
+
+def _read_exactly(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("trace file ends part way through a record")
+    return data
+
+
+def _read_array(file, typecode, count):
+    block = array(typecode)
+    block.frombytes(_read_exactly(file, block.itemsize * count))
+    if sys.byteorder != 'little' and block.itemsize > 1:
+        block.byteswap()
+    return block
+
+
+def read_trace(path):
+    """
+    Load a trace file written by a TraceWriter.
+    """
+    trace = Trace()
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{path} is not an aiotest trace file".format(path=path))
+
+        while True:
+            tag = file.read(1)
+            if not tag:
+                break
+
+            if tag == b'N':
+                _, name_id, length = _NAME.unpack(tag + _read_exactly(file, _NAME.size - 1))
+                if name_id != len(trace.names):
+                    raise ValueError("trace file names are out of order")
+                trace.names.append(_read_exactly(file, length).decode('utf-8'))
+            elif tag == b'E':
+                _, count = _EVENTS.unpack(tag + _read_exactly(file, _EVENTS.size - 1))
+                trace.times.extend(_read_array(file, 'd', count))
+                trace.name_ids.extend(_read_array(file, 'I', count))
+                trace.kinds.extend(_read_array(file, 'B', count))
+            else:
+                raise ValueError("unknown record {tag!r} in trace file".format(tag=tag))
+    return trace
+
+
+def diff_traces(left, right):
+    """
+    Find the first event at which two traces differ, in time, kind or
+    callback.  Returns a Divergence, or None if they're the same.
+    """
+    for index in range(min(len(left), len(right))):
+        if (left.times[index] != right.times[index] or left.kinds[index] != right.kinds[index] or
+                left.names[left.name_ids[index]] != right.names[right.name_ids[index]]):
+            return Divergence(index, left[index], right[index])
+
+    if len(left) != len(right):
+        index = min(len(left), len(right))
+        return Divergence(index, left[index] if index < len(left) else None, right[index] if index < len(right) else None)
+    return None
+
+
+def format_event(event, start=0.0):
+    if event is None:
+        return "(end of trace)"
+    return "#{index:<8} {time:>14.6f}  {kind:<9}  {name}".format(
+        index=event.index, time=event.time - start, kind=event.kind, name=event.name)
+
+
+def format_divergence(left, divergence, context=5):
+    """
+    Describe where two traces part ways, with the ``context`` events they
+    agree on leading up to it.
+    """
+    start = left.times[0] if len(left) else 0.0
+    lines = ["Traces diverge at event #{index}:".format(index=divergence.index)]
+    for index in range(max(0, divergence.index - context), divergence.index):
+        lines.append("  " + format_event(left[index], start))
+    lines.append("- " + format_event(divergence.left, start))
+    lines.append("+ " + format_event(divergence.right, start))
+    return "\n".join(lines)
+
+
+def main(argv=None, stream=None):
+    """
+    The ``python -m aiotest.trace`` command line.  Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(prog='python -m aiotest.trace', description="Inspect aiotest trace files.")
+    commands = parser.add_subparsers(dest='command')
+    show = commands.add_parser('show', help="print every event in a trace")
+    show.add_argument('trace')
+    diff = commands.add_parser('diff', help="find the first event at which two traces differ")
+    diff.add_argument('left')
+    diff.add_argument('right')
+    diff.add_argument('-c', '--context', type=int, default=5, help="how many matching events to show before it")
+    args = parser.parse_args(argv)
+
+    if stream is None:
+        stream = sys.stdout
+
+    if args.command == 'show':
+        trace = read_trace(args.trace)
+        start = trace.times[0] if len(trace) else 0.0
+        for event in trace:
+            stream.write(format_event(event, start) + "\n")
+        return 0
+
+    if args.command == 'diff':
+        left, right = read_trace(args.left), read_trace(args.right)
+        divergence = diff_traces(left, right)
+        if divergence is None:
+            stream.write("Traces are identical ({count} events)\n".format(count=len(left)))
+            return 0
+        stream.write(format_divergence(left, divergence, args.context) + "\n")
+        return 1
+
+    parser.print_usage(stream)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+Benchmarks for aiotest's TimeTravelingTestLoop, measured against asyncio's
+own event loop.  Run them with ``python -m benchmarks``.
+"""
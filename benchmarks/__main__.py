@@ -0,0 +1,86 @@
+import argparse
+import fnmatch
+import json
+import platform
+import sys
+import time
+
+from benchmarks.loop_benchmarks import BENCHMARKS, LOOP_KINDS
+
+
+def measure(setup, kind, count, params, repeat):
+    """
+    Time a benchmark ``repeat`` times, returning the best run in seconds.
+    """
+    best = None
+    for i in range(repeat):
+        loop, benchmark = setup(kind, count, **params)
+        started = time.perf_counter()
+        benchmark()
+        elapsed = time.perf_counter() - started
+        if loop is not None:
+            loop.close()
+
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run(selected='*', repeat=3, scale=1.0, stream=sys.stdout):
+    """
+    Run every benchmark whose name matches ``selected`` against each kind of
+    loop, printing a table as we go.  Returns the results.
+    """
+    results = []
+    stream.write("{name:<20} {kind:<24} {ops:>10} {seconds:>10} {rate:>14}\n".format(
+        name='benchmark', kind='loop', ops='ops', seconds='seconds', rate='ops/sec'))
+
+    for name, setup, count, params in BENCHMARKS:
+        if not fnmatch.fnmatch(name, selected):
+            continue
+
+        count = max(1, int(count * scale))
+        for kind in LOOP_KINDS:
+            seconds = measure(setup, kind, count, params, repeat)
+            result = {
+                'benchmark': name,
+                'loop': kind,
+                'params': params,
+                'ops': count,
+                'seconds': seconds,
+                'ops_per_sec': count / seconds if seconds else None,
+            }
+            results.append(result)
+
+            stream.write("{benchmark:<20} {loop:<24} {ops:>10} {seconds:>10.4f} {rate:>14,.0f}\n".format(
+                rate=result['ops_per_sec'] or 0, **result))
+            stream.flush()
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description="Benchmark TimeTravelingTestLoop against asyncio's event loop.")
+    parser.add_argument('-b', '--benchmark', default='*', help="only run benchmarks matching this glob")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="runs of each benchmark; the best one counts")
+    parser.add_argument('-s', '--scale', type=float, default=1.0, help="scale the number of operations by this much")
+    parser.add_argument('--json', metavar='PATH', help="also write the results to PATH as JSON, for tracking over time")
+    args = parser.parse_args(argv)
+
+    results = run(args.benchmark, args.repeat, args.scale)
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'timestamp': time.time(),
+                'results': results,
+            }, output, indent=2, sort_keys=True)
+
+    return 0
+
+
+sys.exit(main())
@@ -0,0 +1,133 @@
+import asyncio
+
+from aiotest import TestCase
+from aiotest.loop import TimeTravelingTestLoop
+from aiotest.scheduler import BucketScheduler
+
+#: The kinds of loop each benchmark can run against.
+LOOP_KINDS = ('time-traveling', 'time-traveling-buckets', 'asyncio')
+
+
+def new_loop(kind):
+    if kind == 'time-traveling':
+        return TimeTravelingTestLoop()
+    if kind == 'time-traveling-buckets':
+        return TimeTravelingTestLoop(scheduler=BucketScheduler)
+    return asyncio.new_event_loop()
+
+
+def callbacks(kind, count):
+    """
+    Run ``count`` call_soon() callbacks.
+    """
+    loop = new_loop(kind)
+    calls = []
+    append = calls.append
+
+    def benchmark():
+        for i in range(count):
+            loop.call_soon(append, i)
+
+        if kind != 'asyncio':
+            loop.run_until_idle()
+        else:
+            loop.call_soon(loop.stop)
+            loop.run_forever()
+
+    return loop, benchmark
+
+
+def timers(kind, count, cancel_ratio=0.0, ticks=None):
+    """
+    Schedule ``count`` timers, cancel ``cancel_ratio`` of them, and run the
+    rest.  Given a number of ``ticks``, the timers are spread across only
+    that many distinct deadlines.
+    """
+    loop = new_loop(kind)
+    calls = []
+    append = calls.append
+
+    def benchmark():
+        # The real loop would sleep until timers are due, so we schedule
+        # everything in the past for it: it's the bookkeeping being measured.
+        start = loop.time() - (count + 1) * 0.001 if kind == 'asyncio' else loop.time()
+        handles = [loop.call_at(start + (i % ticks if ticks else i) * 0.001, append, i) for i in range(count)]
+
+        # Spread the cancellations evenly through the timers.
+        if cancel_ratio:
+            for i, handle in enumerate(handles):
+                if int((i + 1) * cancel_ratio) > int(i * cancel_ratio):
+                    handle.cancel()
+
+        if kind != 'asyncio':
+            loop.run_until_idle()
+        else:
+            loop.call_at(start + count * 0.001, loop.stop)
+            loop.run_forever()
+
+    return loop, benchmark
+
+
+@asyncio.coroutine
+def chain(depth, loop):
+    """
+    A chain of ``depth`` coroutines, each waiting on the next.
+    """
+    if depth == 0:
+        yield from asyncio.sleep(0, loop=loop)
+        return 0
+    return (yield from chain(depth - 1, loop)) + 1
+
+
+class _ChainTestCase(TestCase):
+    def runTest(self):
+        pass
+
+
+def coroutine_chains(kind, count, depth=50):
+    """
+    Run ``count`` coroutine chains of the given depth, one after another.  On
+    the time-traveling loop, each is checked with TestCase.assertCoroResult().
+    """
+    if kind != 'asyncio':
+        case = _ChainTestCase()
+        case.loop_factory = lambda: new_loop(kind)
+
+        def benchmark():
+            loop = case.event_loop
+            for i in range(count):
+                case.assertCoroResult(depth, chain, depth, loop)
+            case.doCleanups()
+
+        return None, benchmark
+
+    loop = new_loop(kind)
+
+    def benchmark():
+        for i in range(count):
+            loop.run_until_complete(chain(depth, loop))
+
+    return loop, benchmark
+
+
+def loop_creation(kind, count):
+    """
+    Create and close ``count`` event loops.
+    """
+    def benchmark():
+        for i in range(count):
+            new_loop(kind).close()
+
+    return None, benchmark
+
+
+#: name -> (function, number of operations, extra parameters)
+BENCHMARKS = [
+    ('callbacks', callbacks, 100000, {}),
+    ('timers', timers, 50000, {'cancel_ratio': 0.0}),
+    ('timers-cancel-50%', timers, 50000, {'cancel_ratio': 0.5}),
+    ('timers-cancel-90%', timers, 50000, {'cancel_ratio': 0.9}),
+    ('timers-100-ticks', timers, 50000, {'ticks': 100}),
+    ('coroutine-chains', coroutine_chains, 1000, {'depth': 50}),
+    ('loop-creation', loop_creation, 1000, {}),
+]